@@ -1,13 +1,19 @@
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status, Security
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import ValidationError
+from pymongo.errors import DuplicateKeyError
 
 from app.db.session import get_database
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.cache import principal_cache
+from app.core.config import settings
 from app.core.security import decode_token
-from app.crud.user import CRUDUser
-from app.models.user import UserPublic
+from app.crud.loader import BatchLoader
+from app.crud.revocation import token_revocations
+from app.crud.user import DUPLICATE_KEY_ERROR_CODE, CRUDUser, duplicate_key_field
+from app.models.user import UserPublic, UserRole
 from uuid import UUID
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token") # URL для получения токена
@@ -26,41 +32,155 @@ async def get_db() -> AsyncGenerator[AsyncIOMotorDatabase, None]:
         # Сейчас просто пробрасываем, FastAPI обработает ее как 500 Internal Server Error
         raise 
 
-async def get_current_user(
-    token: str = Security(oauth2_scheme),
-    db: AsyncIOMotorDatabase = Depends(get_db),
-) -> UserPublic:
-    """Зависимость для получения текущего аутентифицированного пользователя."""
-    credentials_exception = HTTPException(
+# Сообщения о нарушении уникальных индексов коллекции пользователей
+DUPLICATE_USER_MESSAGES = {
+    "email": "Пользователь с таким email уже существует.",
+    "username": "Пользователь с таким именем пользователя уже существует.",
+}
+DUPLICATE_USER_DEFAULT_MESSAGE = "Пользователь с таким email или именем пользователя уже существует."
+
+def duplicate_user_message(field: Optional[str]) -> str:
+    """Текст ошибки для нарушенного уникального индекса пользователей."""
+    return DUPLICATE_USER_MESSAGES.get(field, DUPLICATE_USER_DEFAULT_MESSAGE)
+
+def user_write_error(write_error: Mapping[str, Any]) -> Tuple[Optional[str], str]:
+    """Поле и текст ошибки для строки, которую не удалось записать (writeError драйвера)."""
+    if write_error.get("code") == DUPLICATE_KEY_ERROR_CODE:
+        field = duplicate_key_field(write_error)
+        return field, duplicate_user_message(field)
+    return None, f"Не удалось сохранить пользователя (код ошибки {write_error.get('code')})."
+
+def duplicate_user_exception(error: DuplicateKeyError) -> HTTPException:
+    """
+    Превращает DuplicateKeyError в ответ 400.
+
+    Уникальность email и username проверяют индексы MongoDB, поэтому эндпоинты
+    записи не делают предварительных запросов get_by_email/get_by_username.
+    """
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=duplicate_user_message(duplicate_key_field(error.details)),
+    )
+
+def get_user_loader(db: AsyncIOMotorDatabase = Depends(get_db)) -> BatchLoader[UUID, UserPublic]:
+    """
+    Загрузчик пользователей на время одного запроса.
+
+    Вызовы loader.load(user_id), сделанные параллельно (например, через asyncio.gather),
+    выполняются одним запросом $in вместо N отдельных find_one.
+    Загрузчик предназначен для публичных данных и читает с реплик (см. CRUDUser).
+    """
+    return CRUDUser(db).loader(UserPublic, public=True)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
         headers={"": "Bearer"},
     )
-    
-    # Декодируем токен
+
+def _decode_access_token(token: str) -> tuple[Dict[str, Any], UUID]:
+    """Декодирует токен и возвращает его полезную нагрузку и UUID пользователя."""
     payload = decode_token(token)
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     # Получаем user_id из полезной нагрузки токена
     user_id_str = payload.get("sub")
     if user_id_str is None:
-         raise credentials_exception
+         raise _credentials_exception()
 
     try:
         user_id = UUID(user_id_str) # Преобразуем строку в UUID
     except ValueError:
-         raise credentials_exception
+         raise _credentials_exception()
+    return payload, user_id
+
+def _principal_from_claims(payload: Dict[str, Any], user_id: UUID) -> Optional[UserPublic]:
+    """Собирает пользователя из полей токена; None, если токен выпущен без них."""
+    if "email" not in payload or "status" not in payload:
+        return None
+    try:
+        return UserPublic(
+            id=user_id,
+            email=payload["email"],
+            username=payload.get("username"),
+            full_name=payload.get("full_name"),
+            roles=payload.get("roles", []),
+            status=payload["status"],
+            is_active=payload.get("is_active", True),
+            created_at=payload.get("created_at"),
+        )
+    except ValidationError:
+        return None
+
+async def _ensure_not_revoked(payload: Dict[str, Any], db: AsyncIOMotorDatabase) -> None:
+    """Отклоняет отозванный токен (например, после выхода из системы)."""
+    jti = payload.get("jti")
+    if jti is not None and await token_revocations.is_revoked(jti, db):
+        raise _credentials_exception()
+
+async def get_token_payload(
+    token: str = Security(oauth2_scheme),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+) -> Dict[str, Any]:
+    """Зависимость, возвращающая полезную нагрузку действующего (не отозванного) access токена."""
+    payload, _ = _decode_access_token(token)
+    await _ensure_not_revoked(payload, db)
+    return payload
 
-    # Получаем пользователя из базы данных
+async def _load_principal(user_id: UUID, db: AsyncIOMotorDatabase) -> UserPublic:
+    """Загружает пользователя из базы данных и обновляет кеш."""
     user_crud = CRUDUser(db)
-    user = await user_crud.get_by_id(user_id=user_id)
+    principal = await user_crud.get_by_id(user_id=user_id, model=UserPublic)
 
-    if user is None:
-        raise credentials_exception # Пользователь не найден в БД
+    if principal is None:
+        raise _credentials_exception() # Пользователь не найден в БД
 
-    # Конвертируем модель, сериализуя created_at в ISO формат
-    user_dict = user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
-    
-    return UserPublic(**user_dict) 
\ No newline at end of file
+    if settings.PRINCIPAL_CACHE_ENABLED:
+        principal_cache.set(user_id, principal)
+    return principal
+
+async def get_current_user(
+    token: str = Security(oauth2_scheme),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+) -> UserPublic:
+    """Зависимость для получения текущего аутентифицированного пользователя."""
+    payload, user_id = _decode_access_token(token)
+    # Запрос к БД только при попадании jti в фильтр отозванных токенов
+    await _ensure_not_revoked(payload, db)
+
+    # В режиме AUTH_CLAIMS_ONLY пользователь собирается из проверенного токена без запроса к БД
+    if settings.AUTH_CLAIMS_ONLY:
+        principal = _principal_from_claims(payload, user_id)
+        if principal is not None:
+            return principal
+
+    # Горячие пользователи обслуживаются из кеша без обращения к БД
+    if settings.PRINCIPAL_CACHE_ENABLED:
+        principal = principal_cache.get(user_id)
+        if principal is not None:
+            return principal
+
+    return await _load_principal(user_id, db)
+
+async def get_current_user_fresh(
+    token: str = Security(oauth2_scheme),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+) -> UserPublic:
+    """
+    Зависимость для эндпоинтов, которым нужно актуальное состояние пользователя из БД.
+
+    Не использует ни поля токена, ни кеш (например, для проверки прав перед изменением данных).
+    """
+    payload, user_id = _decode_access_token(token)
+    await _ensure_not_revoked(payload, db)
+    return await _load_principal(user_id, db)
+
+async def get_current_admin(
+    current_user: UserPublic = Depends(get_current_user_fresh),
+) -> UserPublic:
+    """Зависимость для эндпоинтов, доступных только администраторам."""
+    if UserRole.ADMIN not in current_user.roles:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав для выполнения операции")
+    return current_user
@@ -1,31 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta, datetime, timezone
+from typing import Any, Dict, Optional
 
 from app.core.config import settings # Импорт settings
 from app.models.user import UserCreate, UserPublic, UserLoginRequest
-from app.models.token import TokenResponse, RefreshTokenInDB, RefreshTokenRequest
+from app.models.token import TokenResponse, RefreshTokenRequest
 from app.crud.user import CRUDUser
-from app.db.session import get_database, REFRESH_TOKENS_COLLECTION
-from app.core.security import create_access_token, verify_password
+from app.crud.token import CRUDRefreshToken
+from app.db.session import get_database
+from app.core.security import create_access_token, averify_password, ahash_password, password_needs_rehash
 from pymongo.errors import DuplicateKeyError
 from app.models.base import HTTPError
+from app.api.v1.deps import duplicate_user_exception, get_token_payload
+from app.crud.revocation import token_revocations
+from app.api.v1.responses import user_json_response
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from uuid import uuid4
+from uuid import UUID
 
 router = APIRouter()
 
-async def _authenticate_user(email: str, password: str, db: AsyncIOMotorDatabase) -> UserPublic:
+async def _rehash_password(user_crud: CRUDUser, user_id: UUID, password: str, previous_hash: str) -> None:
+    """Перехеширует пароль с актуальной стоимостью bcrypt (выполняется после отправки ответа)."""
+    try:
+        new_hash = await ahash_password(password)
+        await user_crud.update_password_hash(user_id, new_hash, previous_hash)
+    except Exception as e:
+        # Неудача не критична: хеш обновится при следующем входе
+        print(f"Ошибка при перехешировании пароля пользователя {user_id}: {e}")
+
+async def _authenticate_user(
+    email: str,
+    password: str,
+    db: AsyncIOMotorDatabase,
+    background_tasks: BackgroundTasks,
+) -> UserPublic:
     """Аутентифицирует пользователя по email и паролю."""
     user_crud = CRUDUser(db)
     user = await user_crud.get_by_email(email=email)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await averify_password(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неправильный email или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Хеш с устаревшей стоимостью bcrypt обновляем в фоне, чтобы не увеличивать время ответа
+    if password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(_rehash_password, user_crud, user.id, password, user.hashed_password)
     # Предполагаем, что UserPublic совместим с моделью пользователя из CRUD
     # Если user из CRUD имеет другой тип, здесь нужна будет конвертация
     # или функция должна возвращать тот тип, который вернул user_crud.get_by_email
@@ -34,29 +56,41 @@ async def _authenticate_user(email: str, password: str, db: AsyncIOMotorDatabase
     # и его поля доступны.
     return user # Возвращаем полную модель пользователя из БД
 
+def _access_token_claims(user: UserPublic) -> dict:
+    """
+    Формирует полезную нагрузку access токена.
+
+    В режиме AUTH_CLAIMS_ONLY токен дополняется всеми полями UserPublic,
+    чтобы get_current_user мог собрать пользователя без запроса к БД.
+    """
+    claims = {
+        "sub": str(user.id),
+        "roles": [role.value for role in user.roles],
+    }
+    if settings.AUTH_CLAIMS_ONLY:
+        created_at = user.created_at
+        claims.update({
+            "email": user.email,
+            "username": user.username,
+            "full_name": user.full_name,
+            "status": user.status.value,
+            "is_active": user.is_active,
+            "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        })
+    return claims
+
 async def _create_token_response(user: UserPublic, db: AsyncIOMotorDatabase) -> TokenResponse:
-    """Создает access и refresh токены для пользователя."""
+    """Создает access и refresh токены для пользователя (новая сессия)."""
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={
-            "sub": str(user.id),
-            "roles": [role.value for role in user.roles]
-            },
+        data=_access_token_claims(user),
         expires_delta=access_token_expires
     )
-    
-    refresh_token_expires = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    refresh_token_value = str(uuid4())
-    refresh_token_db_obj = RefreshTokenInDB(
-        user_id=user.id,
-        refresh_token=refresh_token_value,
-        expires_at=datetime.now(timezone.utc) + refresh_token_expires
-    )
-    await db[REFRESH_TOKENS_COLLECTION].insert_one(refresh_token_db_obj.model_dump(by_alias=True))
+    refresh_token = await CRUDRefreshToken(db).issue(user.id)
     
     return TokenResponse(
         access_token=access_token, 
-        refresh_token=refresh_token_value, 
+        refresh_token=refresh_token.refresh_token, 
         expires_in=access_token_expires.total_seconds()
     )
 
@@ -64,11 +98,7 @@ def _create_access_token_for_user(user: UserPublic) -> tuple[str, timedelta]:
     """Создает только access токен для пользователя и возвращает токен и время его жизни."""
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={
-            "sub": str(user.id),
-            "roles": [role.value for role in user.roles],
-            "refresh_id": str(uuid4()),  # Добавляем случайный идентификатор для уникальности нового access токена
-        },
+        data=_access_token_claims(user),  # Уникальность нового токена обеспечивает его jti
         expires_delta=access_token_expires
     )
     return access_token, access_token_expires
@@ -87,63 +117,41 @@ def _create_access_token_for_user(user: UserPublic) -> tuple[str, timedelta]:
 async def register_user(
     user_in: UserCreate,
     db: AsyncIOMotorDatabase = Depends(get_database),
-) -> UserPublic:
+) -> Response:
     """Регистрация нового пользователя."""
+    # Уникальность email и username проверяют индексы: один запрос к БД вместо двух
     user_crud = CRUDUser(db)
-    user_by_email = await user_crud.get_by_email(email=user_in.email)
-    if user_by_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким email уже существует."
-        )
-    
-    # Проверка на существующее имя пользователя (если оно передается и должно быть уникальным)
-    # В вашей модели UserCreate есть username, и на него есть уникальный индекс в MongoDB
-    # Мы можем добавить явную проверку или положиться на обработку DuplicateKeyError ниже.
-    # Для чистоты, можно сначала проверить get_by_username, если такая функция есть в CRUDUser.
-    # Если нет, то обработка DuplicateKeyError покроет этот случай.
-
     try:
         created_user = await user_crud.create(user_in=user_in)
     except DuplicateKeyError as e:
-        # Проверяем, что ошибка связана с индексом username
-        # Более точная проверка: if e.details and "keyPattern" in e.details and "username" in e.details["keyPattern"]:
-        if hasattr(e, 'details') and isinstance(e.details, dict) and e.details.get("keyPattern", {}).get("username") == 1:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Пользователь с таким именем пользователя уже существует."
-            )
-        # Если ошибка дублирования не по username или детали не соответствуют ожидаемому формату
-        # Можно логировать e для отладки, чтобы понять структуру ошибки от вашей версии MongoDB/Motor
-        # logger.error(f"DuplicateKeyError during user registration: {e.details}") 
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, # Ошибка данных клиента
-            detail="Пользователь с таким email или именем пользователя уже существует."
-        )
+        raise duplicate_user_exception(e)
 
     # В реальном приложении здесь может быть отправка письма для подтверждения email
-    # Сериализуем created_at в ISO формат перед возвратом
-    created_user_dict = created_user.model_dump()
-    created_user_dict['created_at'] = created_user_dict['created_at'].isoformat()
-    return UserPublic(**created_user_dict)
+    return user_json_response(created_user, status_code=status.HTTP_201_CREATED)
 
 @router.post("/token", response_model=TokenResponse, include_in_schema=True)
 async def login_for_access_token_swagger(
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ) -> TokenResponse:
     """Получение access и refresh токенов по логину и паролю (для OAuth2 password flow)."""
     # form_data.username здесь будет содержать email
-    user = await _authenticate_user(email=form_data.username, password=form_data.password, db=db)
+    user = await _authenticate_user(
+        email=form_data.username, password=form_data.password, db=db, background_tasks=background_tasks
+    )
     return await _create_token_response(user=user, db=db)
 
 @router.post("/login", response_model=TokenResponse)
 async def login_for_access_tokens(
     login_data: UserLoginRequest,
+    background_tasks: BackgroundTasks,
     db: AsyncIOMotorDatabase = Depends(get_database),
 ) -> TokenResponse:
     """Получение access и refresh токенов по логину и паролю (через JSON)."""
-    user = await _authenticate_user(email=login_data.email, password=login_data.password, db=db)
+    user = await _authenticate_user(
+        email=login_data.email, password=login_data.password, db=db, background_tasks=background_tasks
+    )
     return await _create_token_response(user=user, db=db)
 
 @router.post("/refresh", response_model=TokenResponse)
@@ -151,15 +159,14 @@ async def refresh_access_token(
     token_data: RefreshTokenRequest,
     db: AsyncIOMotorDatabase = Depends(get_database),
 ) -> TokenResponse:
-    """Обновление access токена с использованием refresh токена."""
-    # Ищем refresh токен в базе данных
-    refresh_token = await db[REFRESH_TOKENS_COLLECTION].find_one({
-        "refresh_token": token_data.refresh_token,
-        "is_revoked": False,
-        "expires_at": {"$gt": datetime.now(timezone.utc)}  # Токен не истек
-    })
+    """
+    Обновление токенов: предъявленный refresh токен отзывается, в ответе - новый.
+
+    Повторное предъявление уже использованного токена отзывает всю сессию.
+    """
+    new_refresh_token = await CRUDRefreshToken(db).rotate(token_data.refresh_token)
     
-    if not refresh_token:
+    if not new_refresh_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Недействительный или истекший refresh токен",
@@ -168,7 +175,7 @@ async def refresh_access_token(
     
     # Получаем пользователя
     user_crud = CRUDUser(db)
-    user = await user_crud.get_by_id(user_id=refresh_token["user_id"])
+    user = await user_crud.get_by_id(user_id=new_refresh_token.user_id, model=UserPublic)
     
     if not user:
         raise HTTPException(
@@ -181,6 +188,26 @@ async def refresh_access_token(
     
     return TokenResponse(
         access_token=access_token, 
-        refresh_token=token_data.refresh_token,
+        refresh_token=new_refresh_token.refresh_token,
         expires_in=access_token_expires.total_seconds()
-    ) 
\ No newline at end of file
+    )
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token_data: Optional[RefreshTokenRequest] = None,
+    payload: Dict[str, Any] = Depends(get_token_payload),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+) -> Response:
+    """
+    Выход из системы: текущий access токен отзывается до истечения срока.
+
+    Если передан refresh токен, отзывается и вся его сессия (только сессия
+    того же пользователя: чужой токен игнорируется).
+    """
+    jti = payload.get("jti")
+    if jti is not None:
+        expires_at = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+        await token_revocations.revoke(jti, expires_at, db)
+    if token_data is not None:
+        await CRUDRefreshToken(db).revoke_session(token_data.refresh_token, UUID(payload["sub"]))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
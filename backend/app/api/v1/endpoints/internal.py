@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from typing import Any, Dict, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.api.v1.deps import get_current_admin
+from app.core.config import settings
+from app.core.profiler import ProfilerBusy, profiler
+from app.db.monitoring import pool_stats
+from app.db.session import mongo_client_options
+from app.db.slow_queries import slow_query_log
+from app.models.user import UserPublic
+
+# Служебные эндпоинты для диагностики; доступны только администраторам
+router = APIRouter()
+
+@router.get("/db-pool")
+async def get_db_pool_stats(
+    current_user: UserPublic = Depends(get_current_admin),
+) -> Dict[str, Any]:
+    """Настройки и статистика пулов соединений MongoDB по серверам."""
+    options = mongo_client_options()
+    options.pop("uuidRepresentation", None)
+    return {"options": options, "pools": pool_stats.snapshot()}
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: UserPublic = Depends(get_current_admin),
+) -> Dict[str, Any]:
+    """
+    Последние медленные команды MongoDB (новые первыми) и explain их форм.
+
+    Журнал ведется при SLOW_QUERY_LOG_ENABLED=true; значения в фильтрах скрыты.
+    План формы равен null, пока explain еще выполняется.
+    """
+    return {"enabled": settings.SLOW_QUERY_LOG_ENABLED, **slow_query_log.snapshot(limit)}
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = Query(5, gt=0, le=settings.PROFILER_MAX_SECONDS, description="Длительность замера"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Интервал между снимками стека"),
+    format: Literal["speedscope", "collapsed"] = Query("speedscope"),
+    current_user: UserPublic = Depends(get_current_admin),
+) -> Response:
+    """
+    Профилирует поток event loop этого воркера в течение seconds секунд.
+
+    Стеки снимаются из отдельного потока, а event loop продолжает обслуживать
+    запросы - именно их работа и попадает в профиль. Ответ - профиль для
+    speedscope (JSON) или collapsed stacks для flamegraph (текст).
+    """
+    if profiler.busy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Профилирование уже выполняется")
+    loop_thread_id = threading.get_ident()
+    try:
+        profile = await asyncio.to_thread(profiler.profile, loop_thread_id, seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Профилирование уже выполняется")
+
+    headers = {"X-Profile-Samples": str(profile.samples)}
+    if format == "collapsed":
+        return PlainTextResponse(profile.to_collapsed(), headers=headers)
+    return JSONResponse(profile.to_speedscope(), headers=headers)
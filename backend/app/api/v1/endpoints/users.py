@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
 from uuid import UUID
+from pydantic import ValidationError
+from pymongo.errors import DuplicateKeyError
 
-from app.models.user import UserCreate, UserPublic, UserUpdate, UserRole
-from app.crud.user import CRUDUser
-from app.api.v1.deps import get_db, get_current_user
+from app.models.user import UserCreate, UserPublic, UserUpdate, UserRole, UserImportError, UserImportResult
+from app.crud.user import CRUDUser, decode_users_cursor, encode_users_cursor
+from app.api.v1.deps import (
+    duplicate_user_exception,
+    get_current_admin,
+    get_current_user,
+    get_current_user_fresh,
+    get_db,
+    user_write_error,
+)
+from app.api.v1.responses import dump_export_row, user_json_response, users_json_response
+from app.core.config import settings
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 router = APIRouter()
@@ -13,92 +25,221 @@ router = APIRouter()
 async def create_user(
     user_in: UserCreate,
     db: AsyncIOMotorDatabase = Depends(get_db),
-) -> UserPublic:
+) -> Response:
     """Создать нового пользователя."""
     user_crud = CRUDUser(db)
-    user = await user_crud.get_by_email(email=user_in.email)
-    if user:
+    try:
+        created_user = await user_crud.create(user_in=user_in)
+    except DuplicateKeyError as e:
+        raise duplicate_user_exception(e)
+    return user_json_response(created_user, status_code=status.HTTP_201_CREATED)
+
+@router.post(
+    "/import",
+    response_model=UserImportResult,
+    openapi_extra={"requestBody": {"content": {"application/x-ndjson": {"schema": UserCreate.model_json_schema()}}}},
+)
+async def import_users(
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: UserPublic = Depends(get_current_admin),
+) -> UserImportResult:
+    """
+    Массовый импорт пользователей из JSON Lines (только для администраторов).
+
+    Каждая строка тела - объект UserCreate. Тело читается потоком и создается
+    пачками по USERS_IMPORT_CHUNK_SIZE, поэтому размер файла не ограничен памятью.
+    Ошибки возвращаются построчно (нумерация строк с 1). Строка длиннее
+    USERS_IMPORT_MAX_LINE_BYTES прерывает импорт с ответом 413: все строки до нее
+    обработаны и сохранены, а detail содержит номер строки (line), число созданных
+    пользователей (created), последнюю обработанную строку (last_line) и ошибки
+    (errors) - продолжать импорт нужно со строки line.
+    """
+    user_crud = CRUDUser(db)
+    result = UserImportResult()
+    batch: List[Tuple[int, UserCreate]] = []
+
+    async def flush() -> None:
+        created, failed = await user_crud.create_many([user_in for _, user_in in batch])
+        result.created += len(created)
+        for index, write_error in failed.items():
+            field, message = user_write_error(write_error)
+            result.errors.append(UserImportError(line=batch[index][0], field=field, message=message))
+        batch.clear()
+
+    async def handle_line(line_number: int, raw_line: bytes) -> None:
+        if not raw_line.strip():
+            return
+        try:
+            batch.append((line_number, UserCreate.model_validate_json(raw_line)))
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"]) or None
+            result.errors.append(UserImportError(line=line_number, field=field, message=error["msg"]))
+        if len(batch) >= settings.USERS_IMPORT_CHUNK_SIZE:
+            await flush()
+
+    async def check_line_size(line_number: int, raw_line: bytes) -> None:
+        if len(raw_line) <= settings.USERS_IMPORT_MAX_LINE_BYTES:
+            return
+        # Строки до слишком длинной сохраняются: клиент продолжит импорт с line
+        if batch:
+            await flush()
+        result.errors.sort(key=lambda error: error.line)
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким email уже существует."
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail={
+                "message": f"Строка {line_number} длиннее {settings.USERS_IMPORT_MAX_LINE_BYTES} байт.",
+                "line": line_number,
+                "last_line": line_number - 1,
+                "created": result.created,
+                "errors": [error.model_dump() for error in result.errors],
+            },
         )
-    created_user = await user_crud.create(user_in=user_in)
-    # Сериализуем created_at в ISO формат перед возвратом
-    user_dict = created_user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
-    return UserPublic(**user_dict)
+
+    line_number = 0
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *complete_lines, pending = pending.split(b"\n")
+        for raw_line in complete_lines:
+            line_number += 1
+            await check_line_size(line_number, raw_line)
+            await handle_line(line_number, raw_line)
+        # Незавершенная строка копится в памяти - ее размер ограничен так же
+        await check_line_size(line_number + 1, pending)
+    if pending:
+        line_number += 1
+        await handle_line(line_number, pending)
+    if batch:
+        await flush()
+
+    result.errors.sort(key=lambda error: error.line)
+    return result
 
 @router.get("/me", response_model=UserPublic)
 async def read_current_user(
     current_user: UserPublic = Depends(get_current_user)
-) -> UserPublic:
+) -> Response:
     """Получить информацию о текущем пользователе."""
-    return current_user
+    return user_json_response(current_user)
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"application/x-ndjson": {}}}},
+)
+async def export_users(
+    cursor: Optional[str] = None,
+    after_id: Optional[UUID] = Query(None, deprecated=True),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    current_user: UserPublic = Depends(get_current_admin),
+) -> StreamingResponse:
+    """
+    Выгрузить всех пользователей в формате NDJSON (только для администраторов).
+
+    Пользователи отдаются в порядке (created_at, id); каждая строка - поля UserPublic
+    и cursor, токен продолжения после нее. Чтобы продолжить прерванную выгрузку,
+    передайте cursor последней полученной строки: позиция не зависит от того,
+    существует ли еще этот пользователь. after_id (id последней строки) оставлен
+    для совместимости и требует, чтобы пользователь не был удален.
+    """
+    user_crud = CRUDUser(db)
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_users_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    elif after_id is not None:
+        after = await user_crud.get_sort_key(after_id)
+        if after is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Пользователь для возобновления выгрузки не найден.")
+
+    batch_size = settings.USERS_EXPORT_BATCH_SIZE
+
+    async def ndjson_chunks():
+        # Строки отправляются пачками: один чанк на пачку курсора вместо одного на пользователя
+        lines = []
+        async for user_data in user_crud.iter_documents(after=after, batch_size=batch_size, model=UserPublic):
+            row_cursor = encode_users_cursor(user_data["created_at"], user_data["id"])
+            lines.append(dump_export_row(user_data, row_cursor))
+            if len(lines) >= batch_size:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    return StreamingResponse(ndjson_chunks(), media_type="application/x-ndjson")
 
 @router.get("/{user_id}", response_model=UserPublic)
 async def read_user_by_id(
     user_id: UUID,
     db: AsyncIOMotorDatabase = Depends(get_db),
-) -> UserPublic:
+) -> Response:
     """Получить пользователя по ID."""
     user_crud = CRUDUser(db)
-    user = await user_crud.get_by_id(user_id=user_id)
+    user = await user_crud.get_by_id(user_id=user_id, model=UserPublic, validate=False, public=True)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден.")
-    
-    # Сериализуем created_at в ISO формат перед возвратом
-    user_dict = user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
-    return UserPublic(**user_dict)
+    return user_json_response(user)
 
 @router.get("/", response_model=List[UserPublic])
 async def read_users(
-    skip: int = 0,
+    cursor: Optional[str] = None,
+    skip: Optional[int] = None,
     limit: int = 100,
     db: AsyncIOMotorDatabase = Depends(get_db),
     current_user: UserPublic = Depends(get_current_user)
-) -> List[UserPublic]:
-    """Получить список пользователей."""
+) -> Response:
+    """
+    Получить список пользователей.
+
+    По умолчанию используется keyset-пагинация: токен следующей страницы
+    возвращается в заголовке X-Next-Cursor и передается в параметре cursor.
+    Параметр skip включает устаревшую пагинацию skip/limit.
+    """
     user_crud = CRUDUser(db)
-    users = await user_crud.get_multiple(skip=skip, limit=limit)
-    
-    # Сериализуем created_at в ISO формат для каждого пользователя в списке
-    users_list = []
-    for user in users:
-        user_dict = user.model_dump()
-        user_dict['created_at'] = user_dict['created_at'].isoformat()
-        users_list.append(UserPublic(**user_dict))
-    
-    return users_list
+    if skip is not None and cursor is None:
+        return users_json_response(
+            await user_crud.get_multiple(skip=skip, limit=limit, model=UserPublic, validate=False, public=True)
+        )
+
+    try:
+        users, next_cursor = await user_crud.get_page(
+            limit=limit, cursor=cursor, model=UserPublic, validate=False, public=True
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return users_json_response(users, headers=headers)
 
 @router.put("/{user_id}", response_model=UserPublic)
 async def update_user(
     user_id: UUID,
     user_update: UserUpdate,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserPublic = Depends(get_current_user)
-) -> UserPublic:
+    current_user: UserPublic = Depends(get_current_user_fresh)
+) -> Response:
     """Обновить данные пользователя."""
     if str(user_id) != str(current_user.id) and UserRole.ADMIN not in current_user.roles:
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав для выполнения операции")
 
+    # Обновление и чтение результата - одна команда findAndModify
     user_crud = CRUDUser(db)
-    user = await user_crud.get_by_id(user_id=user_id)
-    if not user:
+    try:
+        updated_user = await user_crud.update(user_id=user_id, user_update=user_update, model=UserPublic)
+    except DuplicateKeyError as e:
+        raise duplicate_user_exception(e)
+    if not updated_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден.")
-
-    updated_user = await user_crud.update(user_id=user_id, user_update=user_update)
-
-    # Сериализуем created_at в ISO формат перед возвратом
-    updated_user_dict = updated_user.model_dump()
-    updated_user_dict['created_at'] = updated_user_dict['created_at'].isoformat()
-    return UserPublic(**updated_user_dict)
+    return user_json_response(updated_user)
 
 @router.delete("/{user_id}", status_code=status.HTTP_200_OK)
 async def delete_user(
     user_id: UUID,
     db: AsyncIOMotorDatabase = Depends(get_db),
-    current_user: UserPublic = Depends(get_current_user)
+    current_user: UserPublic = Depends(get_current_user_fresh)
 ):
     """Удалить пользователя."""
     if str(user_id) != str(current_user.id) and UserRole.ADMIN not in current_user.roles:
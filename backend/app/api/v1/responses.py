@@ -0,0 +1,110 @@
+import uuid
+from datetime import datetime
+from typing import Annotated, Any, Iterable, List, Mapping, Optional, Union
+
+from fastapi import Response, status
+from pydantic import PlainSerializer, TypeAdapter
+from typing_extensions import TypedDict
+
+from app.models.user import UserPublic
+
+def _isoformat(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+class UserPublicDocument(TypedDict):
+    """
+    Документ пользователя, прочитанный с проекцией UserPublic.
+
+    Повторяет поля UserPublic и дает тот же JSON, но сериализуется без валидации:
+    данные в БД уже проверены при записи, а валидация (прежде всего EmailStr)
+    на порядок дороже самой сериализации. Документ из БД сначала проходит
+    через public_user_document: в нем может не быть необязательных полей.
+    """
+    id: uuid.UUID
+    email: str
+    username: Optional[str]
+    full_name: Optional[str]
+    roles: List[str]
+    status: str
+    is_active: bool
+    created_at: Annotated[Any, PlainSerializer(_isoformat)]
+
+class UserExportDocument(UserPublicDocument):
+    """Строка выгрузки: пользователь и токен продолжения выгрузки после этой строки."""
+    cursor: str
+
+# Адаптеры компилируются один раз при импорте
+user_public_adapter: TypeAdapter[UserPublic] = TypeAdapter(UserPublic)
+user_document_adapter: TypeAdapter[UserPublicDocument] = TypeAdapter(UserPublicDocument)
+users_document_adapter: TypeAdapter[List[UserPublicDocument]] = TypeAdapter(List[UserPublicDocument])
+users_public_adapter: TypeAdapter[List[UserPublic]] = TypeAdapter(List[UserPublic])
+user_export_adapter: TypeAdapter[UserExportDocument] = TypeAdapter(UserExportDocument)
+
+UserSource = Union[UserPublic, Mapping[str, Any], Any]
+
+# Поля UserPublic в порядке объявления и значения по умолчанию для отсутствующих в документе
+_PUBLIC_FIELDS = tuple(
+    (name, field.get_default(call_default_factory=True) if not field.is_required() else None)
+    for name, field in UserPublic.model_fields.items()
+)
+
+def public_user_document(document: Mapping[str, Any]) -> UserPublicDocument:
+    """
+    Приводит документ к полям UserPublic: порядок ключей как в модели, недостающие
+    необязательные поля - со значениями по умолчанию (username: null, roles: [] ...).
+    """
+    return {name: document.get(name, default) for name, default in _PUBLIC_FIELDS}
+
+def to_user_public(user: UserSource) -> UserPublic:
+    """Приводит модель пользователя (например, UserInDB) к UserPublic за одну валидацию."""
+    if isinstance(user, UserPublic):
+        return user
+    return UserPublic.model_validate(user)
+
+def dump_user(user: UserSource) -> bytes:
+    """Сериализует документ MongoDB (с проекцией UserPublic) или модель пользователя в JSON."""
+    if isinstance(user, Mapping):
+        return user_document_adapter.dump_json(public_user_document(user))
+    return user_public_adapter.dump_json(to_user_public(user))
+
+def dump_export_row(document: Mapping[str, Any], cursor: str) -> bytes:
+    """Сериализует строку выгрузки: поля UserPublic (как dump_user) и cursor."""
+    return user_export_adapter.dump_json({**public_user_document(document), "cursor": cursor})
+
+def dump_users(users: Iterable[UserSource]) -> bytes:
+    """Сериализует список пользователей в JSON (см. dump_user)."""
+    users = list(users)
+    if all(isinstance(user, Mapping) for user in users):
+        return users_document_adapter.dump_json([public_user_document(user) for user in users])
+    return users_public_adapter.dump_json([to_user_public(user) for user in users])
+
+def user_json_response(
+    user: UserSource,
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """
+    Сериализует пользователя напрямую в байты JSON.
+
+    Возвращаемый Response не проходит повторную валидацию по response_model и
+    jsonable_encoder; response_model эндпоинта остается только для OpenAPI.
+    """
+    return Response(
+        content=dump_user(user),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+def users_json_response(
+    users: Iterable[UserSource],
+    status_code: int = status.HTTP_200_OK,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """Сериализует список пользователей напрямую в байты JSON (см. user_json_response)."""
+    return Response(
+        content=dump_users(users),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
@@ -0,0 +1,57 @@
+import hashlib
+import math
+
+class BloomFilter:
+    """
+    Фильтр Блума для строковых ключей.
+
+    Отвечает "точно нет" или "возможно да": ложноотрицательных ответов не бывает,
+    доля ложноположительных при заполнении до capacity не превышает error_rate.
+    Позиции битов получаются двойным хешированием из одного дайджеста blake2b.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity <= 0:
+            raise ValueError("capacity должен быть положительным")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate должен быть в интервале (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        """Добавляет ключ в фильтр."""
+        added = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                self._bits[byte] |= 1 << bit
+                added = True
+        if added:
+            self._count += 1
+
+    def __contains__(self, key: str) -> bool:
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self._bits[byte] & (1 << bit):
+                return False
+        return True
+
+    def __len__(self) -> int:
+        """Приблизительное число добавленных ключей (повторы не учитываются)."""
+        return self._count
+
+    @property
+    def saturated(self) -> bool:
+        """Фильтр заполнен сверх расчетной емкости и дает больше ложных срабатываний."""
+        return self._count > self.capacity
@@ -1,14 +1,63 @@
 from functools import lru_cache
+from typing import Annotated, Dict, List, Literal, Optional
 
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
+    # memory - данные в памяти процесса (тесты, локальный запуск без MongoDB; один воркер)
+    STORAGE_BACKEND: Literal["mongo", "memory"] = "mongo"
     MONGO_URI: str = "mongodb://localhost:27017"
     MONGO_DB_NAME: str = "fastapi_monolith_db"
+    MONGO_RECONCILE_INDEXES_ON_STARTUP: bool = True
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_CONNECTING: int = 2
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 30000
+    MONGO_COMPRESSORS: List[str] = []  # Например ["zstd", "snappy"]; нужны пакеты zstandard/python-snappy
+    # Чтения публичных эндпоинтов (GET /users, /users/{id}); аутентификация всегда читает с primary
+    MONGO_PUBLIC_READ_PREFERENCE: Literal[
+        "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+    ] = "secondaryPreferred"
+    # Драйвер требует не меньше 90 секунд; None - без ограничения
+    MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS: Optional[Annotated[int, Field(ge=90)]] = 90
     JWT_SECRET_KEY: str = "your-secret-key-please-change-this"
     JWT_ALGORITHM: str = "HS256"
+    JWT_BACKEND: Literal["jose", "pyjwt", "hmac"] = "jose"
+    JWT_KEYS: Dict[str, str] = {}  # kid -> секрет
+    JWT_ACTIVE_KID: Optional[str] = None
+    # Токены без kid проверяются JWT_SECRET_KEY, только пока JWT_ACTIVE_KID не задан или включен этот флаг
+    JWT_ACCEPT_LEGACY_KEY: bool = False
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    REFRESH_TOKEN_MAX_SESSIONS: int = 10  # 0 - без ограничения
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_FILTER_REFRESH_SECONDS: float = 5.0
+    REVOCATION_FILTER_REBUILD_SECONDS: float = 3600.0
+    PASSWORD_HASHER_POOL_KIND: Literal["thread", "process"] = "thread"
+    PASSWORD_HASHER_POOL_SIZE: int = 4
+    BCRYPT_ROUNDS: Optional[int] = None
+    BCRYPT_CALIBRATE: bool = False
+    BCRYPT_TARGET_MS: int = 250
+    AUTH_CLAIMS_ONLY: bool = False
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    USERS_EXPORT_BATCH_SIZE: int = 1000
+    USERS_IMPORT_CHUNK_SIZE: int = 500
+    USERS_IMPORT_MAX_LINE_BYTES: int = 64 * 1024
+    USER_CHANGE_STREAM_ENABLED: bool = False
+    USER_CHANGE_STREAM_PRE_IMAGES: bool = True
+    USER_CHANGE_STREAM_RETRY_SECONDS: float = 1.0
+    METRICS_ENABLED: bool = True
+    PROFILER_MAX_SECONDS: float = 60
+    SLOW_QUERY_LOG_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 100
+    SLOW_QUERY_LOG_SIZE: int = 200
+    SLOW_QUERY_EXPLAIN: bool = True
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8')
 
@@ -0,0 +1,288 @@
+"""
+Метрики приложения в текстовом формате Prometheus.
+
+Счетчики и гистограммы пишутся без блокировок: у каждого потока свой шард
+(поток event loop и потоки драйвера MongoDB не мешают друг другу),
+а шарды суммируются только при выгрузке /metrics. Границы бакетов
+гистограмм фиксированы заранее, наблюдение - это bisect и два сложения.
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from starlette.routing import replace_params
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def percentile(ordered: Sequence[float], pct: float) -> float:
+    """
+    Перцентиль pct (0-100) по ближайшему рангу для отсортированной выборки; 0.0 для пустой.
+
+    Единое определение для /metrics, статистики пула и бенчмарков, чтобы их p95/p99 были сравнимы.
+    """
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class _ShardedMetric(ABC):
+    """Метрика с отдельным словарем значений на каждый поток."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, Any]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict[Labels, Any]:
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = self._local.values = {}
+            # Блокировка берется один раз на поток, а не на каждое наблюдение
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _shard_items(self) -> Iterable[Tuple[Labels, Any]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            yield from list(shard.items())
+
+    def reset(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Строки метрики в текстовом формате Prometheus (без HELP и TYPE)."""
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        totals: Dict[Labels, float] = {}
+        for labels, value in self._shard_items():
+            totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.values().items())
+        ]
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        shard = self._shard()
+        cell = shard.get(labels)
+        if cell is None:
+            # [счетчики по бакетам (последний - +Inf), сумма наблюдений]
+            cell = shard[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        cell[0][bisect_left(self.buckets, value)] += 1
+        cell[1] += value
+
+    def values(self) -> Dict[Labels, Tuple[List[int], float]]:
+        totals: Dict[Labels, Tuple[List[int], float]] = {}
+        for labels, (counts, total) in self._shard_items():
+            merged = totals.get(labels)
+            if merged is None:
+                totals[labels] = (list(counts), total)
+            else:
+                totals[labels] = ([a + b for a, b in zip(merged[0], counts)], merged[1] + total)
+        return totals
+
+    def render(self) -> List[str]:
+        lines = []
+        bounds = [*self.buckets, float("inf")]
+        for labels, (counts, total) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+class _CallbackMetric:
+    """Метрика, значения которой читаются из чужой статистики в момент выгрузки."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[Labels, float]]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            samples = list(self.callback())
+        except Exception as e:
+            print(f"Ошибка при сборе метрики {self.name}: {e}")
+            return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in samples
+            if value is not None
+        ]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Tuple[Labels, float]]],
+        kind: str = "gauge",
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        """Регистрирует метрику, значения которой берет callback при каждой выгрузке."""
+        self._metrics.pop(name, None)
+        self.register(_CallbackMetric(name, documentation, kind, labelnames, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests_total = registry.counter(
+    "http_requests_total", "Число HTTP запросов", ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса", ("method", "route")
+)
+
+# Маршрут для запросов, не попавших ни в один эндпоинт: сырой путь дал бы неограниченное число рядов
+UNMATCHED_ROUTE = "<unmatched>"
+
+def route_template(scope) -> str:
+    """
+    Шаблон пути эндпоинта, обработавшего запрос ("/api/v1/users/{user_id}").
+
+    В зависимости от версии FastAPI scope["route"].path содержит шаблон с префиксом
+    include_router или без него; префикс восстанавливается из фактического пути:
+    это путь запроса без части, соответствующей шаблону самого маршрута.
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not path_format:
+        return UNMATCHED_ROUTE
+    try:
+        rendered, _ = replace_params(path_format, route.param_convertors, dict(scope.get("path_params", {})))
+    except Exception:
+        return path_format
+    path = scope["path"]
+    if rendered and path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + path_format
+    return path_format
+
+class MetricsMiddleware:
+    """
+    ASGI middleware, считающее запросы и время их обработки по шаблонам маршрутов.
+
+    Метка route - шаблон пути ("/api/v1/users/{user_id}"), который роутер
+    записывает в scope["route"], поэтому число рядов ограничено числом эндпоинтов.
+    """
+
+    def __init__(self, app, excluded_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = frozenset(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route_path = route_template(scope)
+            method = scope["method"]
+            http_request_duration_seconds.observe(elapsed, (method, route_path))
+            http_requests_total.inc((method, route_path, str(status_code)))
@@ -0,0 +1,125 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+Frame = Tuple[str, str, int]  # (функция, файл, строка первой строки функции)
+Stack = Tuple[Frame, ...]     # от корня к листу
+
+class ProfilerBusy(Exception):
+    """Профилировщик уже выполняет замер."""
+
+class SamplingProfile:
+    """Результат замера: сколько раз встретился каждый стек."""
+
+    def __init__(self, stacks: Counter, interval: float, duration: float, thread_name: str):
+        self.stacks = stacks
+        self.interval = interval
+        self.duration = duration
+        self.thread_name = thread_name
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def to_collapsed(self) -> str:
+        """Формат collapsed stacks ("a;b;c 12"), понятный flamegraph.pl и speedscope."""
+        lines = [
+            ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """Профиль в формате speedscope (https://www.speedscope.app/file-format-schema.json)."""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        for stack, count in self.stacks.most_common():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    name, filename, line = frame
+                    frames.append({"name": name, "file": filename, "line": line})
+                indexes.append(index)
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": f"{self.thread_name} ({self.samples} samples)",
+            "exporter": "app.core.profiler",
+        }
+
+def _stack(frame) -> Stack:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик одного потока (обычно потока event loop).
+
+    Отдельный поток раз в interval снимает стек целевого потока через
+    sys._current_frames(). Пока замер не идет, профилировщик ничего не делает:
+    нет ни потока, ни хуков трассировки. Одновременно выполняется один замер.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, thread_id: int, duration: float, interval: float) -> SamplingProfile:
+        """Снимает стеки потока thread_id в течение duration секунд (блокирует вызывающий поток)."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            thread_name = next(
+                (thread.name for thread in threading.enumerate() if thread.ident == thread_id),
+                str(thread_id),
+            )
+            stacks: Counter = Counter()
+            started = time.perf_counter()
+            deadline = started + duration
+            next_sample = started
+            while True:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break  # Поток завершился
+                stack = _stack(frame)
+                del frame
+                if stack:
+                    stacks[stack] += 1
+                next_sample += interval
+                now = time.perf_counter()
+                if next_sample >= deadline:
+                    break
+                if next_sample > now:
+                    time.sleep(next_sample - now)
+                else:
+                    next_sample = now  # Не догоняем пропущенные отсчеты пачкой
+            return SamplingProfile(stacks, interval, time.perf_counter() - started, thread_name)
+        finally:
+            self._lock.release()
+
+profiler = SamplingProfiler()
@@ -1,13 +1,34 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Mapping, Type
+from uuid import uuid4
 
 from jose import jwt, JWTError
 
+try:
+    import jwt as pyjwt  # PyJWT, необязательный бэкенд JWT
+except ImportError:
+    pyjwt = None
+
 from app.core.config import settings
 
 # Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_PWD_CONTEXT_DEFAULTS = {"schemes": ["bcrypt"], "deprecated": "auto"}
+pwd_context = CryptContext(**_PWD_CONTEXT_DEFAULTS)
+
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_MAX_ROUNDS = 31
+
+# Число раундов bcrypt, примененное через configure_password_hashing (None - значение passlib по умолчанию)
+_bcrypt_rounds: Optional[int] = None
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверяет соответствие обычного пароля его хешированной версии."""
@@ -17,6 +38,263 @@ def get_password_hash(password: str) -> str:
     """Хеширует пароль."""
     return pwd_context.hash(password)
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Проверяет, создан ли хеш с устаревшими параметрами (например, другим числом раундов)."""
+    return pwd_context.needs_update(hashed_password)
+
+def configure_password_hashing(rounds: Optional[int]) -> None:
+    """
+    Задает стоимость bcrypt для новых хешей.
+
+    Хеши с другим числом раундов после этого считаются устаревшими
+    и перехешируются при следующем успешном входе.
+    """
+    global _bcrypt_rounds
+    _bcrypt_rounds = rounds
+    pwd_context.load(_PWD_CONTEXT_DEFAULTS)
+    if rounds is not None:
+        pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+
+def measure_bcrypt_ms(rounds: int, samples: int = 3) -> float:
+    """Измеряет время хеширования bcrypt с заданным числом раундов на текущей машине (лучшее из samples)."""
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def calibrate_bcrypt_rounds(target_ms: float) -> int:
+    """
+    Подбирает максимальное число раундов bcrypt, при котором хеширование укладывается в target_ms.
+
+    Каждый дополнительный раунд удваивает стоимость, поэтому достаточно одного замера
+    на дешевом значении и экстраполяции; результат затем проверяется прямым замером.
+    """
+    probe_rounds = 8
+    estimated_ms = measure_bcrypt_ms(probe_rounds)
+    rounds = probe_rounds
+    while rounds < BCRYPT_MAX_ROUNDS and estimated_ms * 2 <= target_ms:
+        rounds += 1
+        estimated_ms *= 2
+    while rounds > BCRYPT_MIN_ROUNDS and estimated_ms > target_ms:
+        rounds -= 1
+        estimated_ms /= 2
+    if rounds > BCRYPT_MIN_ROUNDS and measure_bcrypt_ms(rounds, samples=1) > target_ms:
+        rounds -= 1
+    return rounds
+
+def init_password_hashing() -> None:
+    """Применяет настройки стоимости bcrypt при старте приложения (до создания пула хеширования)."""
+    rounds = settings.BCRYPT_ROUNDS
+    if settings.BCRYPT_CALIBRATE:
+        rounds = calibrate_bcrypt_rounds(settings.BCRYPT_TARGET_MS)
+        print(f"bcrypt calibrated: {rounds} rounds for a {settings.BCRYPT_TARGET_MS} ms budget")
+    configure_password_hashing(rounds)
+
+# Пул для bcrypt: хеширование занимает сотни миллисекунд CPU и не должно блокировать event loop
+_password_executor: Optional[Executor] = None
+
+def get_password_executor() -> Executor:
+    """Возвращает (и при первом вызове создает) пул для хеширования паролей."""
+    global _password_executor
+    if _password_executor is None:
+        if settings.PASSWORD_HASHER_POOL_KIND == "process":
+            # Процессы-воркеры получают ту же стоимость bcrypt, что и основной процесс
+            _password_executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHER_POOL_SIZE,
+                initializer=configure_password_hashing,
+                initargs=(_bcrypt_rounds,),
+            )
+        else:
+            _password_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHER_POOL_SIZE,
+                thread_name_prefix="password-hasher",
+            )
+    return _password_executor
+
+def shutdown_password_executor() -> None:
+    """Останавливает пул хеширования паролей (вызывается при остановке приложения)."""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Асинхронная версия verify_password, выполняемая в пуле хеширования."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), verify_password, plain_password, hashed_password)
+
+async def ahash_password(password: str) -> str:
+    """Асинхронная версия get_password_hash, выполняемая в пуле хеширования."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), get_password_hash, password)
+
+class JWTCodec(ABC):
+    """
+    Кодек JWT с набором ключей, выбираемых по kid.
+
+    Новые токены подписываются активным ключом, и его kid записывается в заголовок.
+    При проверке ключ выбирается по kid из заголовка, поэтому после ротации
+    токены, выпущенные прежними ключами, действуют, пока их kid есть в наборе.
+    Токены без kid проверяются ключом None (JWT_SECRET_KEY, если он есть в наборе).
+    """
+
+    name = "base"
+
+    def __init__(self, keys: Mapping[Optional[str], str], active_kid: Optional[str], algorithm: str):
+        if active_kid not in keys:
+            raise ValueError(f"Активный ключ JWT {active_kid!r} отсутствует в наборе ключей")
+        self.keys = dict(keys)
+        self.active_kid = active_kid
+        self.algorithm = algorithm
+        self._active_key = self.keys[active_kid]
+        self._headers = {"kid": active_kid} if active_kid is not None else None
+
+    @abstractmethod
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """Подписывает claims активным ключом."""
+
+    @abstractmethod
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        """Проверяет подпись и срок действия; None, если токен недействителен."""
+
+class JoseCodec(JWTCodec):
+    """Кодек на python-jose (поведение по умолчанию)."""
+
+    name = "jose"
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return jwt.encode(claims, self._active_key, algorithm=self.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            key = self.keys.get(jwt.get_unverified_header(token).get("kid"))
+            if key is None:
+                return None
+            return jwt.decode(token, key, algorithms=[self.algorithm])
+        except JWTError:
+            return None
+
+class PyJWTCodec(JWTCodec):
+    """Кодек на PyJWT (необязательная зависимость)."""
+
+    name = "pyjwt"
+
+    def __init__(self, keys: Mapping[Optional[str], str], active_kid: Optional[str], algorithm: str):
+        if pyjwt is None:
+            raise RuntimeError("Для JWT_BACKEND=pyjwt нужен пакет PyJWT")
+        super().__init__(keys, active_kid, algorithm)
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return pyjwt.encode(claims, self._active_key, algorithm=self.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            key = self.keys.get(pyjwt.get_unverified_header(token).get("kid"))
+            if key is None:
+                return None
+            # Как и python-jose, не требуем, чтобы sub был строкой определенного формата
+            return pyjwt.decode(token, key, algorithms=[self.algorithm], options={"verify_sub": False})
+        except pyjwt.PyJWTError:
+            return None
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+class HMACSHA256Codec(JWTCodec):
+    """
+    Минимальная реализация HS256 на hmac и json стандартной библиотеки.
+
+    Ключи и заголовки кодируются один раз при создании кодека. Проверяет
+    подпись, алгоритм в заголовке и сроки exp/nbf; прочие заявки не проверяются.
+    """
+
+    name = "hmac"
+
+    def __init__(self, keys: Mapping[Optional[str], str], active_kid: Optional[str], algorithm: str = "HS256"):
+        if algorithm != "HS256":
+            raise ValueError("Кодек hmac поддерживает только HS256")
+        super().__init__(keys, active_kid, algorithm)
+        self._hmac_keys = {kid: key.encode() for kid, key in self.keys.items()}
+        header = {"alg": "HS256", "typ": "JWT"}
+        if active_kid is not None:
+            header["kid"] = active_kid
+        self._encoded_header = _b64encode(json.dumps(header, separators=(",", ":")).encode())
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        exp = claims.get("exp")
+        if isinstance(exp, datetime):
+            claims = {**claims, "exp": int(exp.timestamp())}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = self._encoded_header + b"." + payload
+        signature = hmac.new(self._hmac_keys[self.active_kid], signing_input, hashlib.sha256).digest()
+        return (signing_input + b"." + _b64encode(signature)).decode()
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            encoded_header, encoded_payload, encoded_signature = token.split(".")
+            header = json.loads(_b64decode(encoded_header))
+            if header.get("alg") != "HS256":
+                return None
+            key = self._hmac_keys.get(header.get("kid"))
+            if key is None:
+                return None
+            signing_input = f"{encoded_header}.{encoded_payload}".encode()
+            expected = hmac.new(key, signing_input, hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, _b64decode(encoded_signature)):
+                return None
+            payload = json.loads(_b64decode(encoded_payload))
+        except (ValueError, TypeError, AttributeError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+        now = time.time()
+        try:
+            if "exp" in payload and now >= float(payload["exp"]):
+                return None
+            if "nbf" in payload and now < float(payload["nbf"]):
+                return None
+        except (TypeError, ValueError):
+            return None
+        return payload
+
+JWT_CODECS: Dict[str, Type[JWTCodec]] = {
+    JoseCodec.name: JoseCodec,
+    PyJWTCodec.name: PyJWTCodec,
+    HMACSHA256Codec.name: HMACSHA256Codec,
+}
+
+def build_codec(backend: str) -> JWTCodec:
+    """
+    Создает кодек backend с ключами и алгоритмом из настроек.
+
+    JWT_SECRET_KEY (ключ токенов без kid) доверяется, только пока активного kid нет
+    или явно задан JWT_ACCEPT_LEGACY_KEY: после ротации старый секрет не действует.
+    """
+    keys: Dict[Optional[str], str] = dict(settings.JWT_KEYS)
+    if settings.JWT_ACTIVE_KID is None or settings.JWT_ACCEPT_LEGACY_KEY:
+        keys[None] = settings.JWT_SECRET_KEY
+    return JWT_CODECS[backend](keys, settings.JWT_ACTIVE_KID, settings.JWT_ALGORITHM)
+
+_codec: Optional[JWTCodec] = None
+
+def get_codec() -> JWTCodec:
+    """Возвращает кодек JWT_BACKEND, созданный при первом вызове."""
+    global _codec
+    if _codec is None:
+        _codec = build_codec(settings.JWT_BACKEND)
+    return _codec
+
+def reset_codec() -> None:
+    """Сбрасывает кодек, чтобы следующий вызов перечитал настройки (например, после ротации ключей)."""
+    global _codec
+    _codec = None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создает JWT access token."""
     to_encode = data.copy()
@@ -24,9 +302,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+    to_encode.update({"exp": int(expire.timestamp())})
+    # Идентификатор токена: по нему токен можно отозвать до истечения срока
+    to_encode.setdefault("jti", uuid4().hex)
+    return get_codec().encode(to_encode)
 
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создает JWT refresh token."""
@@ -35,17 +314,12 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": int(expire.timestamp())})
     # Refresh токены часто не содержат столько информации, как access токены
     # Здесь можно оставить только user_id или другую минимальную информацию
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+    return get_codec().encode(to_encode)
 
 def decode_token(token: str) -> Optional[Dict[str, Any]]:
     """Декодирует JWT токен и возвращает его полезную нагрузку."""
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        # Здесь можно добавить валидацию полезной нагрузки, например, с помощью TokenData
-        return payload
-    except JWTError:
-        return None 
\ No newline at end of file
+    # Здесь можно добавить валидацию полезной нагрузки, например, с помощью TokenData
+    return get_codec().decode(token)
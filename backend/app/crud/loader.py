@@ -0,0 +1,77 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Mapping, Optional, Set, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class BatchLoader(Generic[K, V]):
+    """
+    Загрузчик в стиле DataLoader: одиночные запросы, сделанные в одном такте
+    event loop, объединяются в один вызов batch_fn.
+
+    Результаты запоминаются на время жизни загрузчика, поэтому он создается
+    на один запрос (см. app.api.v1.deps.get_user_loader), а не глобально.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[K]], Awaitable[Mapping[K, V]]]):
+        self._batch_fn = batch_fn
+        self._futures: Dict[K, "asyncio.Future[Optional[V]]"] = {}
+        self._pending: Dict[K, "asyncio.Future[Optional[V]]"] = {}
+        self._dispatch_scheduled = False
+        # Ссылки на задачи пачек: без них задачу может собрать сборщик мусора
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.keys_loaded = 0
+
+    def load(self, key: K) -> "asyncio.Future[Optional[V]]":
+        """Ставит ключ в текущую пачку и возвращает future с результатом (None, если не найден)."""
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._pending[key] = future
+            if not self._dispatch_scheduled:
+                # Пачка уходит после того, как отработают все уже запланированные в этом такте шаги
+                self._dispatch_scheduled = True
+                loop.call_soon(self._dispatch)
+        # shield: отмена одного ожидающего не должна отменять результат для остальных
+        return asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        """Загружает несколько ключей одной пачкой."""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._dispatch_scheduled = False
+        task = asyncio.get_running_loop().create_task(self._run_batch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, pending: Dict[K, "asyncio.Future[Optional[V]]"]) -> None:
+        self.batches += 1
+        self.keys_loaded += len(pending)
+        try:
+            results = await self._batch_fn(list(pending))
+            for key, future in pending.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        except Exception as e:
+            self._fail(pending, e)
+        except BaseException:
+            # Отмена задачи пачки не должна оставлять ожидающих висеть
+            self._fail(pending, None)
+            raise
+
+    def _fail(self, pending: Dict[K, "asyncio.Future[Optional[V]]"], error: Optional[Exception]) -> None:
+        """Завершает future пачки ошибкой (или отменяет, если error - None) и забывает ключи для повторной загрузки."""
+        for key, future in pending.items():
+            if self._futures.get(key) is future:
+                del self._futures[key]
+            if future.done():
+                continue
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.core.metrics import registry
+from app.crud.token import CRUDTokenBlacklist
+
+# Запас при инкрементальном чтении: записи с немного отстающими часами не теряются
+_WATERMARK_OVERLAP = timedelta(seconds=5)
+
+class TokenRevocationList:
+    """
+    Проверка отзыва access токенов с фильтром Блума перед черным списком в MongoDB.
+
+    Фильтр содержит jti всех неистекших отозванных токенов. Промах фильтра
+    означает, что токен точно не отозван, и обходится без запроса к БД;
+    только попадания подтверждаются запросом к коллекции черного списка.
+
+    Фоновая задача (start, вызывается в lifespan) раз в refresh_interval
+    дочитывает записи, отозванные другими воркерами (по revoked_at), а раз в
+    rebuild_interval строит фильтр заново из неистекших записей - так из него
+    выходят истекшие токены. Проверка только читает текущий фильтр и не ждет
+    обновления. Пока фильтр ни разу не построен, каждая проверка идет в БД.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        refresh_interval: float,
+        rebuild_interval: float,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter: Optional[BloomFilter] = None
+        self._watermark: Optional[datetime] = None
+        self._refreshed_at = float("-inf")
+        self._built_at = float("-inf")
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.filter_hits = 0
+        self.confirmed = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def add(self, jti: str) -> None:
+        """Добавляет jti в локальный фильтр (отзыв виден этому воркеру сразу)."""
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def reset(self) -> None:
+        """Сбрасывает фильтр; следующая синхронизация построит его заново."""
+        self._filter = None
+        self._watermark = None
+        self._refreshed_at = float("-inf")
+        self._built_at = float("-inf")
+
+    def start(self, db: AsyncIOMotorDatabase) -> None:
+        """Запускает фоновое обновление фильтра; первое построение - сразу."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db), name="token-revocations-sync")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, db: AsyncIOMotorDatabase) -> None:
+        while True:
+            await self.sync(db, force=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def sync(self, db: AsyncIOMotorDatabase, force: bool = False) -> None:
+        """Обновляет фильтр, если подошел срок (или сразу при force)."""
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            if not force and now - self._refreshed_at < self.refresh_interval:
+                return  # Обновил конкурентный запрос, пока мы ждали блокировку
+            try:
+                if (
+                    self._filter is None
+                    or self._filter.saturated
+                    or now - self._built_at >= self.rebuild_interval
+                ):
+                    await self._rebuild(db)
+                else:
+                    await self._refresh(db)
+            except Exception as e:
+                # Работаем со старым фильтром; без фильтра проверки идут в БД
+                print(f"Ошибка обновления фильтра отозванных токенов: {e}")
+            self._refreshed_at = time.monotonic()
+
+    async def _rebuild(self, db: AsyncIOMotorDatabase) -> None:
+        started = time.monotonic()
+        entries = [entry async for entry in CRUDTokenBlacklist(db).iter_revoked()]
+        bloom = BloomFilter(max(self.capacity, 2 * len(entries)), self.error_rate)
+        watermark = None
+        for jti, revoked_at in entries:
+            bloom.add(jti)
+            if revoked_at is not None and (watermark is None or revoked_at > watermark):
+                watermark = revoked_at
+        # Отзывы, сделанные этим воркером во время чтения, дочитает следующее обновление
+        self._filter = bloom
+        self._watermark = watermark
+        self._built_at = started
+        self.rebuilds += 1
+
+    async def _refresh(self, db: AsyncIOMotorDatabase) -> None:
+        since = self._watermark - _WATERMARK_OVERLAP if self._watermark is not None else None
+        async for jti, revoked_at in CRUDTokenBlacklist(db).iter_revoked(since):
+            self._filter.add(jti)
+            if revoked_at is not None and (self._watermark is None or revoked_at > self._watermark):
+                self._watermark = revoked_at
+        self.refreshes += 1
+
+    async def is_revoked(self, jti: str, db: AsyncIOMotorDatabase) -> bool:
+        """Проверяет, отозван ли токен; в БД обращается только при попадании в фильтр."""
+        self.checks += 1
+        if self._filter is not None and jti not in self._filter:
+            return False
+        self.filter_hits += 1
+        revoked = await CRUDTokenBlacklist(db).is_revoked(jti)
+        if revoked:
+            self.confirmed += 1
+        return revoked
+
+    async def revoke(self, jti: str, expires_at: datetime, db: AsyncIOMotorDatabase) -> None:
+        """Отзывает токен: запись в черный список и в локальный фильтр."""
+        await CRUDTokenBlacklist(db).revoke(jti, expires_at)
+        self.add(jti)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "checks": self.checks,
+            "filter_hits": self.filter_hits,
+            "confirmed": self.confirmed,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+            "size": len(self._filter) if self._filter is not None else 0,
+        }
+
+token_revocations = TokenRevocationList(
+    capacity=settings.REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    refresh_interval=settings.REVOCATION_FILTER_REFRESH_SECONDS,
+    rebuild_interval=settings.REVOCATION_FILTER_REBUILD_SECONDS,
+)
+
+registry.callback("token_revocation_checks_total", "Проверки отзыва access токенов",
+                  lambda: [((), token_revocations.checks)], kind="counter")
+registry.callback("token_revocation_filter_hits_total", "Проверки отзыва, потребовавшие запроса к БД",
+                  lambda: [((), token_revocations.filter_hits)], kind="counter")
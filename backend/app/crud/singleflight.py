@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые запросы в один.
+
+    Пока запрос с ключом key выполняется, остальные вызовы с тем же ключом
+    ждут его результат вместо собственного обращения к БД. После завершения
+    ключ освобождается, поэтому окна устаревания, как у кеша, нет.
+    Результат общий для всех ожидающих и не должен изменяться вызывающим кодом.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет fn() или присоединяется к уже выполняющемуся вызову с тем же ключом."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.collapsed += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, key=key: self._release(key, done))
+        # shield: отмена одного из ожидающих не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Ошибку получают ожидающие; здесь лишь помечаем ее как обработанную
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики для мониторинга: всего вызовов и сколько из них присоединились к чужому запросу."""
+        return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": len(self._in_flight)}
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, Tuple
+from uuid import UUID, uuid4
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db.session import REFRESH_TOKENS_COLLECTION, TOKEN_BLACKLIST_COLLECTION, primary_collection
+from app.models.token import RefreshTokenInDB, TokenBlacklist
+
+class CRUDRefreshToken:
+    """
+    Жизненный цикл refresh токенов.
+
+    Каждое обновление отзывает предъявленный токен и выдает новый в том же семействе.
+    Отозванные токены хранятся до истечения срока (их удаляет TTL-индекс по expires_at),
+    поэтому повторное предъявление уже использованного токена распознается как утечка
+    и отзывает все семейство.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        # Поиск токена при обновлении и выходе не должен видеть отставшую реплику
+        self.collection = primary_collection(db, REFRESH_TOKENS_COLLECTION)
+
+    async def issue(self, user_id: UUID, family_id: Optional[UUID] = None) -> RefreshTokenInDB:
+        """
+        Выдает новый refresh токен.
+
+        Без family_id открывается новая сессия; сверх REFRESH_TOKEN_MAX_SESSIONS
+        самые давно обновлявшиеся сессии пользователя удаляются.
+        """
+        token = RefreshTokenInDB(
+            user_id=user_id,
+            refresh_token=str(uuid4()),
+            expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+        if family_id is not None:
+            token.family_id = family_id
+        await self.collection.insert_one(token.model_dump(by_alias=True))
+        if family_id is None and settings.REFRESH_TOKEN_MAX_SESSIONS > 0:
+            await self.enforce_session_limit(user_id, settings.REFRESH_TOKEN_MAX_SESSIONS)
+        return token
+
+    async def rotate(self, refresh_token: str) -> Optional[RefreshTokenInDB]:
+        """
+        Обменивает действующий refresh токен на новый из того же семейства.
+
+        Возвращает None, если токен недействителен. Если токен уже был отозван,
+        отзывается все его семейство. Токен, выданный до появления семейств
+        (без family_id), обменивается на токен нового семейства.
+        """
+        now = datetime.now(timezone.utc)
+        # Отзыв и проверка - одна атомарная операция: токен нельзя обменять дважды
+        current = await self.collection.find_one_and_update(
+            {"refresh_token": refresh_token, "is_revoked": False, "expires_at": {"$gt": now}},
+            {"$set": {"is_revoked": True, "revoked_at": now, "updated_at": now}},
+            projection={"_id": 0, "user_id": 1, "family_id": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if current:
+            return await self.issue(current["user_id"], family_id=current.get("family_id"))
+
+        reused = await self.collection.find_one(
+            {"refresh_token": refresh_token, "is_revoked": True},
+            {"_id": 0, "user_id": 1, "family_id": 1},
+        )
+        if reused and reused.get("family_id") is not None:
+            print(f"Повторное использование refresh токена пользователя {reused['user_id']}: семейство отозвано")
+            await self.revoke_family(reused["family_id"])
+        return None
+
+    async def revoke_session(self, refresh_token: str, user_id: UUID) -> bool:
+        """Отзывает сессию пользователя user_id, которой принадлежит refresh токен; False, если такого токена нет."""
+        token = await self.collection.find_one(
+            {"refresh_token": refresh_token, "user_id": user_id}, {"_id": 1, "family_id": 1}
+        )
+        if not token:
+            return False
+        if token.get("family_id") is None:
+            # Токен без семейства - сессия из одного токена
+            now = datetime.now(timezone.utc)
+            await self.collection.update_one(
+                {"_id": token["_id"], "is_revoked": False},
+                {"$set": {"is_revoked": True, "revoked_at": now, "updated_at": now}},
+            )
+            return True
+        await self.revoke_family(token["family_id"])
+        return True
+
+    async def revoke_family(self, family_id: UUID) -> int:
+        """Отзывает все токены семейства; возвращает число отозванных."""
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_many(
+            {"family_id": family_id, "is_revoked": False},
+            {"$set": {"is_revoked": True, "revoked_at": now, "updated_at": now}},
+        )
+        return result.modified_count
+
+    async def enforce_session_limit(self, user_id: UUID, max_sessions: int) -> int:
+        """
+        Оставляет пользователю не более max_sessions живых сессий.
+
+        Каждая сессия держит один неотозванный токен; сессии сверх лимита, начиная
+        с самых давно обновлявшихся, удаляются вместе со всей историей ротаций.
+        Токены без family_id (выданные до появления семейств) - отдельные сессии,
+        они удаляются по _id. Возвращает число удаленных документов.
+        """
+        cursor = self.collection.find(
+            {"user_id": user_id, "is_revoked": False, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 1, "family_id": 1},
+        ).sort("created_at", -1).skip(max_sessions)
+        families, legacy_ids = [], []
+        async for doc in cursor:
+            if doc.get("family_id") is not None:
+                families.append(doc["family_id"])
+            else:
+                legacy_ids.append(doc["_id"])
+        evicted = [{"family_id": {"$in": families}}] if families else []
+        if legacy_ids:
+            evicted.append({"_id": {"$in": legacy_ids}})
+        if not evicted:
+            return 0
+        result = await self.collection.delete_many({"$or": evicted} if len(evicted) > 1 else evicted[0])
+        return result.deleted_count
+
+class CRUDTokenBlacklist:
+    """Отозванные до истечения срока access токены (по jti); истекшие записи удаляет TTL-индекс."""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.collection = primary_collection(db, TOKEN_BLACKLIST_COLLECTION)
+
+    async def revoke(self, jti: str, expires_at: datetime) -> TokenBlacklist:
+        """Вносит токен в черный список; повторный отзыв ничего не меняет."""
+        entry = TokenBlacklist(token=jti, expires_at=expires_at)
+        try:
+            await self.collection.insert_one(entry.model_dump(by_alias=True))
+        except DuplicateKeyError:
+            pass
+        return entry
+
+    async def is_revoked(self, jti: str) -> bool:
+        """Проверяет, есть ли токен в черном списке."""
+        return await self.collection.find_one({"token": jti}, {"_id": 1}) is not None
+
+    async def iter_revoked(self, since: Optional[datetime] = None) -> AsyncIterator[Tuple[str, datetime]]:
+        """Перебирает неистекшие записи (jti, revoked_at), отозванные не раньше since."""
+        query = {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+        if since is not None:
+            query["revoked_at"] = {"$gte": since}
+        async for entry in self.collection.find(query, {"_id": 0, "token": 1, "revoked_at": 1}):
+            yield entry["token"], entry["revoked_at"]
@@ -1,34 +1,175 @@
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List, Optional
+import asyncio
+import base64
+import json
+import re
+from functools import cached_property, lru_cache
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from typing import Any, AsyncIterator, Dict, Iterable, List, Literal, Mapping, Optional, Tuple, Type, TypeVar, Union, overload
 from uuid import UUID
 from datetime import datetime, timezone
 
 from app.models.user import UserCreate, UserInDB, UserUpdate
-from app.db.session import USERS_COLLECTION
-from app.core.security import get_password_hash
+from app.db.session import USERS_COLLECTION, primary_collection, public_collection, register_user_cache
+from app.core.cache import principal_cache
+from app.core.metrics import registry
+from app.core.security import ahash_password
+from app.crud.loader import BatchLoader
+from app.crud.singleflight import SingleFlight
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+# Документ пользователя как его вернул драйвер (с проекцией модели) - результат чтений с validate=False
+UserDocument = Dict[str, Any]
+
+@lru_cache(maxsize=None)
+def projection_for(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Проекция MongoDB, запрашивающая только поля модели.
+
+    Чтение в UserPublic не тянет из БД hashed_password и прочие ненужные поля.
+    """
+    projection: Dict[str, Any] = {"_id": 0}
+    for name, field in model.model_fields.items():
+        projection[field.alias or name] = 1
+    return projection
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+_DUPLICATE_INDEX_RE = re.compile(r"index: (\w+?)(?:_-?1)* dup key")
+
+def duplicate_key_field(error_details: Optional[Mapping[str, Any]]) -> Optional[str]:
+    """
+    Возвращает поле уникального индекса, нарушенного записью (ошибка 11000).
+
+    Берется из keyPattern, а если сервер его не прислал - из имени индекса в errmsg.
+    """
+    if not error_details:
+        return None
+    key_pattern = error_details.get("keyPattern") or {}
+    if key_pattern:
+        return next(iter(key_pattern))
+    match = _DUPLICATE_INDEX_RE.search(error_details.get("errmsg", ""))
+    return match.group(1) if match else None
+
+# Порядок keyset-пагинации; ему соответствует составной индекс (created_at, id)
+USERS_PAGE_SORT = [("created_at", 1), ("id", 1)]
+
+def encode_users_cursor(created_at: datetime, user_id: UUID) -> str:
+    """Кодирует позицию в списке пользователей в непрозрачный токен продолжения."""
+    raw = json.dumps({"c": created_at.isoformat(), "i": str(user_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_users_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Декодирует токен продолжения; ValueError, если токен поврежден."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["c"]), UUID(data["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Некорректный курсор пагинации") from e
+
+def users_after_filter(created_at: datetime, user_id: UUID) -> dict:
+    """Фильтр "строго после позиции (created_at, id)" в порядке USERS_PAGE_SORT."""
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "id": {"$gt": user_id}},
+    ]}
+
+# Кеш пользователей сбрасывается и по изменениям, сделанным другими воркерами
+register_user_cache(principal_cache)
+
+# Одновременные одинаковые чтения пользователей выполняются одним запросом к БД
+user_reads = SingleFlight()
+registry.callback("user_reads_calls_total", "Чтения пользователей по id",
+                  lambda: [((), user_reads.stats()["calls"])], kind="counter")
+registry.callback("user_reads_collapsed_total", "Чтения пользователей, присоединившиеся к уже выполняемому запросу",
+                  lambda: [((), user_reads.stats()["collapsed"])], kind="counter")
 
 class CRUDUser:
+    """
+    Операции с пользователями.
+
+    Чтения по умолчанию идут на primary: аутентификация и проверки прав должны
+    видеть последние записи. Методы с public=True читают через public_collection
+    (read preference MONGO_PUBLIC_READ_PREFERENCE) и могут вернуть данные реплики,
+    отстающей не больше MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS.
+    """
+
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.collection = db[USERS_COLLECTION]
+        self.collection = primary_collection(db, USERS_COLLECTION)
+
+    @cached_property
+    def public_collection(self) -> AsyncIOMotorCollection:
+        return public_collection(self.db, USERS_COLLECTION)
+
+    def _reads(self, public: bool) -> AsyncIOMotorCollection:
+        return self.public_collection if public else self.collection
+
+    @overload
+    async def get_by_id(
+        self, user_id: UUID, model: Type[ModelT] = ..., validate: Literal[True] = ..., public: bool = ...
+    ) -> Optional[ModelT]: ...
+
+    @overload
+    async def get_by_id(
+        self, user_id: UUID, model: Type[ModelT] = ..., *, validate: Literal[False], public: bool = ...
+    ) -> Optional[UserDocument]: ...
+
+    async def get_by_id(
+        self,
+        user_id: UUID,
+        model: Type[ModelT] = UserInDB,
+        validate: bool = True,
+        public: bool = False,
+    ) -> Optional[Union[ModelT, UserDocument]]:
+        """
+        Получает пользователя по его UUID в виде модели model (запрашиваются только ее поля).
 
-    async def get_by_id(self, user_id: UUID) -> Optional[UserInDB]:
-        """Получает пользователя по его UUID."""
-        user_data = await self.collection.find_one({"id": user_id})
+        С validate=False возвращается сам документ с проекцией model - для путей,
+        которые сразу сериализуют его в ответ (см. app.api.v1.responses).
+        Одновременные вызовы с одинаковыми аргументами выполняются одним запросом (user_reads);
+        чтения с primary и с реплик не объединяются.
+        """
+        collection = self._reads(public)
+        user_data = await user_reads.do(
+            ("get_by_id", collection.full_name, public, user_id, model),
+            lambda: collection.find_one({"id": user_id}, projection_for(model)),
+        )
         if user_data:
-            return UserInDB(**user_data)
+            return model.model_validate(user_data) if validate else user_data
         return None
 
-    async def get_by_email(self, email: str) -> Optional[UserInDB]:
-        """Получает пользователя по email."""
-        user_data = await self.collection.find_one({"email": email})
+    async def get_many_by_ids(
+        self,
+        user_ids: Iterable[UUID],
+        model: Type[ModelT] = UserInDB,
+        public: bool = False,
+    ) -> Dict[UUID, ModelT]:
+        """Получает нескольких пользователей одним запросом $in; отсутствующие id в результат не попадают."""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        projection = {**projection_for(model), "id": 1}
+        users = await self._reads(public).find({"id": {"$in": user_ids}}, projection).to_list(length=len(user_ids))
+        return {user["id"]: model.model_validate(user) for user in users}
+
+    def loader(self, model: Type[ModelT] = UserInDB, public: bool = False) -> BatchLoader[UUID, ModelT]:
+        """Создает загрузчик, объединяющий вызовы load(user_id) одного такта в один get_many_by_ids."""
+        return BatchLoader(lambda user_ids: self.get_many_by_ids(user_ids, model=model, public=public))
+
+    async def get_by_email(self, email: str, model: Type[ModelT] = UserInDB) -> Optional[ModelT]:
+        """Получает пользователя по email в виде модели model; всегда с primary (вход в систему)."""
+        user_data = await self.collection.find_one({"email": email}, projection_for(model))
         if user_data:
-            return UserInDB(**user_data)
+            return model.model_validate(user_data)
         return None
 
     async def create(self, user_in: UserCreate) -> UserInDB:
         """Создает нового пользователя."""
-        hashed_password = get_password_hash(user_in.password)
+        hashed_password = await ahash_password(user_in.password)
         user_data = user_in.model_dump()
         user_data["hashed_password"] = hashed_password
         del user_data["password"] # Удаляем сырой пароль перед сохранением
@@ -40,32 +181,182 @@ class CRUDUser:
         await self.collection.insert_one(user_dict)
         return user_in_db
 
-    async def update(self, user_id: UUID, user_update: UserUpdate) -> Optional[UserInDB]:
+    async def create_many(self, users_in: List[UserCreate]) -> Tuple[List[UserInDB], Dict[int, Mapping[str, Any]]]:
+        """
+        Создает пользователей одной неупорядоченной вставкой.
+
+        Пароли хешируются параллельно в пуле хеширования. Возвращает созданных
+        пользователей и словарь "индекс во входном списке -> ошибка записи (writeError
+        драйвера)" для строк, которые не удалось вставить. Вставка неупорядоченная,
+        поэтому остальные строки уже записаны при любой ошибке, не только при дубликате.
+        """
+        if not users_in:
+            return [], {}
+        hashes = await asyncio.gather(*(ahash_password(user_in.password) for user_in in users_in))
+        users_in_db = [
+            UserInDB(**user_in.model_dump(exclude={"password"}), hashed_password=hashed_password)
+            for user_in, hashed_password in zip(users_in, hashes)
+        ]
+        failed: Dict[int, Mapping[str, Any]] = {}
+        try:
+            await self.collection.insert_many(
+                [user.model_dump(by_alias=True) for user in users_in_db],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed[write_error["index"]] = write_error
+        created = [user for index, user in enumerate(users_in_db) if index not in failed]
+        return created, failed
+
+    async def update(self, user_id: UUID, user_update: UserUpdate, model: Type[ModelT] = UserInDB) -> Optional[ModelT]:
         """Обновляет данные пользователя."""
         update_data = user_update.model_dump(exclude_unset=True)
         
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data["password"])
+            update_data["hashed_password"] = await ahash_password(update_data["password"])
             del update_data["password"]
             
         update_data["updated_at"] = datetime.now(timezone.utc)
         
-        result = await self.collection.update_one(
+        # Обновление и чтение результата за один запрос
+        updated_user = await self.collection.find_one_and_update(
             {"id": user_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection=projection_for(model),
+            return_document=ReturnDocument.AFTER,
         )
+        principal_cache.invalidate(user_id)
         
-        if result.modified_count == 1:
-            updated_user = await self.get_by_id(user_id)
-            return updated_user
+        if updated_user:
+            return model.model_validate(updated_user)
         return None
 
+    async def update_password_hash(self, user_id: UUID, hashed_password: str, previous_hash: str) -> bool:
+        """
+        Заменяет хеш пароля, только если он не менялся с момента чтения.
+
+        Используется для фонового перехеширования после входа: условие на previous_hash
+        не дает затереть пароль, который пользователь успел сменить параллельно.
+        """
+        result = await self.collection.update_one(
+            {"id": user_id, "hashed_password": previous_hash},
+            {"$set": {"hashed_password": hashed_password, "updated_at": datetime.now(timezone.utc)}}
+        )
+        return result.modified_count == 1
+
     async def delete(self, user_id: UUID) -> bool:
         """Удаляет пользователя по его UUID."""
         result = await self.collection.delete_one({"id": user_id})
+        principal_cache.invalidate(user_id)
         return result.deleted_count == 1
 
-    async def get_multiple(self, skip: int = 0, limit: int = 100) -> List[UserInDB]:
-        """Получает список пользователей с пагинацией."""
-        users = await self.collection.find({}).skip(skip).limit(limit).to_list(length=limit)
-        return [UserInDB(**user) for user in users]
+    @overload
+    async def get_page(
+        self,
+        limit: int = ...,
+        cursor: Optional[str] = ...,
+        model: Type[ModelT] = ...,
+        validate: Literal[True] = ...,
+        public: bool = ...,
+    ) -> Tuple[List[ModelT], Optional[str]]: ...
+
+    @overload
+    async def get_page(
+        self,
+        limit: int = ...,
+        cursor: Optional[str] = ...,
+        model: Type[ModelT] = ...,
+        *,
+        validate: Literal[False],
+        public: bool = ...,
+    ) -> Tuple[List[UserDocument], Optional[str]]: ...
+
+    async def get_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        model: Type[ModelT] = UserInDB,
+        validate: bool = True,
+        public: bool = False,
+    ) -> Tuple[Union[List[ModelT], List[UserDocument]], Optional[str]]:
+        """
+        Получает страницу пользователей с keyset-пагинацией по (created_at, id).
+
+        Возвращает пользователей и токен следующей страницы (None, если страница последняя).
+        Стоимость запроса не зависит от номера страницы, в отличие от skip/limit.
+        """
+        query = {}
+        if cursor is not None:
+            query = users_after_filter(*decode_users_cursor(cursor))
+        # Поля ключа сортировки нужны для курсора, даже если модель их не содержит
+        projection = {**projection_for(model), "created_at": 1, "id": 1}
+        users_cursor = self._reads(public).find(query, projection).sort(USERS_PAGE_SORT).limit(limit)
+        users = await users_cursor.to_list(length=limit)
+        next_cursor = None
+        if users and len(users) == limit:
+            last = users[-1]
+            next_cursor = encode_users_cursor(last["created_at"], last["id"])
+        if not validate:
+            return users, next_cursor
+        return [model.model_validate(user) for user in users], next_cursor
+
+    async def get_sort_key(self, user_id: UUID) -> Optional[Tuple[datetime, UUID]]:
+        """Возвращает позицию пользователя в порядке USERS_PAGE_SORT (для возобновления обхода)."""
+        user_data = await self.collection.find_one({"id": user_id}, {"_id": 0, "created_at": 1, "id": 1})
+        if user_data:
+            return user_data["created_at"], user_data["id"]
+        return None
+
+    async def iter_documents(
+        self,
+        after: Optional[Tuple[datetime, UUID]] = None,
+        batch_size: int = 1000,
+        model: Type[BaseModel] = UserInDB,
+    ) -> AsyncIterator[UserDocument]:
+        """
+        Обходит всех пользователей в порядке USERS_PAGE_SORT, начиная после позиции after.
+
+        Документы (с проекцией model) читаются курсором пачками по batch_size,
+        поэтому память не зависит от размера коллекции.
+        """
+        query = users_after_filter(*after) if after is not None else {}
+        cursor = self.collection.find(query, projection_for(model)).sort(USERS_PAGE_SORT).batch_size(batch_size)
+        async for user_data in cursor:
+            yield user_data
+
+    @overload
+    async def get_multiple(
+        self,
+        skip: int = ...,
+        limit: int = ...,
+        model: Type[ModelT] = ...,
+        validate: Literal[True] = ...,
+        public: bool = ...,
+    ) -> List[ModelT]: ...
+
+    @overload
+    async def get_multiple(
+        self,
+        skip: int = ...,
+        limit: int = ...,
+        model: Type[ModelT] = ...,
+        *,
+        validate: Literal[False],
+        public: bool = ...,
+    ) -> List[UserDocument]: ...
+
+    async def get_multiple(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        model: Type[ModelT] = UserInDB,
+        validate: bool = True,
+        public: bool = False,
+    ) -> Union[List[ModelT], List[UserDocument]]:
+        """Получает список пользователей с пагинацией (legacy skip/limit, см. get_page)."""
+        cursor = self._reads(public).find({}, projection_for(model)).skip(skip).limit(limit)
+        users = await cursor.to_list(length=limit)
+        if not validate:
+            return users
+        return [model.model_validate(user) for user in users]
@@ -0,0 +1,207 @@
+"""
+Объявленные индексы коллекций и их согласование с базой данных.
+
+Запуск отдельной командой (из директории backend), например перед выкаткой:
+
+    python -m app.db.indexes            # создать недостающие и исправить измененные индексы
+    python -m app.db.indexes --dry-run  # только показать план
+    python -m app.db.indexes --drop-extra  # заодно удалить необъявленные индексы
+
+Воркеры при запуске (MONGO_RECONCILE_INDEXES_ON_STARTUP) только создают
+недостающие индексы и меняют TTL через collMod: удаление и пересоздание
+измененных индексов выполняет эта команда. Пока уникальный индекс удален, в коллекцию могут попасть дубликаты,
+а несколько воркеров, удаляющих один индекс одновременно, мешали бы друг другу.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+from app.db.session import REFRESH_TOKENS_COLLECTION, TOKEN_BLACKLIST_COLLECTION, USERS_COLLECTION, mongo_client_options
+
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    USERS_COLLECTION: [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True, sparse=True), # Если username опционален
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]), # Keyset-пагинация
+    ],
+    REFRESH_TOKENS_COLLECTION: [
+        IndexModel([("refresh_token", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)]), # Лимит сессий
+        IndexModel([("family_id", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0), # Истекшие токены удаляет MongoDB
+    ],
+    TOKEN_BLACKLIST_COLLECTION: [
+        IndexModel([("token", ASCENDING)], unique=True),
+        IndexModel([("revoked_at", ASCENDING)]), # Инкрементальное обновление фильтра отзыва
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# Индекс уже удален (например, параллельным запуском согласования)
+_INDEX_NOT_FOUND = 27
+
+# Опции, различие в которых означает, что индекс нужно изменить
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+_OPTION_DEFAULTS = {"unique": False, "sparse": False}
+
+@dataclass
+class IndexPlan:
+    """Расхождения одной коллекции с объявленными индексами (списки имен индексов)."""
+    collection: str
+    create: List[str] = field(default_factory=list)
+    modify_ttl: List[str] = field(default_factory=list)
+    recreate: List[str] = field(default_factory=list)
+    extra: List[str] = field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        return not (self.create or self.modify_ttl or self.recreate)
+
+def _options(index: Mapping[str, Any]) -> Dict[str, Any]:
+    return {name: index.get(name, _OPTION_DEFAULTS.get(name)) for name in _COMPARED_OPTIONS}
+
+def plan_collection(collection: str, specs: List[IndexModel], existing: List[Mapping[str, Any]]) -> IndexPlan:
+    """Сравнивает объявленные индексы с результатом list_indexes()."""
+    plan = IndexPlan(collection)
+    existing_by_name = {index["name"]: index for index in existing}
+    declared = set()
+    for spec in specs:
+        document = spec.document
+        name = document["name"]
+        declared.add(name)
+        current = existing_by_name.get(name)
+        if current is None:
+            plan.create.append(name)
+            continue
+        wanted, actual = _options(document), _options(current)
+        if wanted == actual:
+            continue
+        differs = {option for option in _COMPARED_OPTIONS if wanted[option] != actual[option]}
+        if differs == {"expireAfterSeconds"} and wanted["expireAfterSeconds"] is not None:
+            plan.modify_ttl.append(name)
+        else:
+            plan.recreate.append(name)
+    plan.extra = [name for name in existing_by_name if name != "_id_" and name not in declared]
+    return plan
+
+async def _drop_index(collection: Any, name: str) -> None:
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        if e.code != _INDEX_NOT_FOUND:
+            raise
+
+async def _modify_ttl(db: AsyncIOMotorDatabase, collection_name: str, spec: IndexModel) -> bool:
+    """Меняет expireAfterSeconds индекса через collMod, не удаляя его; False, если сервер не смог."""
+    document = spec.document
+    try:
+        await db.command({
+            "collMod": collection_name,
+            "index": {"name": document["name"], "expireAfterSeconds": document["expireAfterSeconds"]},
+        })
+    except OperationFailure:
+        # Старые серверы не переводят обычный индекс в TTL через collMod
+        return False
+    return True
+
+async def _reconcile_collection(
+    db: AsyncIOMotorDatabase,
+    collection_name: str,
+    specs: List[IndexModel],
+    dry_run: bool,
+    drop_extra: bool,
+    create_only: bool,
+) -> IndexPlan:
+    collection = db[collection_name]
+    existing = [index async for index in collection.list_indexes()]
+    plan = plan_collection(collection_name, specs, existing)
+    if dry_run:
+        return plan
+
+    specs_by_name = {spec.document["name"]: spec for spec in specs}
+    to_create = list(plan.create)
+    for name in list(plan.modify_ttl):
+        if await _modify_ttl(db, collection_name, specs_by_name[name]):
+            continue
+        if create_only:
+            # Без collMod индекс остается пересоздать командой python -m app.db.indexes
+            plan.modify_ttl.remove(name)
+            plan.recreate.append(name)
+        else:
+            await _drop_index(collection, name)
+            to_create.append(name)
+    if create_only:
+        if to_create:
+            await collection.create_indexes([specs_by_name[name] for name in to_create])
+        return plan
+    for name in plan.recreate:
+        await _drop_index(collection, name)
+        to_create.append(name)
+    if drop_extra:
+        for name in plan.extra:
+            await _drop_index(collection, name)
+
+    # Все недостающие индексы коллекции - одной командой createIndexes
+    if to_create:
+        await collection.create_indexes([specs_by_name[name] for name in to_create])
+    return plan
+
+async def reconcile_indexes(
+    db: AsyncIOMotorDatabase,
+    specs: Mapping[str, List[IndexModel]] = INDEX_SPECS,
+    dry_run: bool = False,
+    drop_extra: bool = False,
+    create_only: bool = False,
+) -> List[IndexPlan]:
+    """
+    Приводит индексы к объявленным в specs; коллекции обрабатываются параллельно.
+
+    Повторный запуск на согласованной базе выполняет только list_indexes.
+    Необъявленные индексы лишь перечисляются в плане, а удаляются при drop_extra.
+    С create_only (так делают воркеры при запуске) создаются недостающие индексы и
+    меняется TTL через collMod; индексы, которые нужно удалить и пересоздать,
+    остаются в plan.recreate.
+    """
+    return list(await asyncio.gather(*(
+        _reconcile_collection(db, collection, collection_specs, dry_run, drop_extra, create_only)
+        for collection, collection_specs in specs.items()
+    )))
+
+def format_plan(plan: IndexPlan) -> str:
+    if plan.in_sync and not plan.extra:
+        return f"{plan.collection}: в порядке"
+    parts = [
+        f"{title}: {', '.join(names)}"
+        for title, names in (
+            ("создать", plan.create),
+            ("сделать TTL", plan.modify_ttl),
+            ("пересоздать", plan.recreate),
+            ("необъявленные", plan.extra),
+        )
+        if names
+    ]
+    return f"{plan.collection}: " + "; ".join(parts)
+
+async def main(args: argparse.Namespace) -> None:
+    client = AsyncIOMotorClient(settings.MONGO_URI, **mongo_client_options())
+    try:
+        plans = await reconcile_indexes(
+            client[settings.MONGO_DB_NAME], dry_run=args.dry_run, drop_extra=args.drop_extra
+        )
+    finally:
+        client.close()
+    for plan in plans:
+        print(format_plan(plan))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="только показать расхождения")
+    parser.add_argument("--drop-extra", action="store_true", help="удалить индексы, которых нет в INDEX_SPECS")
+    asyncio.run(main(parser.parse_args()))
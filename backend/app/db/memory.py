@@ -0,0 +1,906 @@
+"""
+Хранилище в памяти процесса с API Motor (STORAGE_BACKEND=memory).
+
+Реализует ту часть API коллекций, которой пользуются CRUD-классы и согласование
+индексов: фильтры ($eq/$ne/$gt/$gte/$lt/$lte/$in/$nin/$exists/$or/$and/$nor),
+обновления ($set/$unset/$inc), проекции, sort/skip/limit, findAndModify и
+индексы с семантикой unique/sparse/partialFilterExpression. Документы проходят
+через BSON при записи и чтении, поэтому типы совпадают с тем, что вернул бы
+драйвер (naive UTC datetime с точностью до миллисекунд, UUID, списки вместо кортежей).
+
+TTL-индексы хранятся, но документы по ним не удаляются; change streams недоступны,
+как на MongoDB без replica set. Данные у каждого процесса свои.
+
+Каждая операция публикует события команды (find, insert, findAndModify...)
+слушателям pymongo.monitoring.CommandListener из event_listeners клиента, как
+драйвер, поэтому метрики команд и подсчет обращений к БД в тестах работают и здесь.
+"""
+import asyncio
+import functools
+import itertools
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+import bson
+from bson import ObjectId
+from bson.binary import UuidRepresentation
+from bson.codec_options import CodecOptions
+from pymongo import IndexModel, ReadPreference, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+# Те же параметры кодирования, что у клиента Motor (см. mongo_client_options)
+CODEC_OPTIONS = CodecOptions(uuid_representation=UuidRepresentation.STANDARD)
+
+_MISSING = object()
+
+_BAD_VALUE = 2
+_COMMAND_NOT_FOUND = 59
+_INDEX_OPTIONS_CONFLICT = 85
+_INDEX_NOT_FOUND = 27
+_CHANGE_STREAM_NOT_SUPPORTED = 40573
+_DUPLICATE_KEY = 11000
+
+ID_INDEX = {"v": 2, "key": {"_id": 1}, "name": "_id_"}
+
+# Адрес "сервера" в событиях команд
+MEMORY_ADDRESS = ("memory", 0)
+
+# Команды, в которых нарушение уникальности - ошибка записи в ответе, а не ошибка команды
+_WRITE_COMMANDS = ("insert", "update", "delete")
+
+def _command(name: str) -> Callable:
+    """Публикует вызов метода коллекции как команду name (см. MemoryClient._monitor)."""
+    def decorate(method: Callable) -> Callable:
+        @functools.wraps(method)
+        async def wrapper(self: "MemoryCollection", *args, **kwargs):
+            with self._monitor({name: self.name}):
+                return await method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+def _roundtrip(document: Mapping[str, Any]) -> Dict[str, Any]:
+    """Копия документа в том виде, в каком его вернул бы драйвер после записи в MongoDB."""
+    return bson.decode(bson.encode(document, codec_options=CODEC_OPTIONS), codec_options=CODEC_OPTIONS)
+
+def _type_order(value: Any) -> int:
+    """Порядок типов BSON при сравнении и сортировке (значения разных типов не равны)."""
+    if value is None or value is _MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, Mapping):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 6  # binData (UUID, bytes)
+
+def _freeze(value: Any) -> Tuple[int, Any]:
+    """Хешируемое представление значения для ключей уникальных индексов."""
+    order = _type_order(value)
+    if order == 1:
+        return (1, None)
+    if order == 4:
+        return (4, tuple((key, _freeze(item)) for key, item in value.items()))
+    if order == 5:
+        return (5, tuple(_freeze(item) for item in value))
+    return (order, value)
+
+def _lookup(document: Mapping[str, Any], path: str) -> Any:
+    """Значение по пути с точками; _MISSING, если поля нет."""
+    value: Any = document
+    for part in path.split("."):
+        if isinstance(value, Mapping):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+def _candidates(value: Any) -> List[Any]:
+    # Условие на массив проверяется и для самого массива, и для каждого элемента
+    if isinstance(value, list):
+        return [value, *value]
+    return [value]
+
+def _equals(left: Any, right: Any) -> bool:
+    if _type_order(left) != _type_order(right):
+        return False
+    if _type_order(left) == 1:
+        return True
+    return left == right
+
+def _compare(left: Any, right: Any) -> Optional[int]:
+    """Сравнение значений одного типа BSON; None, если типы различаются."""
+    if _type_order(left) != _type_order(right):
+        return None
+    if _type_order(left) == 1:
+        return 0
+    try:
+        return (left > right) - (left < right)
+    except TypeError:
+        return None
+
+_RANGE_OPERATORS = {
+    "$gt": lambda result: result > 0,
+    "$gte": lambda result: result >= 0,
+    "$lt": lambda result: result < 0,
+    "$lte": lambda result: result <= 0,
+}
+
+def _match_operator(value: Any, operator: str, argument: Any) -> bool:
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(argument)
+    if operator == "$eq":
+        return any(_equals(candidate, argument) for candidate in _candidates(value))
+    if operator == "$ne":
+        return not _match_operator(value, "$eq", argument)
+    if operator == "$in":
+        return any(_equals(candidate, item) for candidate in _candidates(value) for item in argument)
+    if operator == "$nin":
+        return not _match_operator(value, "$in", argument)
+    if operator in _RANGE_OPERATORS:
+        check = _RANGE_OPERATORS[operator]
+        for candidate in _candidates(value):
+            result = _compare(candidate, argument)
+            if result is not None and check(result):
+                return True
+        return False
+    raise OperationFailure(f"Оператор {operator} не поддерживается хранилищем в памяти", _BAD_VALUE)
+
+def _is_operator_document(condition: Any) -> bool:
+    return isinstance(condition, Mapping) and bool(condition) and all(key.startswith("$") for key in condition)
+
+def matches(document: Mapping[str, Any], query: Mapping[str, Any]) -> bool:
+    """Проверяет документ на соответствие фильтру MongoDB."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(document, clause) for clause in condition):
+                return False
+        elif key.startswith("$"):
+            raise OperationFailure(f"Оператор {key} не поддерживается хранилищем в памяти", _BAD_VALUE)
+        else:
+            value = _lookup(document, key)
+            if _is_operator_document(condition):
+                if not all(_match_operator(value, operator, argument) for operator, argument in condition.items()):
+                    return False
+            elif not _match_operator(value, "$eq", condition):
+                return False
+    return True
+
+def _set_path(document: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+def _unset_path(document: Dict[str, Any], path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+def apply_update(document: Dict[str, Any], update: Mapping[str, Any]) -> None:
+    """Применяет к документу операторы обновления ($set, $unset, $inc)."""
+    if not _is_operator_document(update):
+        raise ValueError("update only works with $ operators")
+    for operator, fields in update.items():
+        for path, argument in fields.items():
+            if path == "_id" or path.startswith("_id."):
+                raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+            if operator == "$set":
+                _set_path(document, path, argument)
+            elif operator == "$unset":
+                _unset_path(document, path)
+            elif operator == "$inc":
+                current = _lookup(document, path)
+                _set_path(document, path, (0 if current is _MISSING else current) + argument)
+            else:
+                raise OperationFailure(f"Оператор {operator} не поддерживается хранилищем в памяти", _BAD_VALUE)
+
+def project(document: Mapping[str, Any], projection: Optional[Union[Mapping[str, Any], Sequence[str]]]) -> Dict[str, Any]:
+    """Применяет проекцию включения или исключения полей."""
+    if not projection:
+        return dict(document)
+    if not isinstance(projection, Mapping):
+        projection = {field: 1 for field in projection}
+    include_id = bool(projection.get("_id", 1))
+    fields = {field: bool(flag) for field, flag in projection.items() if field != "_id"}
+    # {"_id": 1} без других полей - тоже проекция включения
+    if (fields and all(fields.values())) or (not fields and "_id" in projection and include_id):
+        result: Dict[str, Any] = {}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        for field in fields:
+            value = _lookup(document, field)
+            if value is not _MISSING:
+                _set_path(result, field, value)
+        return result
+    if any(fields.values()):
+        raise OperationFailure("Cannot do exclusion on field in inclusion projection", 31254)
+    result = dict(document)
+    if not include_id:
+        result.pop("_id", None)
+    for field in fields:
+        _unset_path(result, field)
+    return result
+
+def _normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, Mapping):
+        return list(key_or_list.items())
+    return [(key, value) for key, value in key_or_list]
+
+class _SortKey:
+    """Ключ сортировки в порядке типов BSON; значения несравнимых типов упорядочиваются по типу."""
+    __slots__ = ("order", "value")
+
+    def __init__(self, value: Any):
+        self.order = _type_order(value)
+        self.value = value
+
+    def __lt__(self, other: "_SortKey") -> bool:
+        if self.order != other.order:
+            return self.order < other.order
+        return (_compare(self.value, other.value) or 0) < 0
+
+def sort_documents(documents: List[Dict[str, Any]], sort: Sequence[Tuple[str, int]]) -> None:
+    # Устойчивая сортировка по полям с конца дает составной порядок
+    for field, direction in reversed(sort):
+        documents.sort(key=lambda document: _SortKey(_lookup(document, field)), reverse=direction < 0)
+
+class MemoryCursor:
+    """Курсор find(): запрос выполняется при первом чтении, модификаторы возвращают сам курсор."""
+
+    def __init__(self, collection: "MemoryCollection", query: Mapping[str, Any], projection: Any = None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[Iterator[Dict[str, Any]]] = None
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        return self
+
+    def _execute(self) -> List[Dict[str, Any]]:
+        with self._collection._monitor({"find": self._collection.name, "filter": self._query}):
+            documents = self._collection._select(self._query)
+            if self._sort:
+                sort_documents(documents, self._sort)
+            documents = documents[self._skip:]
+            if self._limit:
+                documents = documents[:self._limit]
+            return [_roundtrip(project(document, self._projection)) for document in documents]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        await asyncio.sleep(0)
+        if self._results is None:
+            self._results = iter(self._execute())
+        if length:
+            return [document for _, document in zip(range(length), self._results)]
+        return list(self._results)
+
+    def __aiter__(self) -> "MemoryCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if self._results is None:
+            await asyncio.sleep(0)
+            self._results = iter(self._execute())
+        try:
+            return next(self._results)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+class _ListCursor:
+    """Курсор по готовому списку (результат list_indexes)."""
+
+    def __init__(self, items: Iterable[Dict[str, Any]]):
+        self._items = iter(list(items))
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        if length:
+            return [item for _, item in zip(range(length), self._items)]
+        return list(self._items)
+
+    def __aiter__(self) -> "_ListCursor":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._items)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+class _Index:
+    """Описание индекса; для уникальных ведется словарь "ключ -> _id документа"."""
+
+    def __init__(self, document: Mapping[str, Any]):
+        self.document = {"v": 2, **document}
+        self.name: str = document["name"]
+        self.fields: List[str] = list(document["key"])
+        self.unique: bool = bool(document.get("unique")) or self.name == "_id_"
+        self.sparse: bool = bool(document.get("sparse"))
+        partial = document.get("partialFilterExpression")
+        self.partial: Optional[Mapping[str, Any]] = _roundtrip(partial) if partial is not None else None
+        self.entries: Dict[Tuple, Any] = {}
+
+    def key(self, document: Mapping[str, Any]) -> Optional[Tuple]:
+        """Ключ документа в индексе; None, если документ в индекс не попадает."""
+        values = [_lookup(document, field) for field in self.fields]
+        if self.sparse and all(value is _MISSING for value in values):
+            return None
+        if self.partial is not None and not matches(document, self.partial):
+            return None
+        return tuple(_freeze(None if value is _MISSING else value) for value in values)
+
+    def options(self) -> Dict[str, Any]:
+        return {name: value for name, value in self.document.items() if name not in ("v", "name", "key")}
+
+class MemoryCollection:
+    """Коллекция в памяти; методы повторяют сигнатуры AsyncIOMotorCollection."""
+
+    # Один "сервер": read preference принимается для совместимости и ни на что не влияет
+    read_preference = ReadPreference.PRIMARY
+
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._documents: Dict[Tuple, Dict[str, Any]] = {}
+        self._indexes: Dict[str, _Index] = {}
+        self._reset_indexes()
+
+    def __getitem__(self, name: str) -> "MemoryCollection":
+        return self.database[f"{self.name}.{name}"]
+
+    def with_options(self, **kwargs) -> "MemoryCollection":
+        return self
+
+    def _monitor(self, command: Dict[str, Any]):
+        return self.database.client._monitor(self.database.name, command)
+
+    def _reset_indexes(self) -> None:
+        self._indexes = {"_id_": _Index(ID_INDEX)}
+        for document_id, document in self._documents.items():
+            self._index_add(document_id, document)
+
+    def _clear(self) -> None:
+        # Объект коллекции остается прежним: на него могут ссылаться CRUD-классы
+        self._documents.clear()
+        self._reset_indexes()
+
+    @property
+    def _exists(self) -> bool:
+        return bool(self._documents) or len(self._indexes) > 1
+
+    # Выборка и проверка уникальности
+
+    def _select(self, query: Optional[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+        """Документы, подходящие под фильтр (хранимые объекты, без копирования)."""
+        query = _roundtrip(query or {})
+        # Равенство по полю уникального индекса - поиск по словарю индекса, без полного перебора
+        for index in self._indexes.values():
+            if not index.unique or len(index.fields) != 1 or index.partial is not None:
+                continue
+            condition = query.get(index.fields[0], _MISSING)
+            if condition is _MISSING or _is_operator_document(condition) or isinstance(condition, list):
+                continue
+            if condition is None and index.sparse:
+                continue
+            document_id = index.entries.get((_freeze(condition),))
+            document = self._documents.get(document_id) if document_id is not None else None
+            return [document] if document is not None and matches(document, query) else []
+        return [document for document in self._documents.values() if matches(document, query)]
+
+    def _duplicate_error(self, index: _Index, document: Mapping[str, Any]) -> Dict[str, Any]:
+        key_value = {field: _lookup(document, field) for field in index.fields}
+        key_value = {field: (None if value is _MISSING else value) for field, value in key_value.items()}
+        rendered = ", ".join(f"{field}: {value!r}" for field, value in key_value.items())
+        return {
+            "code": _DUPLICATE_KEY,
+            "errmsg": f"E11000 duplicate key error collection: {self.full_name} index: {index.name} dup key: {{ {rendered} }}",
+            "keyPattern": dict(index.document["key"]),
+            "keyValue": key_value,
+        }
+
+    def _check_unique(self, document: Mapping[str, Any], document_id: Optional[Tuple] = None) -> Optional[Dict[str, Any]]:
+        for index in self._indexes.values():
+            if not index.unique:
+                continue
+            key = index.key(document)
+            if key is None:
+                continue
+            owner = index.entries.get(key)
+            if owner is not None and owner != document_id:
+                return self._duplicate_error(index, document)
+        return None
+
+    def _index_add(self, document_id: Tuple, document: Mapping[str, Any]) -> None:
+        for index in self._indexes.values():
+            if index.unique:
+                key = index.key(document)
+                if key is not None:
+                    index.entries[key] = document_id
+
+    def _index_remove(self, document_id: Tuple, document: Mapping[str, Any]) -> None:
+        for index in self._indexes.values():
+            if index.unique:
+                key = index.key(document)
+                if key is not None and index.entries.get(key) == document_id:
+                    del index.entries[key]
+
+    # Запись
+
+    def _insert(self, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Вставляет документ; возвращает описание ошибки уникальности или None."""
+        if "_id" not in document:
+            document["_id"] = ObjectId()  # Как pymongo: _id добавляется и в переданный документ
+        stored = _roundtrip(document)
+        error = self._check_unique(stored)
+        if error is not None:
+            return error
+        document_id = _freeze(stored["_id"])
+        self._documents[document_id] = stored
+        self._index_add(document_id, stored)
+        return None
+
+    def _replace(self, document_id: Tuple, updated: Dict[str, Any]) -> None:
+        updated = _roundtrip(updated)
+        error = self._check_unique(updated, document_id)
+        if error is not None:
+            raise DuplicateKeyError(error["errmsg"], _DUPLICATE_KEY, error)
+        self._index_remove(document_id, self._documents[document_id])
+        self._documents[document_id] = updated
+        self._index_add(document_id, updated)
+
+    def _update(self, document: Dict[str, Any], update: Mapping[str, Any]) -> bool:
+        """Обновляет хранимый документ; True, если он изменился."""
+        updated = _roundtrip(document)
+        apply_update(updated, _roundtrip(update))
+        if updated == document:
+            return False
+        self._replace(_freeze(document["_id"]), updated)
+        return True
+
+    def _upsert(self, query: Mapping[str, Any], update: Mapping[str, Any]) -> Dict[str, Any]:
+        document = {
+            key: value for key, value in _roundtrip(query).items()
+            if not key.startswith("$") and not _is_operator_document(value)
+        }
+        update = _roundtrip(update)
+        operators = {operator: fields for operator, fields in update.items() if operator != "$setOnInsert"}
+        if operators:
+            apply_update(document, operators)
+        if update.get("$setOnInsert"):
+            apply_update(document, {"$set": update["$setOnInsert"]})
+        error = self._insert(document)
+        if error is not None:
+            raise DuplicateKeyError(error["errmsg"], _DUPLICATE_KEY, error)
+        return document
+
+    def _first(self, query: Optional[Mapping[str, Any]], sort: Any = None) -> Optional[Dict[str, Any]]:
+        documents = self._select(query)
+        if sort:
+            sort_documents(documents, _normalize_sort(sort))
+        return documents[0] if documents else None
+
+    # API коллекции
+
+    def find(self, filter: Optional[Mapping[str, Any]] = None, projection: Any = None, *,
+             sort: Any = None, skip: int = 0, limit: int = 0) -> MemoryCursor:
+        cursor = MemoryCursor(self, filter or {}, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    @_command("find")
+    async def find_one(self, filter: Any = None, projection: Any = None, *, sort: Any = None) -> Optional[Dict[str, Any]]:
+        await asyncio.sleep(0)
+        if filter is not None and not isinstance(filter, Mapping):
+            filter = {"_id": filter}
+        document = self._first(filter, sort)
+        return _roundtrip(project(document, projection)) if document is not None else None
+
+    @_command("aggregate")
+    async def count_documents(self, filter: Mapping[str, Any]) -> int:
+        await asyncio.sleep(0)
+        return len(self._select(filter))
+
+    @_command("count")
+    async def estimated_document_count(self) -> int:
+        await asyncio.sleep(0)
+        return len(self._documents)
+
+    @_command("insert")
+    async def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        await asyncio.sleep(0)
+        error = self._insert(document)
+        if error is not None:
+            raise DuplicateKeyError(error["errmsg"], _DUPLICATE_KEY, error)
+        return InsertOneResult(document["_id"], True)
+
+    @_command("insert")
+    async def insert_many(self, documents: Iterable[Dict[str, Any]], ordered: bool = True) -> InsertManyResult:
+        await asyncio.sleep(0)
+        inserted_ids: List[Any] = []
+        write_errors: List[Dict[str, Any]] = []
+        for position, document in enumerate(documents):
+            error = self._insert(document)
+            if error is None:
+                inserted_ids.append(document["_id"])
+                continue
+            write_errors.append({"index": position, "op": document, **error})
+            if ordered:
+                break
+        if write_errors:
+            raise BulkWriteError({
+                "writeErrors": write_errors,
+                "writeConcernErrors": [],
+                "nInserted": len(inserted_ids),
+                "nUpserted": 0,
+                "nMatched": 0,
+                "nModified": 0,
+                "nRemoved": 0,
+                "upserted": [],
+            })
+        return InsertManyResult(inserted_ids, True)
+
+    async def _update_documents(self, filter: Mapping[str, Any], update: Mapping[str, Any],
+                                upsert: bool, many: bool) -> UpdateResult:
+        await asyncio.sleep(0)
+        documents = self._select(filter)
+        if not many:
+            documents = documents[:1]
+        if not documents and upsert:
+            document = self._upsert(filter, update)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": document["_id"]}, True)
+        modified = sum(self._update(document, update) for document in documents)
+        return UpdateResult({"n": len(documents), "nModified": modified}, True)
+
+    @_command("update")
+    async def update_one(self, filter: Mapping[str, Any], update: Mapping[str, Any], upsert: bool = False) -> UpdateResult:
+        return await self._update_documents(filter, update, upsert, many=False)
+
+    @_command("update")
+    async def update_many(self, filter: Mapping[str, Any], update: Mapping[str, Any], upsert: bool = False) -> UpdateResult:
+        return await self._update_documents(filter, update, upsert, many=True)
+
+    @_command("findAndModify")
+    async def find_one_and_update(
+        self,
+        filter: Mapping[str, Any],
+        update: Mapping[str, Any],
+        projection: Any = None,
+        sort: Any = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+    ) -> Optional[Dict[str, Any]]:
+        await asyncio.sleep(0)
+        document = self._first(filter, sort)
+        if document is None:
+            if not upsert:
+                return None
+            created = self._upsert(filter, update)
+            if return_document == ReturnDocument.BEFORE:
+                return None
+            return _roundtrip(project(self._documents[_freeze(created["_id"])], projection))
+        document_id = _freeze(document["_id"])
+        before = project(document, projection)
+        self._update(document, update)
+        if return_document == ReturnDocument.BEFORE:
+            return _roundtrip(before)
+        return _roundtrip(project(self._documents[document_id], projection))
+
+    @_command("findAndModify")
+    async def find_one_and_delete(self, filter: Mapping[str, Any], projection: Any = None,
+                                  sort: Any = None) -> Optional[Dict[str, Any]]:
+        await asyncio.sleep(0)
+        document = self._first(filter, sort)
+        if document is None:
+            return None
+        self._delete(document)
+        return _roundtrip(project(document, projection))
+
+    def _delete(self, document: Dict[str, Any]) -> None:
+        document_id = _freeze(document["_id"])
+        self._index_remove(document_id, document)
+        del self._documents[document_id]
+
+    @_command("delete")
+    async def delete_one(self, filter: Mapping[str, Any]) -> DeleteResult:
+        await asyncio.sleep(0)
+        document = self._first(filter)
+        if document is None:
+            return DeleteResult({"n": 0}, True)
+        self._delete(document)
+        return DeleteResult({"n": 1}, True)
+
+    @_command("delete")
+    async def delete_many(self, filter: Mapping[str, Any]) -> DeleteResult:
+        await asyncio.sleep(0)
+        documents = self._select(filter)
+        for document in documents:
+            self._delete(document)
+        return DeleteResult({"n": len(documents)}, True)
+
+    @_command("drop")
+    async def drop(self) -> None:
+        await asyncio.sleep(0)
+        self._clear()
+
+    # Индексы
+
+    def _create_index(self, model: IndexModel) -> str:
+        document = dict(model.document)
+        index = _Index(document)
+        existing = self._indexes.get(index.name)
+        if existing is not None:
+            if existing.fields == index.fields and existing.options() == index.options():
+                return index.name
+            raise OperationFailure(
+                f"An existing index has the same name as the requested index: {index.name}",
+                _INDEX_OPTIONS_CONFLICT,
+            )
+        if index.unique:
+            for document_id, stored in self._documents.items():
+                key = index.key(stored)
+                if key is None:
+                    continue
+                if key in index.entries:
+                    error = self._duplicate_error(index, stored)
+                    raise DuplicateKeyError(error["errmsg"], _DUPLICATE_KEY, error)
+                index.entries[key] = document_id
+        self._indexes[index.name] = index
+        return index.name
+
+    @_command("createIndexes")
+    async def create_index(self, keys: Any, **kwargs) -> str:
+        await asyncio.sleep(0)
+        return self._create_index(IndexModel(keys, **kwargs))
+
+    @_command("createIndexes")
+    async def create_indexes(self, indexes: Sequence[IndexModel]) -> List[str]:
+        await asyncio.sleep(0)
+        return [self._create_index(model) for model in indexes]
+
+    @_command("dropIndexes")
+    async def drop_index(self, index_or_name: Any) -> None:
+        await asyncio.sleep(0)
+        name = index_or_name if isinstance(index_or_name, str) else IndexModel(index_or_name).document["name"]
+        if name == "_id_":
+            raise OperationFailure("cannot drop _id index", 72)
+        if self._indexes.pop(name, None) is None:
+            raise OperationFailure(f"index not found with name [{name}]", _INDEX_NOT_FOUND)
+
+    @_command("dropIndexes")
+    async def drop_indexes(self) -> None:
+        await asyncio.sleep(0)
+        self._reset_indexes()
+
+    def list_indexes(self) -> _ListCursor:
+        with self._monitor({"listIndexes": self.name}):
+            return _ListCursor(dict(index.document) for index in self._indexes.values())
+
+    @_command("listIndexes")
+    async def index_information(self) -> Dict[str, Dict[str, Any]]:
+        await asyncio.sleep(0)
+        information = {}
+        for index in self._indexes.values():
+            info = {name: value for name, value in index.document.items() if name != "name"}
+            info["key"] = list(index.document["key"].items())
+            information[index.name] = info
+        return information
+
+    def _set_ttl(self, name: str, expire_after_seconds: int) -> Dict[str, Any]:
+        index = self._indexes.get(name)
+        if index is None:
+            raise OperationFailure(f"cannot find index {name} for ns {self.full_name}", _INDEX_NOT_FOUND)
+        previous = index.document.get("expireAfterSeconds")
+        index.document["expireAfterSeconds"] = expire_after_seconds
+        return {"expireAfterSeconds_old": previous, "expireAfterSeconds_new": expire_after_seconds}
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure(
+            "The $changeStream stage is only supported on replica sets", _CHANGE_STREAM_NOT_SUPPORTED
+        )
+
+class MemoryDatabase:
+    """База данных в памяти; коллекции создаются при первом обращении."""
+
+    read_preference = ReadPreference.PRIMARY
+
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    def with_options(self, **kwargs) -> "MemoryDatabase":
+        return self
+
+    def _clear(self) -> None:
+        for collection in self._collections.values():
+            collection._clear()
+
+    async def list_collection_names(self) -> List[str]:
+        await asyncio.sleep(0)
+        with self.client._monitor(self.name, {"listCollections": 1}):
+            return [name for name, collection in self._collections.items() if collection._exists]
+
+    async def drop_collection(self, name: str) -> None:
+        await asyncio.sleep(0)
+        with self.client._monitor(self.name, {"drop": name}):
+            if name in self._collections:
+                self._collections[name]._clear()
+
+    async def command(self, command: Union[str, Mapping[str, Any]], value: Any = 1, **kwargs) -> Dict[str, Any]:
+        """Поддерживаются ping, hello, dropDatabase и collMod (изменение TTL индекса)."""
+        await asyncio.sleep(0)
+        if isinstance(command, str):
+            command = {command: value, **kwargs}
+        with self.client._monitor(self.name, dict(command)):
+            return self._run_command(command)
+
+    def _run_command(self, command: Mapping[str, Any]) -> Dict[str, Any]:
+        name = next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        if name in ("hello", "isMaster", "ismaster"):
+            return {"isWritablePrimary": True, "ismaster": True, "maxWireVersion": 21, "ok": 1.0}
+        if name == "dropDatabase":
+            self._clear()
+            return {"ok": 1.0}
+        if name == "collMod":
+            result: Dict[str, Any] = {"ok": 1.0}
+            index = command.get("index")
+            if index is not None:
+                # Остальные опции collMod (например, pre-images) в памяти ничего не меняют
+                result.update(self[command[name]]._set_ttl(index["name"], index["expireAfterSeconds"]))
+            return result
+        raise OperationFailure(f"no such command: '{name}'", _COMMAND_NOT_FOUND)
+
+class MemoryClient:
+    """
+    Клиент хранилища в памяти; аргументы подключения (URI, пул) игнорируются.
+
+    Из event_listeners используются слушатели команд; события пула и топологии
+    не публикуются - соединений нет.
+    """
+
+    def __init__(self, *args, event_listeners: Iterable[Any] = (), **kwargs):
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self._command_listeners = [
+            listener for listener in event_listeners if isinstance(listener, monitoring.CommandListener)
+        ]
+        self._request_ids = itertools.count(1)
+
+    def _publish(self, method: str, event: Any) -> None:
+        for listener in self._command_listeners:
+            try:
+                getattr(listener, method)(event)
+            except Exception as e:
+                # Как драйвер: ошибка слушателя не прерывает операцию
+                print(f"Ошибка слушателя команд {listener!r}: {e}")
+
+    @contextmanager
+    def _monitor(self, database_name: str, command: Dict[str, Any]) -> Iterator[None]:
+        """Публикует started и succeeded/failed для команды, выполняемой внутри блока."""
+        if not self._command_listeners:
+            yield
+            return
+        name = next(iter(command))
+        request_id = next(self._request_ids)
+        self._publish("started", monitoring.CommandStartedEvent(
+            command, database_name, request_id, MEMORY_ADDRESS, request_id
+        ))
+        started = time.perf_counter()
+        reply: Dict[str, Any] = {"ok": 1.0}
+        try:
+            yield
+        except (DuplicateKeyError, BulkWriteError) as e:
+            if name not in _WRITE_COMMANDS:
+                self._publish_failure(name, request_id, database_name, started, e)
+                raise
+            # Сервер отвечает ok: 1 и перечисляет отклоненные документы в writeErrors
+            write_errors = e.details.get("writeErrors") if isinstance(e, BulkWriteError) else [{"index": 0, **e.details}]
+            reply["writeErrors"] = write_errors
+            self._publish_success(name, request_id, database_name, started, reply)
+            raise
+        except Exception as e:
+            self._publish_failure(name, request_id, database_name, started, e)
+            raise
+        self._publish_success(name, request_id, database_name, started, reply)
+
+    def _publish_success(self, name: str, request_id: int, database_name: str, started: float,
+                         reply: Dict[str, Any]) -> None:
+        duration = timedelta(seconds=time.perf_counter() - started)
+        self._publish("succeeded", monitoring.CommandSucceededEvent(
+            duration, reply, name, request_id, MEMORY_ADDRESS, request_id, database_name=database_name
+        ))
+
+    def _publish_failure(self, name: str, request_id: int, database_name: str, started: float,
+                         error: Exception) -> None:
+        duration = timedelta(seconds=time.perf_counter() - started)
+        failure = {"ok": 0.0, "errmsg": str(error), "code": getattr(error, "code", None)}
+        self._publish("failed", monitoring.CommandFailedEvent(
+            duration, failure, name, request_id, MEMORY_ADDRESS, request_id, database_name=database_name
+        ))
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        database = self._databases.get(name)
+        if database is None:
+            database = self._databases[name] = MemoryDatabase(self, name)
+        return database
+
+    def __getattr__(self, name: str) -> MemoryDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        return self[name]
+
+    async def list_database_names(self) -> List[str]:
+        await asyncio.sleep(0)
+        with self._monitor("admin", {"listDatabases": 1}):
+            return list(self._databases)
+
+    async def drop_database(self, name_or_database: Union[str, MemoryDatabase]) -> None:
+        await asyncio.sleep(0)
+        name = name_or_database if isinstance(name_or_database, str) else name_or_database.name
+        with self._monitor(name, {"dropDatabase": 1}):
+            if name in self._databases:
+                self._databases[name]._clear()
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,186 @@
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+from pymongo import monitoring
+
+from app.core.metrics import percentile, registry
+
+# Сколько последних ожиданий выдачи соединения хранить для перцентилей
+WAIT_SAMPLES = 1024
+
+class _PoolStats:
+    """Счетчики пула соединений одного сервера."""
+
+    def __init__(self):
+        self.max_pool_size = None
+        self.min_pool_size = None
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.clears = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent_waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self.recent_waits)
+        return {
+            "max_pool_size": self.max_pool_size,
+            "min_pool_size": self.min_pool_size,
+            "open_connections": self.open,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "checkout_failures": dict(self.checkout_failures),
+            "pool_clears": self.clears,
+            "checkout_wait_ms": {
+                "count": self.wait_count,
+                "mean": self.wait_total / self.wait_count * 1000 if self.wait_count else 0.0,
+                "max": self.wait_max * 1000,
+                "p50": percentile(waits, 50) * 1000,
+                "p95": percentile(waits, 95) * 1000,
+                "p99": percentile(waits, 99) * 1000,
+            },
+        }
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Статистика пулов соединений MongoDB по серверам.
+
+    Время ожидания выдачи соединения берется из duration события checkout
+    (от начала запроса соединения до его получения). Ненулевые waiting и рост
+    checkout_wait_ms означают, что запросам не хватает соединений пула.
+    События приходят из потоков драйвера, поэтому счетчики защищены блокировкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[Tuple[str, int], _PoolStats] = {}
+
+    def _pool(self, address) -> _PoolStats:
+        pool = self._pools.get(address)
+        if pool is None:
+            pool = self._pools[address] = _PoolStats()
+        return pool
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pools.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика в виде {"host:port": {...}}."""
+        with self._lock:
+            return {f"{host}:{port}": pool.snapshot() for (host, port), pool in self._pools.items()}
+
+    def pool_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.max_pool_size = event.options.get("maxPoolSize")
+            pool.min_pool_size = event.options.get("minPoolSize")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address).clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.open = max(0, pool.open - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address).waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.checkout_failures[event.reason] = pool.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        wait = getattr(event, "duration", None)
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.in_use += 1
+            pool.checkouts += 1
+            if wait is not None:
+                pool.wait_count += 1
+                pool.wait_total += wait
+                pool.wait_max = max(pool.wait_max, wait)
+                pool.recent_waits.append(wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.in_use = max(0, pool.in_use - 1)
+
+pool_stats = PoolStatsListener()
+
+mongodb_command_duration_seconds = registry.histogram(
+    "mongodb_command_duration_seconds", "Время выполнения команд MongoDB", ("collection", "command")
+)
+mongodb_command_failures_total = registry.counter(
+    "mongodb_command_failures_total", "Число неудачных команд MongoDB", ("collection", "command")
+)
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Время команд MongoDB по коллекциям и операциям (find, insert, findAndModify...).
+
+    Имя коллекции есть только в событии started, поэтому оно запоминается
+    до завершения команды по (connection_id, request_id).
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event) -> Tuple[str, str]:
+        collection = self._pending.pop((event.connection_id, event.request_id), "")
+        return collection, event.command_name
+
+    def succeeded(self, event):
+        labels = self._finish(event)
+        mongodb_command_duration_seconds.observe(event.duration_micros / 1e6, labels)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        mongodb_command_duration_seconds.observe(event.duration_micros / 1e6, labels)
+        mongodb_command_failures_total.inc(labels)
+
+command_metrics = CommandMetricsListener()
+
+def _pool_samples(field: str):
+    for address, stats in pool_stats.snapshot().items():
+        yield (address,), stats[field]
+
+registry.callback("mongodb_pool_open_connections", "Открытые соединения пула MongoDB",
+                  lambda: _pool_samples("open_connections"), labelnames=("address",))
+registry.callback("mongodb_pool_in_use_connections", "Выданные соединения пула MongoDB",
+                  lambda: _pool_samples("in_use"), labelnames=("address",))
+registry.callback("mongodb_pool_waiting_requests", "Запросы, ожидающие соединение пула MongoDB",
+                  lambda: _pool_samples("waiting"), labelnames=("address",))
+registry.callback("mongodb_pool_checkouts_total", "Выдачи соединений пула MongoDB",
+                  lambda: _pool_samples("checkouts"), kind="counter", labelnames=("address",))
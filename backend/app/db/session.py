@@ -1,6 +1,15 @@
 # Database session and connection logic
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+import asyncio
+from typing import Any, Dict, List, Mapping, Optional, Protocol
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReadPreference
+from pymongo.errors import OperationFailure, PyMongoError
+from pymongo.read_preferences import Nearest, PrimaryPreferred, Secondary, SecondaryPreferred
 from app.core.config import settings
+from app.db.memory import MemoryClient
+from app.db.monitoring import command_metrics, pool_stats
+from app.db.slow_queries import slow_query_log
 
 class MongoDB:
     client: AsyncIOMotorClient = None
@@ -19,11 +28,90 @@ PROFILES_COLLECTION = "profiles"
 REFRESH_TOKENS_COLLECTION = "refresh_tokens"
 TOKEN_BLACKLIST_COLLECTION = "token_blacklist"
 
+# Слушатели pymongo.monitoring, передаваемые клиенту при подключении
+_event_listeners: List[Any] = []
+
+def register_event_listener(listener: Any) -> None:
+    """Регистрирует слушатель событий pymongo; действует для клиентов, созданных после вызова."""
+    if listener not in _event_listeners:
+        _event_listeners.append(listener)
+
+# Статистика пула соединений (GET /api/v1/internal/db-pool) и время команд (/metrics)
+register_event_listener(pool_stats)
+if settings.METRICS_ENABLED:
+    register_event_listener(command_metrics)
+
+def mongo_client_options() -> Dict[str, Any]:
+    """Параметры клиента MongoDB из настроек (размер пула, таймауты, сжатие)."""
+    options: Dict[str, Any] = {
+        "uuidRepresentation": 'standard',
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxConnecting": settings.MONGO_MAX_CONNECTING,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if settings.MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = settings.MONGO_MAX_IDLE_TIME_MS
+    if settings.MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = settings.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = ",".join(settings.MONGO_COMPRESSORS)
+    return options
+
+_READ_PREFERENCE_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def public_read_preference() -> Any:
+    """
+    Read preference для публичных чтений из настроек.
+
+    Такие чтения допускают отставание реплики не больше MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS
+    (драйвер не выбирает secondary, отставший сильнее); без replica set все идет на единственный сервер.
+    """
+    mode = settings.MONGO_PUBLIC_READ_PREFERENCE
+    if mode == "primary":
+        return ReadPreference.PRIMARY
+    max_staleness = settings.MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS
+    return _READ_PREFERENCE_MODES[mode](max_staleness=max_staleness if max_staleness is not None else -1)
+
+def primary_collection(db: AsyncIOMotorDatabase, name: str) -> AsyncIOMotorCollection:
+    """Коллекция, читающая с primary, даже если в MONGO_URI задан другой readPreference."""
+    collection = db[name]
+    if collection.read_preference != ReadPreference.PRIMARY:
+        collection = collection.with_options(read_preference=ReadPreference.PRIMARY)
+    return collection
+
+def public_collection(db: AsyncIOMotorDatabase, name: str) -> AsyncIOMotorCollection:
+    """Коллекция для публичных чтений (см. public_read_preference)."""
+    return db[name].with_options(read_preference=public_read_preference())
+
 async def connect_to_mongo():
-    db_client.client = AsyncIOMotorClient(settings.MONGO_URI, uuidRepresentation='standard')
-    db_client.db = db_client.client[settings.MONGO_DB_NAME]
-    print(f"Connected to MongoDB: {settings.MONGO_DB_NAME}")
-    await create_indexes(db_client.db)
+    if settings.STORAGE_BACKEND == "memory":
+        # Новый клиент - пустое хранилище; у каждого процесса свои данные
+        db_client.client = MemoryClient(event_listeners=list(_event_listeners))
+        db_client.db = db_client.client[settings.MONGO_DB_NAME]
+        print(f"Connected to in-memory storage: {settings.MONGO_DB_NAME}")
+    else:
+        # Журнал медленных запросов включается явно: он держит команды до их завершения
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            register_event_listener(slow_query_log)
+        db_client.client = AsyncIOMotorClient(
+            settings.MONGO_URI,
+            event_listeners=list(_event_listeners),
+            **mongo_client_options(),
+        )
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            slow_query_log.bind(db_client.client, asyncio.get_running_loop())
+        db_client.db = db_client.client[settings.MONGO_DB_NAME]
+        print(f"Connected to MongoDB: {settings.MONGO_DB_NAME}")
+    # При большом числе воркеров индексы лучше согласовывать отдельно: python -m app.db.indexes.
+    # Хранилище в памяти всегда пустое, и уникальность в нем обеспечивают те же индексы
+    if settings.MONGO_RECONCILE_INDEXES_ON_STARTUP or settings.STORAGE_BACKEND == "memory":
+        await create_indexes(db_client.db)
 
 async def close_mongo_connection():
     if db_client.client:
@@ -31,21 +119,164 @@ async def close_mongo_connection():
         print("MongoDB connection closed")
 
 async def create_indexes(db: AsyncIOMotorDatabase):
-    # User collection indexes
-    await db[USERS_COLLECTION].create_index("email", unique=True)
-    await db[USERS_COLLECTION].create_index("username", unique=True, sparse=True) # Если username опционален
-    await db[USERS_COLLECTION].create_index("id", unique=True)
-    
-    # Profile collection indexes (если будет)
-    # await db[PROFILES_COLLECTION].create_index("user_id", unique=True)
-
-    # Refresh token indexes
-    await db[REFRESH_TOKENS_COLLECTION].create_index("refresh_token", unique=True)
-    await db[REFRESH_TOKENS_COLLECTION].create_index("user_id")
-    await db[REFRESH_TOKENS_COLLECTION].create_index("expires_at")
-    
-    # Token blacklist indexes
-    await db[TOKEN_BLACKLIST_COLLECTION].create_index("token", unique=True)
-    await db[TOKEN_BLACKLIST_COLLECTION].create_index("expires_at")
-    
-    print("Indexes created successfully for monolith app") 
\ No newline at end of file
+    """
+    Создает недостающие индексы из app.db.indexes.INDEX_SPECS и меняет TTL через collMod.
+
+    Индексы, которые нужно удалить и пересоздать, при запуске не трогаются (их пересоздает
+    python -m app.db.indexes), поэтому одновременный запуск воркеров не удаляет уникальные индексы.
+    """
+    from app.db.indexes import reconcile_indexes, format_plan # Модуль индексов сам импортирует session
+
+    for plan in await reconcile_indexes(db, create_only=True):
+        if plan.recreate:
+            print(f"Indexes differ from INDEX_SPECS, run python -m app.db.indexes: {format_plan(plan)}")
+        elif plan.create or plan.modify_ttl:
+            print(f"Indexes updated: {format_plan(plan)}")
+
+class InvalidatableCache(Protocol):
+    """Локальный кеш, который можно сбросить по ключу или целиком."""
+    def invalidate(self, key: Any) -> None: ...
+    def clear(self) -> None: ...
+
+# Локальные кеши пользователей (ключ - UUID пользователя), сбрасываемые по change stream
+_user_caches: List[InvalidatableCache] = []
+
+def register_user_cache(cache: InvalidatableCache) -> None:
+    """Регистрирует кеш пользователей для сброса при изменениях в других воркерах."""
+    if cache not in _user_caches:
+        _user_caches.append(cache)
+
+# Коды ошибок, после которых возобновить поток по сохраненному токену нельзя
+_CHANGE_STREAM_NOT_SUPPORTED = 40573
+_CHANGE_STREAM_HISTORY_LOST = 286
+_CHANGE_STREAM_FATAL = 280
+
+_INVALIDATING_OPERATIONS = ["update", "replace", "delete", "drop", "rename", "dropDatabase", "invalidate"]
+
+class UserChangeStreamWatcher:
+    """
+    Фоновая задача, читающая change stream коллекции пользователей.
+
+    Изменения, сделанные любым воркером, превращаются в сброс записей в
+    зарегистрированных локальных кешах. Токен возобновления хранится между
+    переподключениями, поэтому обрыв соединения не требует сброса кешей целиком:
+    поток продолжается с последнего обработанного события. Хранить токен вне
+    процесса не нужно - после перезапуска воркера его кеши и так пусты.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, caches: List[InvalidatableCache]):
+        self.db = db
+        self.caches = caches
+        self.resume_token: Optional[Mapping[str, Any]] = None
+        self.events_processed = 0
+        self.full_flushes = 0
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="users-change-stream")
+
+    async def wait_ready(self, timeout: float = 5.0) -> None:
+        """Ждет, пока поток будет открыт (полезно в тестах)."""
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _flush_all(self) -> None:
+        self.full_flushes += 1
+        for cache in self.caches:
+            cache.clear()
+
+    def _handle_change(self, change: Mapping[str, Any]) -> None:
+        self.events_processed += 1
+        operation = change.get("operationType")
+        if operation == "invalidate":
+            # После invalidate поток закрывается и возобновить его по токену нельзя
+            self.resume_token = None
+            self._flush_all()
+            return
+        if operation in ("drop", "rename", "dropDatabase"):
+            self._flush_all()
+            return
+        document = change.get("fullDocument") or change.get("fullDocumentBeforeChange") or {}
+        user_id = document.get("id")
+        if user_id is None:
+            # Для delete без pre-image неизвестно, какой пользователь удален
+            self._flush_all()
+            return
+        for cache in self.caches:
+            cache.invalidate(user_id)
+
+    async def _watch(self) -> None:
+        pipeline = [
+            {"$match": {"operationType": {"$in": _INVALIDATING_OPERATIONS}}},
+            {"$project": {"operationType": 1, "fullDocument.id": 1, "fullDocumentBeforeChange.id": 1}},
+        ]
+        async with self.db[USERS_COLLECTION].watch(
+            pipeline,
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable" if settings.USER_CHANGE_STREAM_PRE_IMAGES else None,
+            resume_after=self.resume_token,
+        ) as stream:
+            self._ready.set()
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    self._handle_change(change)
+                    if change.get("operationType") == "invalidate":
+                        break
+                # resume_token продвигается и без событий (postBatchResumeToken)
+                self.resume_token = stream.resume_token
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                if e.code == _CHANGE_STREAM_NOT_SUPPORTED:
+                    print("Change streams недоступны (MongoDB не является replica set), сброс кешей по change stream отключен")
+                    return
+                if e.code in (_CHANGE_STREAM_HISTORY_LOST, _CHANGE_STREAM_FATAL):
+                    # Токен больше не действителен: пропущенные события неизвестны
+                    self.resume_token = None
+                    self._flush_all()
+                else:
+                    print(f"Ошибка change stream пользователей: {e}")
+            except PyMongoError as e:
+                print(f"Ошибка change stream пользователей: {e}")
+            self._ready.clear()
+            await asyncio.sleep(settings.USER_CHANGE_STREAM_RETRY_SECONDS)
+
+user_change_stream: Optional[UserChangeStreamWatcher] = None
+
+async def enable_user_pre_images(db: AsyncIOMotorDatabase) -> None:
+    """Включает pre-images для коллекции пользователей (MongoDB 6.0+), чтобы delete-события содержали id."""
+    try:
+        await db.command("collMod", USERS_COLLECTION, changeStreamPreAndPostImages={"enabled": True})
+    except PyMongoError as e:
+        print(f"Не удалось включить pre-images для {USERS_COLLECTION}: {e}")
+
+async def start_user_change_stream() -> Optional[UserChangeStreamWatcher]:
+    """Запускает фоновое чтение change stream пользователей (вызывается в lifespan)."""
+    global user_change_stream
+    if not settings.USER_CHANGE_STREAM_ENABLED or user_change_stream is not None:
+        return user_change_stream
+    db = await get_database()
+    if settings.USER_CHANGE_STREAM_PRE_IMAGES:
+        await enable_user_pre_images(db)
+    user_change_stream = UserChangeStreamWatcher(db, _user_caches)
+    user_change_stream.start()
+    return user_change_stream
+
+async def stop_user_change_stream() -> None:
+    global user_change_stream
+    if user_change_stream is not None:
+        await user_change_stream.stop()
+        user_change_stream = None
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Mapping, Optional, Set, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import settings
+
+# Команды, для которых имеет смысл explain (остальные только записываются в журнал)
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+# Поля, которые драйвер добавляет к команде и которые не принимает explain
+_DRIVER_FIELDS = {"lsid", "txnNumber", "readConcern", "writeConcern", "autocommit", "startTransaction"}
+
+# Сколько разных форм запросов помнить (для explain при первом появлении)
+MAX_SHAPES = 1000
+
+REDACTED = "?"
+
+def redact(value: Any) -> Any:
+    """Форма запроса: ключи и операторы сохраняются, значения заменяются на "?"."""
+    if isinstance(value, Mapping):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Длина списков ($in, $or) не меняет план, поэтому списки сворачиваются
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return REDACTED
+
+def query_shape(command_name: str, command: Mapping[str, Any]) -> Dict[str, Any]:
+    """Выделяет из команды части, определяющие план, и скрывает в них значения."""
+    shape: Dict[str, Any] = {}
+    if command_name in ("find", "count", "distinct", "findAndModify"):
+        for field in ("filter", "query"):
+            if field in command:
+                shape[field] = redact(command[field])
+        # Поля сортировки и distinct - часть формы, а не данные
+        if "sort" in command:
+            shape["sort"] = dict(command["sort"])
+        if "key" in command:
+            shape["key"] = command["key"]
+    elif command_name == "aggregate":
+        shape["pipeline"] = redact(command.get("pipeline", []))
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or []
+        if statements:
+            shape["q"] = redact(statements[0].get("q", {}))
+    return shape
+
+def summarize_plan(explain: Mapping[str, Any]) -> Dict[str, Any]:
+    """Краткое описание выигравшего плана: цепочка стадий и использованные индексы."""
+    planner = explain.get("queryPlanner")
+    if planner is None and explain.get("stages"):
+        planner = explain["stages"][0].get("$cursor", {}).get("queryPlanner")
+    planner = planner or {}
+    plan = planner.get("winningPlan", {})
+    plan = plan.get("queryPlan", plan)  # Формат SBE (MongoDB 7+)
+
+    stages: List[str] = []
+    indexes: List[str] = []
+    node: Optional[Mapping[str, Any]] = plan
+    while node:
+        stages.append(node.get("stage", "?"))
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        children = node.get("inputStages") or ([node["inputStage"]] if node.get("inputStage") else [])
+        node = children[0] if children else None
+    return {
+        "stages": " <- ".join(stages),
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "namespace": planner.get("namespace"),
+    }
+
+class SlowQueryLog(monitoring.CommandListener):
+    """
+    Журнал медленных команд MongoDB.
+
+    Команды дольше threshold_ms попадают в кольцевой буфер с коллекцией,
+    формой запроса (значения скрыты) и длительностью. При первом появлении
+    формы в event loop приложения запускается explain (queryPlanner, запрос
+    не выполняется), и его краткий итог хранится рядом с журналом.
+    """
+
+    def __init__(self, threshold_ms: float, max_entries: int, explain: bool = True):
+        self.threshold_ms = threshold_ms
+        self.explain_enabled = explain
+        self.entries: Deque[Dict[str, Any]] = deque(maxlen=max_entries)
+        self.plans: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, Mapping[str, Any], float]] = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._explain_tasks: Set[asyncio.Task] = set()
+
+    def bind(self, client, loop: asyncio.AbstractEventLoop) -> None:
+        """Задает клиент и event loop, в которых выполняется explain."""
+        self._client = client
+        self._loop = loop
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.plans.clear()
+
+    def started(self, event):
+        if event.command_name == "explain":
+            return  # explain, запущенный самим журналом
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.database_name, event.command_name, event.command, time.time()
+        )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool) -> None:
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        database, command_name, command, started_at = pending
+        target = command.get(command_name)
+        collection = target if isinstance(target, str) else ""
+        shape = query_shape(command_name, command)
+        shape_id = hashlib.blake2b(
+            json.dumps([database, collection, command_name, shape], sort_keys=True, default=str).encode(),
+            digest_size=8,
+        ).hexdigest()
+        entry = {
+            "at": datetime.fromtimestamp(started_at, tz=timezone.utc).isoformat(),
+            "database": database,
+            "collection": collection,
+            "command": command_name,
+            "shape": shape,
+            "shape_id": shape_id,
+            "duration_ms": round(duration_ms, 3),
+            "failed": failed,
+        }
+        with self._lock:
+            self.entries.append(entry)
+            first_sighting = shape_id not in self.plans
+            if first_sighting:
+                self.plans[shape_id] = None
+                while len(self.plans) > MAX_SHAPES:
+                    self.plans.popitem(last=False)
+        if first_sighting and command_name in EXPLAINABLE_COMMANDS:
+            self._schedule_explain(shape_id, database, command)
+
+    def _schedule_explain(self, shape_id: str, database: str, command: Mapping[str, Any]) -> None:
+        if not self.explain_enabled or self._client is None or self._loop is None or self._loop.is_closed():
+            return
+        explained = {
+            key: value for key, value in command.items()
+            if not key.startswith("$") and key not in _DRIVER_FIELDS
+        }
+        # Событие пришло из потока драйвера: explain ставится в event loop приложения
+        self._loop.call_soon_threadsafe(self._start_explain, shape_id, database, explained)
+
+    def _start_explain(self, shape_id: str, database: str, command: Dict[str, Any]) -> None:
+        task = self._loop.create_task(self._explain(shape_id, database, command))
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, shape_id: str, database: str, command: Dict[str, Any]) -> None:
+        try:
+            result = await self._client[database].command({"explain": command, "verbosity": "queryPlanner"})
+            plan = summarize_plan(result)
+        except Exception as e:
+            plan = {"error": str(e)}
+        with self._lock:
+            if shape_id in self.plans:
+                self.plans[shape_id] = plan
+
+    def snapshot(self, limit: int) -> Dict[str, Any]:
+        """Последние limit записей (новые первыми) и планы встреченных в них форм."""
+        with self._lock:
+            entries = list(self.entries)[-limit:][::-1] if limit > 0 else []
+            plans = {entry["shape_id"]: self.plans.get(entry["shape_id"]) for entry in entries}
+        return {"threshold_ms": self.threshold_ms, "entries": entries, "plans": plans}
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    max_entries=settings.SLOW_QUERY_LOG_SIZE,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+)
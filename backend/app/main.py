@@ -1,16 +1,32 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.db.session import connect_to_mongo, close_mongo_connection
-from app.api.v1.endpoints import users, auth
+from app.db.session import (
+    close_mongo_connection,
+    connect_to_mongo,
+    get_database,
+    start_user_change_stream,
+    stop_user_change_stream,
+)
+from app.core.config import settings
+from app.core.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, registry
+from app.core.security import init_password_hashing, shutdown_password_executor
+from app.crud.revocation import token_revocations
+from app.api.v1.endpoints import users, auth, internal
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Обработчик событий запуска и остановки приложения."""
+    init_password_hashing()
     await connect_to_mongo()
+    await start_user_change_stream()
+    token_revocations.start(await get_database())
     yield
+    await token_revocations.stop()
+    await stop_user_change_stream()
     await close_mongo_connection()
+    shutdown_password_executor()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -24,8 +40,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Метрики запросов: добавляется последним, чтобы измерять время с учетом остальных middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Подключение маршрутов
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
+app.include_router(internal.router, prefix="/api/v1/internal", tags=["internal"])
 
-# TODO: Добавить другие настройки middleware при необходимости. 
\ No newline at end of file
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        """Метрики в текстовом формате Prometheus (доступ стоит ограничить на уровне ingress)."""
+        return Response(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
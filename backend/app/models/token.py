@@ -1,7 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 from .base import MongoBaseModel, TimeStampedModel
 
@@ -28,13 +28,21 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 class RefreshTokenInDB(TimeStampedModel):
-    """Модель refresh токена в базе данных."""
+    """
+    Модель refresh токена в базе данных.
+
+    Токены, полученные ротацией из одного входа, образуют семейство (family_id) -
+    одну сессию пользователя.
+    """
     user_id: uuid.UUID
     refresh_token: str
+    family_id: uuid.UUID = Field(default_factory=uuid.uuid4)
     expires_at: datetime
     is_revoked: bool = False
+    revoked_at: Optional[datetime] = None
 
 class TokenBlacklist(MongoBaseModel):
-    """Модель для хранения отозванных токенов."""
+    """Модель для хранения отозванных токенов (token - идентификатор jti access токена)."""
     token: str
-    expires_at: datetime 
\ No newline at end of file
+    expires_at: datetime
+    revoked_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc)) 
\ No newline at end of file
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List
+from datetime import datetime
 import uuid
 from enum import Enum
 
@@ -65,7 +66,26 @@ class UserPublic(MongoBaseModel):
     is_active: bool
     created_at: Optional[str] = None 
 
+    @field_validator('created_at', mode='before')
+    @classmethod
+    def serialize_created_at(cls, v):
+        """Принимает datetime из БД и хранит его в ISO формате."""
+        if isinstance(v, datetime):
+            return v.isoformat()
+        return v
+
 class UserLoginRequest(BaseModel):
     """Модель для данных входа пользователя (email и пароль)."""
     email: EmailStr
-    password: str 
\ No newline at end of file
+    password: str 
+
+class UserImportError(BaseModel):
+    """Ошибка импорта одной строки файла."""
+    line: int
+    field: Optional[str] = None
+    message: str
+
+class UserImportResult(BaseModel):
+    """Итог массового импорта пользователей."""
+    created: int = 0
+    errors: List[UserImportError] = []
@@ -0,0 +1,27 @@
+"""
+Стоимость bcrypt на текущей машине.
+
+Запуск (из директории backend):
+
+    python -m benchmarks.bcrypt_cost --target-ms 250
+
+Печатает время хеширования для диапазона раундов и значение, которое выберет
+калибровка при BCRYPT_CALIBRATE=true с тем же BCRYPT_TARGET_MS.
+"""
+import argparse
+
+from app.core.security import calibrate_bcrypt_rounds, measure_bcrypt_ms
+
+
+def main(args: argparse.Namespace) -> None:
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        print(f"rounds={rounds:<3} {measure_bcrypt_ms(rounds):9.2f} ms")
+    print(f"calibrated rounds for {args.target_ms} ms: {calibrate_bcrypt_rounds(args.target_ms)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--min-rounds", type=int, default=8)
+    parser.add_argument("--max-rounds", type=int, default=13)
+    main(parser.parse_args())
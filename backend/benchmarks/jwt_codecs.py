@@ -0,0 +1,64 @@
+"""
+Пропускная способность кодеков JWT (encode/decode access токена).
+
+Запуск (из директории backend):
+
+    python -m benchmarks.jwt_codecs --number 20000
+
+Для каждого доступного бэкенда (JWT_BACKEND) печатает операции в секунду
+и микросекунды на операцию; токены каждого кодека дополнительно проверяются
+кодеком python-jose, чтобы замер не скрывал несовместимость.
+"""
+import argparse
+import time
+import timeit
+from uuid import uuid4
+
+from app.core.security import JWT_CODECS, JoseCodec
+
+KEYS = {None: "benchmark-legacy-secret", "current": "benchmark-current-secret"}
+
+
+def access_claims() -> dict:
+    """Полезная нагрузка, как у access токена в режиме AUTH_CLAIMS_ONLY."""
+    return {
+        "sub": str(uuid4()),
+        "roles": ["user"],
+        "email": "benchmark@example.com",
+        "username": "benchmark",
+        "full_name": "Benchmark User",
+        "status": "active",
+        "is_active": True,
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "exp": int(time.time()) + 3600,
+        "jti": uuid4().hex,
+    }
+
+
+def measure(fn, number: int, repeat: int) -> float:
+    """Лучшее из repeat время одной операции, мкс."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main(args: argparse.Namespace) -> None:
+    claims = access_claims()
+    reference = JoseCodec(KEYS, "current", "HS256")
+    print(f"{'backend':<8} {'encode us':>10} {'encode/s':>10} {'decode us':>10} {'decode/s':>10}")
+    for name, codec_cls in JWT_CODECS.items():
+        try:
+            codec = codec_cls(KEYS, "current", "HS256")
+        except RuntimeError as e:
+            print(f"{name:<8} пропущен: {e}")
+            continue
+        token = codec.encode(claims)
+        assert codec.decode(token) == claims and reference.decode(token) == claims, name
+        encode_us = measure(lambda: codec.encode(claims), args.number, args.repeat)
+        decode_us = measure(lambda: codec.decode(token), args.number, args.repeat)
+        print(f"{name:<8} {encode_us:10.2f} {1e6 / encode_us:10.0f} {decode_us:10.2f} {1e6 / decode_us:10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="операций в одном замере")
+    parser.add_argument("--repeat", type=int, default=5, help="число замеров, берется лучший")
+    main(parser.parse_args())
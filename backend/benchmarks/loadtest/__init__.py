@@ -0,0 +1,19 @@
+"""
+Нагрузочное тестирование API авторизации и пользователей.
+
+Запуск (из директории backend):
+
+    # В процессе, через httpx.ASGITransport (нужен MongoDB из settings.MONGO_URI)
+    python -m benchmarks.loadtest --clients 500 --duration 30 --db-name loadtest --drop-db
+
+    # По сети против запущенного uvicorn
+    uvicorn app.main:app --workers 4 --port 8000
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8000 --clients 500 --duration 30
+
+    # Смесь сценариев и сохранение результатов для сравнения между коммитами
+    python -m benchmarks.loadtest --mix journey=1,browse=6,refresh=2 --output results/head.json
+    python -m benchmarks.loadtest.report results/base.json results/head.json
+
+Каждый виртуальный клиент в замкнутом цикле выбирает сценарий по весам смеси
+и выполняет его шаги. Сценарии описаны в scenarios.py.
+"""
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from benchmarks.loadtest import __doc__ as usage
+from benchmarks.loadtest.report import build_results, format_results
+from benchmarks.loadtest.runner import Recorder, prepare_sessions, run_load
+from benchmarks.loadtest.scenarios import parse_mix
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@asynccontextmanager
+async def _client(args: argparse.Namespace) -> AsyncIterator[httpx.AsyncClient]:
+    """Клиент к uvicorn по --base-url или к приложению в процессе (с его lifespan)."""
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    timeout = httpx.Timeout(args.timeout)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+            yield client
+        return
+
+    from app.core.config import settings
+    if args.drop_db and (not args.db_name or args.db_name == settings.MONGO_DB_NAME):
+        # Удаляется только отдельная база прогона, а не настроенная база приложения
+        raise ValueError("--drop-db требует --db-name, отличного от MONGO_DB_NAME")
+    if args.db_name:
+        settings.MONGO_DB_NAME = args.db_name
+    from app.db.session import db_client
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+                yield client
+        finally:
+            if args.drop_db:
+                await db_client.client.drop_database(settings.MONGO_DB_NAME)
+                print(f"dropped database {settings.MONGO_DB_NAME}")
+
+
+async def main(args: argparse.Namespace) -> dict:
+    mix = parse_mix(args.mix)
+    users = args.users or math.ceil(args.clients / 8)
+    recorder = Recorder()
+    async with _client(args) as client:
+        sessions = await prepare_sessions(client, recorder, args.clients, users, args.setup_concurrency)
+        print(f"prepared {len(sessions)} clients for {users} users; mix: {args.mix}")
+        elapsed = await run_load(sessions, mix, args.duration, args.iterations, args.seed, args.think_time)
+
+    meta = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "target": args.base_url or "in-process",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+    }
+    results = build_results(recorder, elapsed, meta)
+    print(format_results(results))
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        print(f"results written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=usage, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="адрес запущенного сервера; без него приложение работает в процессе")
+    parser.add_argument("--clients", type=int, default=50, help="число одновременных виртуальных клиентов")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность в секундах (0 - без ограничения)")
+    parser.add_argument("--iterations", type=int, help="число сценариев на клиента")
+    parser.add_argument("--mix", default="journey=1,browse=6,refresh=2", help="веса сценариев")
+    parser.add_argument("--users", type=int, help="число заранее зарегистрированных пользователей (по умолчанию clients/8)")
+    parser.add_argument("--setup-concurrency", type=int, default=20)
+    parser.add_argument("--think-time", type=float, default=0.0, help="пауза клиента между сценариями, с")
+    parser.add_argument("--timeout", type=float, default=30.0, help="таймаут запроса, с")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-name", help="база MongoDB для режима в процессе")
+    parser.add_argument("--drop-db", action="store_true", help="удалить базу --db-name после прогона (режим в процессе)")
+    parser.add_argument("--output", help="путь JSON с результатами")
+    args = parser.parse_args()
+    if not args.duration and not args.iterations:
+        parser.error("нужно задать --duration или --iterations")
+    if args.base_url and (args.db_name or args.drop_db):
+        parser.error("--db-name и --drop-db применимы только без --base-url")
+    if args.drop_db and not args.db_name:
+        parser.error("--drop-db удаляет базу прогона и требует --db-name")
+    sys.exit(1 if asyncio.run(main(args))["errors"] else 0)
@@ -0,0 +1,96 @@
+"""
+Отчет нагрузочного теста и сравнение двух прогонов.
+
+    python -m benchmarks.loadtest.report results/base.json results/head.json
+"""
+import argparse
+import json
+import statistics
+from typing import Any, Dict, List
+
+from app.core.metrics import percentile
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    summary = {
+        "count": len(ordered),
+        "rps": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = percentile(ordered, pct) * 1000
+    return summary
+
+
+def build_results(recorder, elapsed: float, meta: Dict[str, Any]) -> Dict[str, Any]:
+    endpoints = {}
+    for name, samples in sorted(recorder.latencies.items()):
+        if name.startswith("setup "):
+            continue
+        endpoints[name] = {
+            **summarize(samples, elapsed),
+            "errors": recorder.errors.get(name, 0),
+            "statuses": dict(recorder.statuses[name]),
+        }
+    total = sum(endpoint["count"] for endpoint in endpoints.values())
+    return {
+        "meta": meta,
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "endpoints": endpoints,
+        "scenarios": {name: summarize(samples, elapsed) for name, samples in sorted(recorder.scenarios.items())},
+    }
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    lines = [
+        f"elapsed {results['elapsed_s']:.1f} s, {results['requests']} requests, "
+        f"{results['throughput_rps']:.1f} req/s, {results['errors']} errors",
+        f"{'endpoint':<22} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>6}",
+    ]
+    for title, rows in (("", results["endpoints"]), ("scenario ", results["scenarios"])):
+        for name, row in rows.items():
+            lines.append(
+                f"{title + name:<22} {row['count']:>7} {row['rps']:>8.1f} {row['p50_ms']:>8.2f} "
+                f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} {row.get('errors', 0):>6}"
+            )
+    return "\n".join(lines)
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any]) -> str:
+    """Изменения пропускной способности и перцентилей между двумя прогонами (в процентах)."""
+
+    def delta(old: float, new: float) -> str:
+        return f"{(new - old) / old * 100:+7.1f}%" if old else "    n/a"
+
+    lines = [
+        f"throughput {base['throughput_rps']:.1f} -> {head['throughput_rps']:.1f} req/s "
+        f"({delta(base['throughput_rps'], head['throughput_rps']).strip()})",
+        f"{'endpoint':<22} " + " ".join(f"{f'p{pct}':>20}" for pct in PERCENTILES),
+    ]
+    for name in sorted(set(base["endpoints"]) | set(head["endpoints"])):
+        old, new = base["endpoints"].get(name), head["endpoints"].get(name)
+        if old is None or new is None:
+            lines.append(f"{name:<22} {'только в ' + ('head' if old is None else 'base'):>20}")
+            continue
+        cells = [
+            f"{old[f'p{pct}_ms']:7.2f}->{new[f'p{pct}_ms']:7.2f} {delta(old[f'p{pct}_ms'], new[f'p{pct}_ms'])}"
+            for pct in PERCENTILES
+        ]
+        lines.append(f"{name:<22} " + " ".join(cells))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="JSON результатов базового прогона")
+    parser.add_argument("head", help="JSON результатов нового прогона")
+    args = parser.parse_args()
+    with open(args.base) as base_file, open(args.head) as head_file:
+        print(compare(json.load(base_file), json.load(head_file)))
@@ -0,0 +1,143 @@
+"""Виртуальные клиенты, сбор задержек и выполнение смеси сценариев."""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+
+class Recorder:
+    """Задержки и коды ответов по эндпоинтам и сценариям."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.scenarios: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, name: str, elapsed: float, status: Optional[int]) -> None:
+        self.latencies[name].append(elapsed)
+        key = str(status) if status is not None else "exception"
+        self.statuses[name][key] += 1
+        if status is None or status >= 400:
+            self.errors[name] += 1
+
+
+class ClientSession:
+    """Состояние одного виртуального клиента: пользователь и его токены."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, user: Optional[Dict[str, str]] = None):
+        self.client = client
+        self.recorder = recorder
+        self.user = user
+        self.access_token: Optional[str] = None
+        self.refresh_token: Optional[str] = None
+
+    def set_tokens(self, tokens: Dict[str, Any]) -> None:
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens.get("refresh_token") or self.refresh_token
+
+    def auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Выполняет запрос и записывает его задержку под именем name."""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(name, time.perf_counter() - started, None)
+            raise
+        self.recorder.record(name, time.perf_counter() - started, response.status_code)
+        return response
+
+
+async def _bounded_gather(coroutines, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+async def prepare_sessions(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    clients: int,
+    users: int,
+    concurrency: int,
+) -> List[ClientSession]:
+    """
+    Регистрирует users пользователей и выполняет вход каждого клиента.
+
+    Каждый клиент входит отдельно и получает свою сессию refresh токенов:
+    при общей сессии ротация токенов приняла бы параллельные обновления за повторное использование.
+    """
+    from benchmarks.loadtest.scenarios import PASSWORD, new_credentials
+
+    credentials = [new_credentials() for _ in range(users)]
+    setup = ClientSession(client, recorder)
+    responses = await _bounded_gather(
+        (setup.request("setup register", "POST", "/api/v1/auth/register", json=user) for user in credentials),
+        concurrency,
+    )
+    for response in responses:
+        if response.status_code != 201:
+            raise RuntimeError(f"Регистрация при подготовке не удалась: {response.status_code} {response.text}")
+
+    sessions = [ClientSession(client, recorder, credentials[i % users]) for i in range(clients)]
+
+    async def login(session: ClientSession) -> None:
+        response = await session.request(
+            "setup login", "POST", "/api/v1/auth/login",
+            json={"email": session.user["email"], "password": PASSWORD},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Вход при подготовке не удался: {response.status_code} {response.text}")
+        session.set_tokens(response.json())
+
+    await _bounded_gather((login(session) for session in sessions), concurrency)
+    return sessions
+
+
+async def run_load(
+    sessions: Sequence[ClientSession],
+    mix: Sequence[Tuple[str, float]],
+    duration: Optional[float],
+    iterations: Optional[int],
+    seed: int = 0,
+    think_time: float = 0.0,
+) -> float:
+    """
+    Запускает клиентов в замкнутом цикле; возвращает фактическую длительность.
+
+    Клиент останавливается по истечении duration секунд или после iterations сценариев.
+    """
+    from benchmarks.loadtest.scenarios import SCENARIOS
+
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    async def client_loop(index: int, session: ClientSession) -> None:
+        rng = random.Random(seed * 1_000_003 + index)
+        done = 0
+        while (deadline is None or time.perf_counter() < deadline) and (iterations is None or done < iterations):
+            name = rng.choices(names, weights)[0]
+            scenario_started = time.perf_counter()
+            try:
+                await SCENARIOS[name](session)
+            except httpx.HTTPError:
+                pass  # Уже учтено в Recorder как exception
+            session.recorder.scenarios[name].append(time.perf_counter() - scenario_started)
+            done += 1
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(client_loop(index, session) for index, session in enumerate(sessions)))
+    return time.perf_counter() - started
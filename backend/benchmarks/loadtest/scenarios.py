@@ -0,0 +1,101 @@
+"""
+Сценарии нагрузки.
+
+Сценарий - корутина, принимающая ClientSession; каждый запрос выполняется
+через session.request(имя_эндпоинта, ...), чтобы задержки собирались по эндпоинтам.
+"""
+import uuid
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from benchmarks.loadtest.runner import ClientSession
+
+Scenario = Callable[[ClientSession], Awaitable[None]]
+
+PASSWORD = "LoadTest_Password123!"
+
+
+def new_credentials() -> Dict[str, str]:
+    suffix = uuid.uuid4().hex
+    return {
+        "email": f"load_{suffix}@example.com",
+        "username": f"load_{suffix}",
+        "full_name": "Load Test",
+        "password": PASSWORD,
+    }
+
+
+async def journey(session: ClientSession) -> None:
+    """Новый пользователь: register -> login -> /users/me -> список -> refresh."""
+    credentials = new_credentials()
+    response = await session.request("POST /auth/register", "POST", "/api/v1/auth/register", json=credentials)
+    if response.status_code != 201:
+        return
+    response = await session.request(
+        "POST /auth/login", "POST", "/api/v1/auth/login",
+        json={"email": credentials["email"], "password": PASSWORD},
+    )
+    if response.status_code != 200:
+        return
+    tokens = response.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    await session.request("GET /users/me", "GET", "/api/v1/users/me", headers=headers)
+    await session.request("GET /users", "GET", "/api/v1/users/", params={"limit": 20}, headers=headers)
+    await session.request(
+        "POST /auth/refresh", "POST", "/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+
+
+async def browse(session: ClientSession) -> None:
+    """Вошедший пользователь: /users/me и две страницы списка по курсору."""
+    headers = session.auth_headers()
+    await session.request("GET /users/me", "GET", "/api/v1/users/me", headers=headers)
+    response = await session.request("GET /users", "GET", "/api/v1/users/", params={"limit": 20}, headers=headers)
+    cursor = response.headers.get("X-Next-Cursor")
+    if cursor:
+        await session.request(
+            "GET /users", "GET", "/api/v1/users/", params={"limit": 20, "cursor": cursor}, headers=headers
+        )
+
+
+async def refresh(session: ClientSession) -> None:
+    """Обновление токенов; новый refresh токен сохраняется в сессии клиента."""
+    response = await session.request(
+        "POST /auth/refresh", "POST", "/api/v1/auth/refresh", json={"refresh_token": session.refresh_token}
+    )
+    if response.status_code == 200:
+        session.set_tokens(response.json())
+
+
+async def login(session: ClientSession) -> None:
+    """Повторный вход существующего пользователя (нагрузка на bcrypt)."""
+    response = await session.request(
+        "POST /auth/login", "POST", "/api/v1/auth/login",
+        json={"email": session.user["email"], "password": PASSWORD},
+    )
+    if response.status_code == 200:
+        session.set_tokens(response.json())
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "journey": journey,
+    "browse": browse,
+    "refresh": refresh,
+    "login": login,
+}
+
+
+def parse_mix(text: str) -> List[Tuple[str, float]]:
+    """Разбирает смесь вида "journey=1,browse=6" в [(имя, вес)]."""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий {name!r}; доступны: {', '.join(SCENARIOS)}")
+        value = float(weight) if weight else 1.0
+        if value < 0:
+            raise ValueError(f"Вес сценария {name!r} не может быть отрицательным")
+        if value:
+            mix.append((name, value))
+    if not mix:
+        raise ValueError("Смесь сценариев пуста")
+    return mix
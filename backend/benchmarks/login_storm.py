@@ -0,0 +1,111 @@
+"""
+Бенчмарк: задержка /api/v1/users/me во время "шторма" логинов.
+
+Запуск (из директории backend, нужен доступный MongoDB из settings.MONGO_URI):
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 50
+    python -m benchmarks.login_storm --inline   # bcrypt прямо в event loop (поведение до пула)
+
+Сначала измеряется p50/p99 /users/me без нагрузки, затем те же запросы
+выполняются параллельно с потоком логинов. При выполнении bcrypt в пуле
+p99 /users/me должен оставаться практически неизменным.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from app.api.v1.endpoints import auth as auth_endpoints
+from app.core.metrics import percentile
+from app.core.security import shutdown_password_executor, verify_password
+from app.db.session import close_mongo_connection, connect_to_mongo
+from app.main import app
+
+
+def _report(name: str, samples: list[float]) -> None:
+    ordered = sorted(samples)
+    print(
+        f"{name:<22} n={len(samples):<5} "
+        f"p50={percentile(ordered, 50) * 1000:8.2f} ms  "
+        f"p99={percentile(ordered, 99) * 1000:8.2f} ms  "
+        f"mean={statistics.mean(samples) * 1000:8.2f} ms"
+    )
+
+
+async def _probe_me(client: httpx.AsyncClient, headers: dict, count: int, interval: float) -> list[float]:
+    """
+    Запрашивает /users/me по фиксированному расписанию и собирает задержки.
+
+    Задержка считается от запланированного момента отправки, а не от фактического:
+    иначе время, когда event loop был заблокирован между запросами, не попало бы в замер.
+    """
+    samples = []
+    started = time.perf_counter()
+    for i in range(count):
+        scheduled = started + i * interval
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        response = await client.get("/api/v1/users/me", headers=headers)
+        samples.append(time.perf_counter() - scheduled)
+        assert response.status_code == 200, response.text
+    return samples
+
+
+async def _login_storm(client: httpx.AsyncClient, credentials: dict, logins: int, concurrency: int) -> None:
+    """Выполняет logins логинов, не более concurrency одновременно."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login() -> None:
+        async with semaphore:
+            response = await client.post("/api/v1/auth/login", json=credentials)
+            assert response.status_code == 200, response.text
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.inline:
+        # Воспроизводим старое поведение: bcrypt выполняется прямо в event loop
+        async def _inline_verify(plain_password: str, hashed_password: str) -> bool:
+            return verify_password(plain_password, hashed_password)
+        auth_endpoints.averify_password = _inline_verify
+
+    await connect_to_mongo()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            credentials = {"email": f"storm_{uuid.uuid4()}@example.com", "password": "StormPassword123!"}
+            response = await client.post(
+                "/api/v1/auth/register",
+                json={**credentials, "username": f"storm_{uuid.uuid4()}", "full_name": "Login Storm"},
+            )
+            assert response.status_code == 201, response.text
+            tokens = (await client.post("/api/v1/auth/login", json=credentials)).json()
+            headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+            idle = await _probe_me(client, headers, args.probes, args.probe_interval)
+            storm = asyncio.create_task(_login_storm(client, credentials, args.logins, args.concurrency))
+            loaded = await _probe_me(client, headers, args.probes, args.probe_interval)
+            started = time.perf_counter()
+            await storm
+            storm_elapsed = time.perf_counter() - started
+
+            print(f"mode: {'inline bcrypt' if args.inline else 'password hasher pool'}")
+            _report("/users/me idle", idle)
+            _report("/users/me under storm", loaded)
+            print(f"storm tail after probes: {storm_elapsed:.2f} s")
+    finally:
+        await close_mongo_connection()
+        shutdown_password_executor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    parser.add_argument("--inline", action="store_true", help="выполнять bcrypt в event loop")
+    asyncio.run(main(parser.parse_args()))
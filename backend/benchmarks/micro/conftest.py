@@ -0,0 +1,155 @@
+"""
+Фикстура bench: замер функции, нормировка по калибровке и сравнение с baselines.json.
+
+Время вызова делится на время калибровочного цикла на чистом Python,
+замеренного непосредственно перед функцией, поэтому базовые значения
+переносимы между машинами и меньше зависят от частоты процессора. Тест падает, если
+нормированная стоимость выросла больше чем на порог (по умолчанию 50%)
+и рост подтвердился повторными замерами: кратковременная нагрузка на машину
+дает выбросы, а настоящая регрессия воспроизводится.
+"""
+import json
+import os
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pytest
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+DEFAULT_THRESHOLD = 0.50
+# Сколько раз замер повторяется при превышении порога (и при обновлении базовых значений)
+ATTEMPTS = 3
+# Минимум по многим коротким сериям устойчивее к соседней нагрузке, чем по нескольким длинным
+SERIES_SECONDS = 0.02
+REPEATS = 30
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("microbench")
+    group.addoption(
+        "--bench-threshold", type=float, default=float(os.environ.get("BENCH_THRESHOLD", DEFAULT_THRESHOLD)),
+        help="допустимый рост нормированной стоимости (0.5 = 50%%; env BENCH_THRESHOLD)",
+    )
+    group.addoption(
+        "--bench-update", action="store_true", default=os.environ.get("BENCH_UPDATE") == "1",
+        help="записать результаты в baselines.json вместо сравнения (env BENCH_UPDATE=1)",
+    )
+
+
+def measure(func: Callable[[], Any]) -> float:
+    """Время одного вызова в секундах: минимум по REPEATS сериям примерно по SERIES_SECONDS."""
+    timer = timeit.Timer(func)
+    elapsed = timer.timeit(number=1)
+    number = max(1, int(SERIES_SECONDS / max(elapsed, 1e-7)))
+    # Прогрев и уточнение длины серии по более точному замеру
+    number = max(1, int(SERIES_SECONDS * number / max(timer.timeit(number=number), 1e-7)))
+    return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+
+def _calibration_workload() -> int:
+    # Смесь операций интерпретатора, типичная для горячего кода: словари, строки, вызовы
+    total = 0
+    data = {}
+    for i in range(200):
+        key = f"k{i}"
+        data[key] = i
+        total += len(key) + data[key]
+    return total
+
+
+class BenchSession:
+    """
+    Состояние прогона: базовые значения и лучшие замеры.
+
+    Помехи только замедляют выполнение, поэтому и для функций, и для калибровки
+    берется минимум: калибровка перемеряется перед каждой функцией, а стоимость
+    считается по наименьшему времени калибровки за весь прогон.
+    """
+
+    def __init__(self, config):
+        self.threshold: float = config.getoption("--bench-threshold")
+        self.update: bool = config.getoption("--bench-update")
+        self.baselines: Dict[str, float] = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+        self.calibration = float("inf")
+        self.seconds: Dict[str, float] = {}
+
+    def record(self, name: str, func: Callable[[], Any]) -> float:
+        self.calibration = min(self.calibration, measure(_calibration_workload))
+        self.seconds[name] = min(self.seconds.get(name, float("inf")), measure(func))
+        return self.score(name)
+
+    def score(self, name: str) -> float:
+        return self.seconds[name] / self.calibration
+
+
+@pytest.fixture(scope="session")
+def bench_session(request) -> BenchSession:
+    session = BenchSession(request.config)
+    request.config._bench_session = session
+    return session
+
+
+@pytest.fixture
+def bench(request, bench_session: BenchSession) -> Callable[..., float]:
+    """
+    bench(func, *args, **kwargs) замеряет func и сравнивает с базовым значением теста.
+
+    Имя замера - имя теста без префикса test_. Возвращает нормированную стоимость.
+    """
+    name = request.node.name.removeprefix("test_")
+
+    def run(func: Callable[..., Any], *args, **kwargs) -> float:
+        def call():
+            return func(*args, **kwargs)
+
+        if bench_session.update:
+            for _ in range(ATTEMPTS):
+                score = bench_session.record(name, call)
+            return score
+        baseline = bench_session.baselines.get(name)
+        limit = None if baseline is None else baseline * (1 + bench_session.threshold)
+        for _ in range(ATTEMPTS):
+            score = bench_session.record(name, call)
+            if limit is None or score <= limit:
+                break
+        if baseline is None:
+            pytest.skip(f"нет базового значения для {name}; запустите с --bench-update")
+        if score > limit:
+            pytest.fail(
+                f"{name}: стоимость {score:.2f} против базовой {baseline:.2f} "
+                f"(+{(score / baseline - 1) * 100:.0f}%, порог {bench_session.threshold * 100:.0f}%)",
+                pytrace=False,
+            )
+        return score
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    bench_session = getattr(session.config, "_bench_session", None)
+    if bench_session is None or not bench_session.update or not bench_session.seconds:
+        return
+    baselines = {**bench_session.baselines}
+    baselines.update({name: float(f"{bench_session.score(name):.4g}") for name in bench_session.seconds})
+    BASELINES_PATH.write_text(json.dumps(dict(sorted(baselines.items())), indent=2) + "\n")
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    bench_session = getattr(config, "_bench_session", None)
+    if bench_session is None or not bench_session.seconds:
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section("microbenchmarks")
+    write(f"calibration: {bench_session.calibration * 1e6:.2f} us, threshold: {bench_session.threshold * 100:.0f}%")
+    write(f"{'benchmark':<32} {'us/call':>10} {'score':>8} {'baseline':>9} {'change':>8}")
+    for name, seconds in sorted(bench_session.seconds.items()):
+        score = bench_session.score(name)
+        baseline = bench_session.baselines.get(name)
+        change = f"{(score / baseline - 1) * 100:+.1f}%" if baseline else "new"
+        write(
+            f"{name:<32} {seconds * 1e6:>10.2f} {score:>8.3f} "
+            f"{baseline if baseline is not None else '-':>9} {change:>8}"
+        )
+    if bench_session.update:
+        write(f"baselines written to {BASELINES_PATH}")
@@ -0,0 +1,85 @@
+"""
+Микробенчмарки горячих функций запроса (MongoDB не нужен).
+
+    python -m pytest benchmarks/micro                       # сравнить с baselines.json
+    python -m pytest benchmarks/micro --bench-threshold 0.5 # более мягкий порог
+    python -m pytest benchmarks/micro --bench-update        # обновить базовые значения
+
+Базовые значения обновляются в том же коммите, что и осознанное изменение стоимости.
+"""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.api.v1.responses import dump_user, dump_users, to_user_public
+from app.core.security import create_access_token, decode_token
+from app.models.base import StandardResponse
+from app.models.user import UserInDB
+
+
+def _document(n: int = 0) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "email": f"user_{n}@example.com",
+        "username": f"user_{n}",
+        "full_name": "Micro Bench",
+        "hashed_password": "$2b$12$" + "x" * 53,
+        "roles": ["user"],
+        "status": "active",
+        "is_active": True,
+        "is_verified": False,
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": None,
+    }
+
+
+def _public_document(n: int = 0) -> dict:
+    document = _document(n)
+    for field in ("hashed_password", "is_verified", "updated_at"):
+        del document[field]
+    return document
+
+
+@pytest.fixture(scope="module")
+def claims() -> dict:
+    return {"sub": str(uuid.uuid4()), "roles": ["user"], "status": "active"}
+
+
+def test_create_access_token(bench, claims):
+    bench(create_access_token, claims)
+
+
+def test_decode_token(bench, claims):
+    token = create_access_token(claims)
+    assert decode_token(token)["sub"] == claims["sub"]
+    bench(decode_token, token)
+
+
+def test_user_in_db_from_document(bench):
+    document = _document()
+    bench(lambda: UserInDB(**document))
+
+
+def test_user_public_from_user_in_db(bench):
+    user = UserInDB(**_document())
+    bench(to_user_public, user)
+
+
+def test_dump_user_model(bench):
+    user = UserInDB(**_document())
+    bench(dump_user, user)
+
+
+def test_dump_user_document(bench):
+    bench(dump_user, _public_document())
+
+
+def test_dump_users_page(bench):
+    page = [_public_document(n) for n in range(20)]
+    bench(dump_users, page)
+
+
+def test_standard_response(bench):
+    data = {"id": str(uuid.uuid4()), "email": "user@example.com"}
+    bench(lambda: StandardResponse.success(data=data, message="ok").model_dump())
@@ -0,0 +1,95 @@
+"""
+Бенчмарк: стоимость глубокой страницы при skip/limit и keyset-пагинации.
+
+Запуск (из директории backend, нужен MongoDB из settings.MONGO_URI):
+
+    python -m benchmarks.pagination --users 1000000 --page 10000 --limit 100
+
+Скрипт заполняет отдельную базу (--db) синтетическими пользователями, если их
+там меньше, чем нужно, создает индексы приложения и сравнивает время получения
+первой и глубокой страницы через CRUDUser.get_multiple (skip) и CRUDUser.get_page (cursor).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.crud.user import USERS_PAGE_SORT, CRUDUser, encode_users_cursor
+from app.db.session import USERS_COLLECTION, create_indexes
+
+
+async def _seed(db, total: int, batch: int = 10_000) -> None:
+    collection = db[USERS_COLLECTION]
+    existing = await collection.estimated_document_count()
+    started_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for offset in range(existing, total, batch):
+        docs = []
+        for n in range(offset, min(offset + batch, total)):
+            user_id = uuid.uuid4()
+            docs.append({
+                "id": user_id,
+                "email": f"bench_{user_id}@example.com",
+                "username": f"bench_{user_id}",
+                "full_name": "Bench User",
+                "hashed_password": "$2b$12$benchbenchbenchbenchbenchbenchbenchbenchbenchbenchbenc",
+                "roles": ["user"],
+                "status": "active",
+                "is_active": True,
+                "is_verified": False,
+                "created_at": started_at + timedelta(milliseconds=n),
+                "updated_at": None,
+            })
+        await collection.insert_many(docs, ordered=False)
+        print(f"seeded {min(offset + batch, total)}/{total}")
+
+
+async def _timed(factory, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await factory()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+async def main(args: argparse.Namespace) -> None:
+    client = AsyncIOMotorClient(settings.MONGO_URI, uuidRepresentation="standard")
+    db = client[args.db]
+    try:
+        await create_indexes(db)
+        await _seed(db, args.users)
+        crud = CRUDUser(db)
+
+        deep_skip = (args.page - 1) * args.limit
+        # Курсор глубокой страницы получаем вне замера: в реальном обходе он приходит с предыдущей страницей
+        anchor = await db[USERS_COLLECTION].find({}).sort(USERS_PAGE_SORT).skip(deep_skip - 1).limit(1).to_list(1)
+        deep_cursor = encode_users_cursor(anchor[0]["created_at"], anchor[0]["id"])
+
+        results = {
+            "skip page 1": await _timed(lambda: crud.get_multiple(skip=0, limit=args.limit), args.repeats),
+            f"skip page {args.page}": await _timed(lambda: crud.get_multiple(skip=deep_skip, limit=args.limit), args.repeats),
+            "cursor page 1": await _timed(lambda: crud.get_page(limit=args.limit), args.repeats),
+            f"cursor page {args.page}": await _timed(lambda: crud.get_page(limit=args.limit, cursor=deep_cursor), args.repeats),
+        }
+        for name, median_ms in results.items():
+            print(f"{name:<22} median={median_ms:9.2f} ms")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench_pagination")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    if args.page < 2:
+        parser.error("--page должен быть не меньше 2")
+    asyncio.run(main(args))
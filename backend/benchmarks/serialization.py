@@ -0,0 +1,87 @@
+"""
+Микробенчмарк: стоимость сериализации одного пользователя в ответ API.
+
+Запуск (из директории backend, MongoDB не нужен):
+
+    python -m benchmarks.serialization --users 100 --repeats 200
+
+"before" воспроизводит прежний путь эндпоинтов: UserInDB(**doc) -> model_dump() ->
+isoformat() -> UserPublic(**dict) -> повторная валидация по response_model ->
+jsonable_encoder -> json.dumps. "after" - текущий путь чтения: документ с
+проекцией UserPublic -> TypeAdapter(UserPublicDocument).dump_json, без валидации.
+"validated" - путь для моделей, которые еще не были в БД (регистрация, /me):
+UserPublic.model_validate -> TypeAdapter(UserPublic).dump_json.
+"""
+import argparse
+import json
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.api.v1.responses import users_json_response
+from app.crud.user import projection_for
+from app.models.user import UserInDB, UserPublic
+
+
+def _documents(count: int) -> list[dict]:
+    docs = []
+    for n in range(count):
+        user_id = uuid.uuid4()
+        docs.append({
+            "id": user_id,
+            "email": f"user_{n}@example.com",
+            "username": f"user_{n}",
+            "full_name": "Serialization Bench",
+            "hashed_password": "$2b$12$" + "x" * 53,
+            "roles": ["user"],
+            "status": "active",
+            "is_active": True,
+            "is_verified": False,
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": None,
+        })
+    return docs
+
+
+_response_model_adapter = TypeAdapter(list[UserPublic])
+
+
+def before(docs: list[dict]) -> bytes:
+    users = []
+    for doc in docs:
+        user_dict = UserInDB(**doc).model_dump()
+        user_dict["created_at"] = user_dict["created_at"].isoformat()
+        users.append(UserPublic(**user_dict))
+    # То, что FastAPI делает с возвращенным значением при заданном response_model
+    validated = _response_model_adapter.validate_python(users, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def after(projected_docs: list[dict]) -> bytes:
+    return users_json_response(projected_docs).body
+
+
+def validated(projected_docs: list[dict]) -> bytes:
+    return users_json_response([UserPublic.model_validate(doc) for doc in projected_docs]).body
+
+
+def main(args: argparse.Namespace) -> None:
+    docs = _documents(args.users)
+    projection = projection_for(UserPublic)
+    # Проекцию применяет MongoDB; здесь имитируем уже урезанные документы
+    projected = [{key: value for key, value in doc.items() if key in projection} for doc in docs]
+    assert before(docs) == after(projected) == validated(projected)
+
+    for name, func, data in (("before", before, docs), ("after", after, projected), ("validated", validated, projected)):
+        best = min(timeit.repeat(lambda: func(data), number=1, repeat=args.repeats))
+        print(f"{name:<10} {best / args.users * 1e6:8.2f} us/user  ({best * 1000:.3f} ms per {args.users} users)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=200)
+    main(parser.parse_args())
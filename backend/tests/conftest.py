@@ -15,65 +15,96 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 # Импортируем необходимые модули
 from app.models.user import UserCreate, UserRole
 from app.core.config import settings
-from app.db.session import db_client, connect_to_mongo, close_mongo_connection
+from app.db.session import db_client, connect_to_mongo, close_mongo_connection, register_event_listener
+from pymongo import monitoring
+from app.crud.revocation import token_revocations
 
 # Устанавливаем переменные окружения для тестов
 os.environ["JWT_SECRET_KEY"] = "test_secret_key_for_tests"
 os.environ["TESTING"] = "True"
 
-# Используем тестовую MongoDB для юнит-тестов
-TEST_MONGO_URI = "mongodb://localhost:27017/"
+# По умолчанию тесты работают с хранилищем в памяти; с реальным MongoDB:
+# TEST_STORAGE_BACKEND=mongo python -m pytest
+TEST_STORAGE_BACKEND = os.environ.get("TEST_STORAGE_BACKEND", "memory")
+TEST_MONGO_URI = os.environ.get("TEST_MONGO_URI", "mongodb://localhost:27017/")
 TEST_DB_NAME = "testdb"
 
+class CommandCounter(monitoring.CommandListener):
+    """Считает команды, отправленные приложением в тестовую базу данных."""
+
+    # Служебные команды драйвера не относятся к логике эндпоинтов
+    IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+
+    def __init__(self):
+        self.commands = []
+
+    def reset(self):
+        self.commands = []
+
+    @property
+    def names(self):
+        return [name for name, _ in self.commands]
+
+    def started(self, event):
+        if event.database_name == TEST_DB_NAME and event.command_name not in self.IGNORED_COMMANDS:
+            self.commands.append((event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+command_counter = CommandCounter()
+# Регистрируем до первого connect_to_mongo, чтобы слушатель попал в клиент приложения
+register_event_listener(command_counter)
+
 @pytest_asyncio.fixture
 async def db_client_fixture() -> AsyncGenerator:
     """
-    Создает клиент базы данных для тестов, используя локальный MongoDB.
-    При необходимости используйте Docker или testcontainers в реальных проектах.
+    Клиент базы данных для тестов: хранилище в памяти или локальный MongoDB (TEST_STORAGE_BACKEND=mongo).
+
+    Каждый тест получает пустую базу с согласованными индексами.
     """
     # Сохраняем оригинальные настройки
+    original_backend = settings.STORAGE_BACKEND
     original_mongo_uri = settings.MONGO_URI
     original_db_name = settings.MONGO_DB_NAME
-    
+
     # Устанавливаем тестовые настройки
+    settings.STORAGE_BACKEND = TEST_STORAGE_BACKEND
     settings.MONGO_URI = TEST_MONGO_URI
     settings.MONGO_DB_NAME = TEST_DB_NAME
-    
-    # Инициализируем глобальную переменную db_client для всего приложения
-    await connect_to_mongo()
-    
-    # Создаем клиент для тестов
-    client = AsyncIOMotorClient(
-        settings.MONGO_URI,
-        uuidRepresentation='standard',
-        serverSelectionTimeoutMS=5000  # Увеличиваем тайм-аут выбора сервера
-    )
-    
+
+    client = None
     try:
-        # Проверяем соединение
-        await client.admin.command('ping')
-        
-        # Очищаем тестовую базу данных перед каждым тестом
-        try:
-            await client.drop_database(TEST_DB_NAME)
-            
-            # Пересоздаем БД и пересоздаем индексы (после очистки)
-            await connect_to_mongo()
-        except Exception as e:
-            print(f"Ошибка при очистке базы данных: {e}")
-        
-        yield client
-    except Exception as e:
-        print(f"Ошибка подключения к MongoDB: {e}")
-        # Для юнит-тестов можно использовать моки вместо реальной БД
-        # если соединение не установлено
-        yield None
+        if TEST_STORAGE_BACKEND == "mongo":
+            client = AsyncIOMotorClient(
+                settings.MONGO_URI,
+                uuidRepresentation='standard',
+                serverSelectionTimeoutMS=5000  # Увеличиваем тайм-аут выбора сервера
+            )
+            try:
+                # Проверяем соединение и очищаем тестовую базу данных перед каждым тестом
+                await client.admin.command('ping')
+                await client.drop_database(TEST_DB_NAME)
+            except Exception as e:
+                print(f"Ошибка подключения к MongoDB: {e}")
+                # Тесты, которым нужна БД, пропускаются
+                yield None
+                return
+
+        # Приложение подключается один раз, к уже очищенной базе, и создает индексы
+        await connect_to_mongo()
+        yield client if client is not None else db_client.client
     finally:
         # Закрываем соединения
-        client.close()
+        if client is not None:
+            client.close()
         await close_mongo_connection()
-        
+
         # Восстанавливаем настройки
+        settings.STORAGE_BACKEND = original_backend
         settings.MONGO_URI = original_mongo_uri
         settings.MONGO_DB_NAME = original_db_name
 
@@ -215,4 +246,18 @@ async def admin_auth_headers(admin_user) -> dict:
 @pytest_asyncio.fixture
 async def auth_headers(test_user) -> dict:
     """Возвращает заголовки авторизации для тестового пользователя."""
-    return {"Authorization": f"Bearer {test_user['access_token']}"} 
\ No newline at end of file
+    return {"Authorization": f"Bearer {test_user['access_token']}"} 
+
+@pytest_asyncio.fixture
+async def db_commands(db) -> CommandCounter:
+    """Счетчик команд к тестовой БД, обнуленный перед использованием."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    # Фильтр отозванных токенов строится заранее: иначе каждая проверка токена идет в БД
+    await token_revocations.sync(db, force=True)
+    command_counter.reset()
+    await db["users"].find_one({})
+    if not command_counter.commands:
+        pytest.skip("Мониторинг команд MongoDB недоступен")
+    command_counter.reset()
+    return command_counter
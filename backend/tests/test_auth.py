@@ -94,4 +94,68 @@ async def test_get_current_user(app_client, test_user, auth_headers):
     assert response.status_code == 200
     user_data = response.json()
     assert user_data["id"] == test_user["id"]
-    assert user_data["email"] == test_user["email"] 
\ No newline at end of file
+    assert user_data["email"] == test_user["email"] 
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_password_hash(app_client, test_user, db):
+    """После смены стоимости bcrypt хеш пароля обновляется при входе, в фоне."""
+    from app.core.security import configure_password_hashing
+    from uuid import UUID
+
+    configure_password_hashing(5)
+    try:
+        login_response = await app_client.post(
+            "/api/v1/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        assert login_response.status_code == 200
+
+        # Фоновые задачи выполняются до завершения запроса в ASGITransport
+        user_doc = await db["users"].find_one({"id": UUID(test_user["id"])})
+        assert user_doc["hashed_password"].startswith("$2b$05$")
+
+        # Старый пароль по-прежнему подходит
+        relogin_response = await app_client.post(
+            "/api/v1/auth/login",
+            json={"email": test_user["email"], "password": test_user["password"]}
+        )
+        assert relogin_response.status_code == 200
+    finally:
+        configure_password_hashing(None)
+
+
+@pytest.mark.asyncio
+async def test_claims_only_mode_skips_user_lookup(app_client, db, monkeypatch):
+    """В режиме AUTH_CLAIMS_ONLY /users/me отвечает по полям токена, а fresh-зависимость идет в БД."""
+    from app.core.config import settings
+    from uuid import UUID
+
+    monkeypatch.setattr(settings, "AUTH_CLAIMS_ONLY", True)
+    test_email = f"claims_{uuid4()}@example.com"
+    test_password = "ClaimsPass123!"
+    reg_response = await app_client.post(
+        "/api/v1/auth/register",
+        json={"email": test_email, "username": f"claims_{uuid4()}", "full_name": "Claims User", "password": test_password}
+    )
+    assert reg_response.status_code == 201
+    user_id = reg_response.json()["id"]
+    login_response = await app_client.post(
+        "/api/v1/auth/login",
+        json={"email": test_email, "password": test_password}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    # Удаляем пользователя в обход API: токен по-прежнему описывает его полностью
+    await db["users"].delete_one({"id": UUID(user_id)})
+
+    me_response = await app_client.get("/api/v1/users/me", headers=headers)
+    assert me_response.status_code == 200
+    assert me_response.json()["email"] == test_email
+    assert me_response.json()["full_name"] == "Claims User"
+
+    update_response = await app_client.put(
+        f"/api/v1/users/{user_id}",
+        json={"full_name": "Другое Имя"},
+        headers=headers
+    )
+    assert update_response.status_code == 401
@@ -0,0 +1,52 @@
+import pytest
+import time
+
+from app.core.cache import TTLCache, principal_cache
+
+def test_ttl_cache_lru_eviction():
+    """При переполнении вытесняется самая давно использованная запись."""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самой свежей
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_cache_expiry(monkeypatch):
+    """Устаревшие записи не возвращаются и считаются промахом."""
+    cache = TTLCache(maxsize=10, ttl=5)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert len(cache) == 0
+
+@pytest.mark.asyncio
+async def test_principal_cache_hit_and_invalidation(app_client, test_user, auth_headers):
+    """Повторные запросы берут пользователя из кеша, обновление сбрасывает запись."""
+    first = await app_client.get("/api/v1/users/me", headers=auth_headers)
+    assert first.status_code == 200
+    hits_before = principal_cache.hits
+
+    second = await app_client.get("/api/v1/users/me", headers=auth_headers)
+    assert second.status_code == 200
+    assert principal_cache.hits == hits_before + 1
+
+    update_response = await app_client.put(
+        f"/api/v1/users/{test_user['id']}",
+        json={"full_name": "Новое Имя"},
+        headers=auth_headers
+    )
+    assert update_response.status_code == 200
+
+    me = await app_client.get("/api/v1/users/me", headers=auth_headers)
+    assert me.json()["full_name"] == "Новое Имя"
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+import uuid
+
+from app.core.cache import TTLCache
+from app.db.session import UserChangeStreamWatcher
+
+def test_change_event_invalidates_single_user():
+    """Событие с id пользователя сбрасывает только его запись."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    user_id, other_id = uuid.uuid4(), uuid.uuid4()
+    cache.set(user_id, "user")
+    cache.set(other_id, "other")
+    watcher = UserChangeStreamWatcher(db=None, caches=[cache])
+
+    watcher._handle_change({"operationType": "update", "fullDocument": {"id": user_id}})
+
+    assert cache.get(user_id) is None
+    assert cache.get(other_id) == "other"
+    assert watcher.full_flushes == 0
+
+def test_delete_without_pre_image_flushes_caches():
+    """Удаление без pre-image не позволяет определить пользователя, поэтому кеш сбрасывается целиком."""
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(uuid.uuid4(), "user")
+    watcher = UserChangeStreamWatcher(db=None, caches=[cache])
+
+    watcher._handle_change({"operationType": "delete", "documentKey": {"_id": "x"}})
+
+    assert len(cache) == 0
+    assert watcher.full_flushes == 1
+
+@pytest.mark.asyncio
+async def test_change_stream_invalidates_cache_from_other_writer(db):
+    """
+    Изменение, сделанное в обход этого процесса, сбрасывает запись в локальном кеше.
+
+    Требует MongoDB в режиме replica set, например:
+    docker run -d -p 27017:27017 mongo --replSet rs0 && mongosh --eval "rs.initiate()"
+    """
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    try:
+        hello = await db.client.admin.command("hello")
+    except Exception:
+        pytest.skip("Не удалось определить топологию MongoDB")
+    if "setName" not in hello:
+        pytest.skip("Change streams требуют replica set")
+
+    cache = TTLCache(maxsize=10, ttl=60)
+    user_id = uuid.uuid4()
+    await db["users"].insert_one({"id": user_id, "email": f"cs_{user_id}@example.com", "username": f"cs_{user_id}"})
+    cache.set(user_id, "cached principal")
+
+    watcher = UserChangeStreamWatcher(db, [cache])
+    watcher.start()
+    try:
+        await watcher.wait_ready()
+        await db["users"].update_one({"id": user_id}, {"$set": {"full_name": "Changed"}})
+        for _ in range(50):
+            if cache.get(user_id) is None:
+                break
+            await asyncio.sleep(0.1)
+        assert cache.get(user_id) is None
+        assert watcher.resume_token is not None
+    finally:
+        await watcher.stop()
@@ -0,0 +1,48 @@
+import pytest
+from types import SimpleNamespace
+
+from app.db.monitoring import PoolStatsListener
+
+ADDRESS = ("localhost", 27017)
+
+def _event(**fields):
+    return SimpleNamespace(address=ADDRESS, **fields)
+
+def test_pool_listener_tracks_checkouts_and_waits():
+    """Листенер считает соединения, ожидающие запросы, ошибки и время ожидания."""
+    listener = PoolStatsListener()
+    listener.pool_created(_event(options={"maxPoolSize": 5, "minPoolSize": 1}))
+    listener.connection_created(_event(connection_id=1))
+    listener.connection_check_out_started(_event())
+    listener.connection_check_out_started(_event())
+
+    stats = listener.snapshot()["localhost:27017"]
+    assert stats["waiting"] == 2 and stats["max_pool_size"] == 5
+
+    listener.connection_checked_out(_event(connection_id=1, duration=0.004))
+    listener.connection_check_out_failed(_event(reason="timeout", duration=0.5))
+
+    stats = listener.snapshot()["localhost:27017"]
+    assert stats["waiting"] == 0
+    assert stats["in_use"] == 1
+    assert stats["open_connections"] == 1
+    assert stats["checkout_failures"] == {"timeout": 1}
+    assert stats["checkout_wait_ms"]["count"] == 1
+    assert stats["checkout_wait_ms"]["max"] == pytest.approx(4.0)
+
+    listener.connection_checked_in(_event(connection_id=1))
+    listener.connection_closed(_event(connection_id=1, reason="idle"))
+    stats = listener.snapshot()["localhost:27017"]
+    assert stats["in_use"] == 0 and stats["open_connections"] == 0
+
+@pytest.mark.asyncio
+async def test_db_pool_endpoint_is_admin_only(app_client, auth_headers, admin_auth_headers):
+    """Статистика пула доступна администратору и закрыта для обычных пользователей."""
+    response = await app_client.get("/api/v1/internal/db-pool", headers=auth_headers)
+    assert response.status_code == 403
+
+    response = await app_client.get("/api/v1/internal/db-pool", headers=admin_auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["options"]["maxPoolSize"] > 0
+    assert "pools" in data
@@ -0,0 +1,98 @@
+import pytest
+from pymongo import ASCENDING, IndexModel
+
+from app.db.indexes import INDEX_SPECS, _drop_index, plan_collection, reconcile_indexes
+from app.db.session import REFRESH_TOKENS_COLLECTION, USERS_COLLECTION, create_indexes
+
+SPECS = [
+    IndexModel([("email", ASCENDING)], unique=True),
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+]
+
+def test_plan_detects_missing_changed_and_extra_indexes():
+    """План перечисляет недостающие, измененные и необъявленные индексы."""
+    existing = [
+        {"name": "_id_", "key": {"_id": 1}},
+        {"name": "email_1", "key": {"email": 1}},
+        {"name": "expires_at_1", "key": {"expires_at": 1}},
+        {"name": "user_id_1", "key": {"user_id": 1}},
+    ]
+    plan = plan_collection("users", SPECS, existing)
+
+    assert plan.create == ["created_at_1_id_1"]
+    assert plan.modify_ttl == ["expires_at_1"]
+    assert plan.recreate == ["email_1"]
+    assert plan.extra == ["user_id_1"]
+    assert not plan.in_sync
+
+def test_plan_in_sync():
+    existing = [{"name": "_id_", "key": {"_id": 1}}] + [dict(spec.document) for spec in SPECS]
+    plan = plan_collection("users", SPECS, existing)
+    assert plan.in_sync and not plan.extra
+
+@pytest.mark.asyncio
+async def test_reconcile_is_idempotent_and_converts_ttl(db):
+    """Обычный индекс по expires_at становится TTL; повторное согласование ничего не меняет."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    collection = db[REFRESH_TOKENS_COLLECTION]
+    await collection.drop_indexes()
+    await collection.create_index("expires_at")
+
+    plans = await reconcile_indexes(db)
+    refresh_plan = next(plan for plan in plans if plan.collection == REFRESH_TOKENS_COLLECTION)
+    assert refresh_plan.modify_ttl == ["expires_at_1"]
+
+    indexes = await collection.index_information()
+    assert indexes["expires_at_1"].get("expireAfterSeconds") == 0
+    assert {spec.document["name"] for spec in INDEX_SPECS[REFRESH_TOKENS_COLLECTION]} <= set(indexes)
+
+    plans = await reconcile_indexes(db, dry_run=True)
+    assert all(plan.in_sync for plan in plans)
+
+@pytest.mark.asyncio
+async def test_startup_only_creates_missing_indexes(db):
+    """При запуске воркера измененный уникальный индекс не удаляется, недостающие создаются."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    users = db[USERS_COLLECTION]
+    await users.drop_indexes()
+    await users.create_index("email")  # Не уникальный - пересоздаст только python -m app.db.indexes
+
+    await create_indexes(db)
+
+    indexes = await users.index_information()
+    assert not indexes["email_1"].get("unique")
+    assert {"username_1", "id_1", "created_at_1_id_1"} <= set(indexes)
+    plans = await reconcile_indexes(db, dry_run=True)
+    assert next(plan for plan in plans if plan.collection == USERS_COLLECTION).recreate == ["email_1"]
+
+@pytest.mark.asyncio
+async def test_startup_converts_ttl_with_collmod(db):
+    """При запуске воркера обычный индекс по expires_at становится TTL без удаления."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    collection = db[REFRESH_TOKENS_COLLECTION]
+    await collection.drop_indexes()
+    await collection.create_index("expires_at")
+
+    plans = await reconcile_indexes(db, create_only=True)
+    refresh_plan = next(plan for plan in plans if plan.collection == REFRESH_TOKENS_COLLECTION)
+    if refresh_plan.recreate == ["expires_at_1"]:
+        # Сервер без collMod для TTL: индекс не удален и оставлен команде python -m app.db.indexes
+        assert "expires_at_1" in await collection.index_information()
+        pytest.skip("Сервер не переводит индекс в TTL через collMod")
+    assert refresh_plan.modify_ttl == ["expires_at_1"]
+
+    indexes = await collection.index_information()
+    assert indexes["expires_at_1"].get("expireAfterSeconds") == 0
+    plans = await reconcile_indexes(db, dry_run=True)
+    assert next(plan for plan in plans if plan.collection == REFRESH_TOKENS_COLLECTION).in_sync
+
+@pytest.mark.asyncio
+async def test_drop_of_already_dropped_index_is_ignored(db):
+    """Индекс, уже удаленный параллельным согласованием, не прерывает запуск."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    await _drop_index(db[REFRESH_TOKENS_COLLECTION], "missing_1")
@@ -0,0 +1,93 @@
+import base64
+import json
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.security import HMACSHA256Codec, JWT_CODECS, JWTCodec, JoseCodec, build_codec, pyjwt
+
+KEYS = {None: "legacy-secret", "2024-01": "old-secret", "2024-06": "new-secret"}
+
+BACKENDS = [
+    pytest.param(name, marks=pytest.mark.skipif(name == "pyjwt" and pyjwt is None, reason="PyJWT не установлен"))
+    for name in JWT_CODECS
+]
+
+def _claims(**extra) -> dict:
+    return {"sub": "3f0c1b9e-2f43-4e0e-9d1e-0c6a7d4d2b11", "roles": ["user"], "exp": int(time.time()) + 60, **extra}
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_codec_round_trip_and_interop(backend):
+    """Токен любого кодека читается им самим и python-jose, и наоборот."""
+    codec = JWT_CODECS[backend](KEYS, "2024-06", "HS256")
+    reference = JoseCodec(KEYS, "2024-06", "HS256")
+    claims = _claims(jti="abc")
+
+    assert codec.decode(codec.encode(claims)) == claims
+    assert reference.decode(codec.encode(claims)) == claims
+    assert codec.decode(reference.encode(claims)) == claims
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_codec_rejects_invalid_tokens(backend):
+    """Истекшие, подделанные и подписанные неизвестным ключом токены отклоняются."""
+    codec = JWT_CODECS[backend](KEYS, "2024-06", "HS256")
+
+    assert codec.decode(codec.encode(_claims(exp=int(time.time()) - 1))) is None
+
+    header, payload, signature = codec.encode(_claims()).split(".")
+    forged = base64.urlsafe_b64encode(json.dumps(_claims(roles=["admin"])).encode()).rstrip(b"=").decode()
+    assert codec.decode(f"{header}.{forged}.{signature}") is None
+
+    foreign = JWT_CODECS[backend]({"other": "other-secret"}, "other", "HS256").encode(_claims())
+    assert codec.decode(foreign) is None
+    assert codec.decode("not-a-token") is None
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_codec_key_rotation(backend):
+    """После смены активного ключа токены прежних ключей действуют, пока ключ есть в наборе."""
+    old = JWT_CODECS[backend](KEYS, "2024-01", "HS256")
+    legacy = JWT_CODECS[backend](KEYS, None, "HS256")
+    rotated = JWT_CODECS[backend](KEYS, "2024-06", "HS256")
+
+    assert rotated.decode(old.encode(_claims())) is not None
+    assert rotated.decode(legacy.encode(_claims())) is not None
+
+    retired = JWT_CODECS[backend]({None: "legacy-secret", "2024-06": "new-secret"}, "2024-06", "HS256")
+    assert retired.decode(old.encode(_claims())) is None
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_legacy_key_rejected_once_kid_is_active(backend, monkeypatch):
+    """Токен без kid (JWT_SECRET_KEY) перестает приниматься, когда задан JWT_ACTIVE_KID."""
+    monkeypatch.setattr(settings, "JWT_SECRET_KEY", "legacy-secret")
+    monkeypatch.setattr(settings, "JWT_KEYS", {"2024-06": "new-secret"})
+    monkeypatch.setattr(settings, "JWT_ACTIVE_KID", None)
+    legacy_token = build_codec(backend).encode(_claims())
+
+    monkeypatch.setattr(settings, "JWT_ACTIVE_KID", "2024-06")
+    rotated = build_codec(backend)
+    assert rotated.decode(legacy_token) is None
+    assert rotated.decode(rotated.encode(_claims())) is not None
+
+    monkeypatch.setattr(settings, "JWT_ACCEPT_LEGACY_KEY", True)
+    assert build_codec(backend).decode(legacy_token) is not None
+
+def test_codec_requires_known_active_kid():
+    with pytest.raises(ValueError):
+        JoseCodec(KEYS, "missing", "HS256")
+
+def test_codec_must_implement_encode_and_decode():
+    """Кодек без decode не создается: ошибка видна при запуске, а не на первом токене."""
+    class EncodeOnlyCodec(JWTCodec):
+        def encode(self, claims):
+            return ""
+
+    with pytest.raises(TypeError):
+        EncodeOnlyCodec(KEYS, None, "HS256")
+
+def test_hmac_codec_rejects_alg_none():
+    """Токен с alg=none не принимается, даже без подписи."""
+    codec = HMACSHA256Codec(KEYS, None)
+    header = base64.urlsafe_b64encode(b'{"alg":"none","typ":"JWT"}').rstrip(b"=").decode()
+    payload = base64.urlsafe_b64encode(json.dumps(_claims()).encode()).rstrip(b"=").decode()
+    assert codec.decode(f"{header}.{payload}.") is None
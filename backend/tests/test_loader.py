@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import uuid
+
+from app.crud.loader import BatchLoader
+from app.crud.user import CRUDUser
+from app.models.user import UserPublic
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.mark.asyncio
+async def test_loads_in_same_tick_are_batched():
+    """Параллельные load() одного такта уходят одним вызовом, повторные ключи не дублируются."""
+    calls = []
+
+    async def batch_fn(keys):
+        calls.append(list(keys))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = BatchLoader(batch_fn)
+    results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(3))
+
+    assert results == [10, 20, 10, None]
+    assert calls == [[1, 2, 3]]
+    assert loader.batches == 1
+
+    # Уже загруженные ключи берутся из памяти загрузчика
+    assert await loader.load(2) == 20
+    assert loader.batches == 1
+
+@pytest.mark.asyncio
+async def test_batch_error_propagates_to_all_waiters():
+    """Ошибка пакетного запроса получают все ожидающие."""
+    async def batch_fn(keys):
+        raise RuntimeError("db down")
+
+    loader = BatchLoader(batch_fn)
+    results = await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+@pytest.mark.asyncio
+async def test_failed_keys_are_retried():
+    """Ключи неудачной пачки не запоминаются: следующий load() повторяет запрос."""
+    calls = []
+
+    async def batch_fn(keys):
+        calls.append(list(keys))
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+        return {key: key.upper() for key in keys}
+
+    loader = BatchLoader(batch_fn)
+    with pytest.raises(RuntimeError):
+        await loader.load("a")
+    assert await loader.load("a") == "A"
+    assert calls == [["a"], ["a"]]
+
+@pytest.mark.asyncio
+async def test_cancelled_batch_cancels_waiters():
+    """Отмена задачи пачки отменяет ожидающих вместо того, чтобы оставить их висеть."""
+    started = asyncio.Event()
+
+    async def batch_fn(keys):
+        started.set()
+        await asyncio.Event().wait()
+
+    loader = BatchLoader(batch_fn)
+    waiter = asyncio.ensure_future(loader.load(1))
+    await started.wait()
+    for task in list(loader._tasks):
+        task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(waiter, timeout=1)
+    assert not loader._futures
+    assert not loader._tasks
+
+@pytest.mark.asyncio
+async def test_get_many_by_ids(db, test_user, admin_user):
+    """get_many_by_ids возвращает найденных пользователей по id одним запросом."""
+    ids = [uuid.UUID(test_user["id"]), uuid.UUID(admin_user["id"]), uuid.uuid4()]
+    users = await CRUDUser(db).get_many_by_ids(ids, model=UserPublic)
+
+    assert set(users) == set(ids[:2])
+    assert users[ids[0]].email == test_user["email"]
+
+    loader = CRUDUser(db).loader(UserPublic)
+    loaded = await loader.load_many(ids)
+    assert [user.email if user else None for user in loaded] == [test_user["email"], admin_user["email"], None]
+    assert loader.batches == 1
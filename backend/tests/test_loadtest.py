@@ -0,0 +1,61 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.loadtest.__main__ import _client
+from benchmarks.loadtest.report import build_results, compare, percentile
+from benchmarks.loadtest.runner import Recorder, prepare_sessions, run_load
+from benchmarks.loadtest.scenarios import parse_mix
+
+def test_parse_mix():
+    """Веса по умолчанию равны 1, нулевые веса отбрасываются, неизвестные сценарии - ошибка."""
+    assert parse_mix("journey=1,browse=6,refresh") == [("journey", 1.0), ("browse", 6.0), ("refresh", 1.0)]
+    assert parse_mix("browse=2,login=0") == [("browse", 2.0)]
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+    with pytest.raises(ValueError):
+        parse_mix("login=0")
+
+def test_percentile_nearest_rank():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile(samples, 100) == 100.0
+    assert percentile([], 50) == 0.0
+
+@pytest.mark.asyncio
+async def test_loadtest_smoke(app_client):
+    """Короткий прогон всех сценариев через приложение в процессе проходит без ошибок."""
+    recorder = Recorder()
+    sessions = await prepare_sessions(app_client, recorder, clients=3, users=2, concurrency=3)
+    mix = parse_mix("journey=1,browse=1,refresh=1,login=1")
+    elapsed = await run_load(sessions, mix, duration=None, iterations=4, seed=1)
+
+    results = build_results(recorder, elapsed, meta={})
+    assert results["errors"] == 0, results["endpoints"]
+    assert sum(row["count"] for row in results["scenarios"].values()) == 12
+    assert not any(name.startswith("setup ") for name in results["endpoints"])
+    assert {"p50_ms", "p95_ms", "p99_ms", "rps"} <= set(results["endpoints"]["GET /users/me"])
+    assert "GET /users/me" in compare(results, results)
+
+def test_drop_db_requires_separate_database():
+    """--drop-db без --db-name отклоняется: база приложения не удаляется по ошибке в командной строке."""
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.loadtest", "--iterations", "1", "--drop-db"],
+        cwd=Path(__file__).resolve().parents[1], capture_output=True, text=True,
+    )
+    assert result.returncode == 2
+    assert "--drop-db" in result.stderr
+
+@pytest.mark.asyncio
+async def test_drop_db_refuses_configured_database():
+    from app.core.config import settings
+
+    for db_name in (None, settings.MONGO_DB_NAME):
+        args = argparse.Namespace(clients=1, timeout=1.0, base_url=None, db_name=db_name, drop_db=True)
+        with pytest.raises(ValueError):
+            async with _client(args):
+                pass
@@ -0,0 +1,172 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import ASCENDING, IndexModel, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from app.crud.user import duplicate_key_field
+from app.db.indexes import INDEX_SPECS, reconcile_indexes
+from app.db.memory import MemoryClient
+from app.db.session import USERS_COLLECTION
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture
+def memory_db():
+    return MemoryClient()["memory_test"]
+
+async def test_unique_index_rejects_duplicates(memory_db):
+    """Нарушение уникального индекса - DuplicateKeyError с keyPattern, как у сервера."""
+    await reconcile_indexes(memory_db)
+    users = memory_db[USERS_COLLECTION]
+    await users.insert_one({"id": uuid.uuid4(), "email": "a@example.com", "username": "a"})
+
+    with pytest.raises(DuplicateKeyError) as error:
+        await users.insert_one({"id": uuid.uuid4(), "email": "a@example.com", "username": "b"})
+    assert duplicate_key_field(error.value.details) == "email"
+    assert await users.count_documents({}) == 1
+
+async def test_sparse_unique_index_skips_missing_fields(memory_db):
+    """Sparse-индекс не учитывает документы без поля, но null - это значение."""
+    collection = memory_db["sparse"]
+    await collection.create_indexes([IndexModel([("username", ASCENDING)], unique=True, sparse=True)])
+    await collection.insert_one({"email": "a@example.com"})
+    await collection.insert_one({"email": "b@example.com"})
+    await collection.insert_one({"email": "c@example.com", "username": None})
+    with pytest.raises(DuplicateKeyError):
+        await collection.insert_one({"email": "d@example.com", "username": None})
+
+async def test_unordered_insert_many_reports_failed_rows(memory_db):
+    """Неупорядоченная вставка пропускает конфликтующие строки и сообщает их индексы."""
+    await reconcile_indexes(memory_db)
+    users = memory_db[USERS_COLLECTION]
+    documents = [
+        {"id": uuid.uuid4(), "email": "a@example.com", "username": "a"},
+        {"id": uuid.uuid4(), "email": "a@example.com", "username": "b"},
+        {"id": uuid.uuid4(), "email": "c@example.com", "username": "a"},
+        {"id": uuid.uuid4(), "email": "d@example.com", "username": "d"},
+    ]
+    with pytest.raises(BulkWriteError) as error:
+        await users.insert_many(documents, ordered=False)
+
+    failed = {item["index"]: duplicate_key_field(item) for item in error.value.details["writeErrors"]}
+    assert failed == {1: "email", 2: "username"}
+    assert error.value.details["nInserted"] == 2
+    assert await users.count_documents({}) == 2
+
+async def test_update_keeps_unique_index_consistent(memory_db):
+    """Обновление, нарушающее уникальность, отклоняется; освобожденное значение можно занять."""
+    await reconcile_indexes(memory_db)
+    users = memory_db[USERS_COLLECTION]
+    first, second = uuid.uuid4(), uuid.uuid4()
+    await users.insert_one({"id": first, "email": "a@example.com", "username": "a"})
+    await users.insert_one({"id": second, "email": "b@example.com", "username": "b"})
+
+    with pytest.raises(DuplicateKeyError):
+        await users.update_one({"id": second}, {"$set": {"email": "a@example.com"}})
+
+    await users.update_one({"id": first}, {"$set": {"email": "new@example.com"}})
+    result = await users.update_one({"id": second}, {"$set": {"email": "a@example.com"}})
+    assert result.matched_count == 1 and result.modified_count == 1
+    assert (await users.find_one({"email": "a@example.com"}))["id"] == second
+
+async def test_documents_round_trip_like_bson(memory_db):
+    """Документы возвращаются так, как их вернул бы драйвер, и не разделяют состояние с хранилищем."""
+    collection = memory_db["docs"]
+    created_at = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    await collection.insert_one({"id": 1, "created_at": created_at, "tags": ("a", "b")})
+
+    document = await collection.find_one({"created_at": {"$gte": created_at - timedelta(seconds=1)}}, {"_id": 0})
+    assert document == {"id": 1, "created_at": datetime(2024, 5, 1, 12, 0, 0, 123000), "tags": ["a", "b"]}
+
+    document["tags"].append("c")
+    assert (await collection.find_one({"id": 1}))["tags"] == ["a", "b"]
+
+async def test_find_sort_skip_limit_and_operators(memory_db):
+    collection = memory_db["items"]
+    await collection.insert_many([{"n": n, "group": n % 3, "tags": ["even" if n % 2 == 0 else "odd"]} for n in range(10)])
+
+    cursor = collection.find({"group": {"$in": [0, 1]}}, {"_id": 0, "n": 1}).sort([("group", -1), ("n", 1)]).skip(1).limit(3)
+    assert [document["n"] async for document in cursor] == [4, 7, 0]
+    assert await collection.count_documents({"$or": [{"n": {"$lt": 2}}, {"n": {"$gte": 8}}]}) == 4
+    assert await collection.count_documents({"tags": "even", "n": {"$ne": 0}}) == 4
+    assert await collection.count_documents({"missing": {"$exists": False}}) == 10
+
+async def test_unsupported_operators_fail_like_server(memory_db):
+    """Неподдерживаемый оператор - OperationFailure BadValue, как неизвестный оператор на сервере."""
+    collection = memory_db["items"]
+    await collection.insert_one({"n": 1, "tags": []})
+
+    for call in (
+        lambda: collection.count_documents({"n": {"$mod": [2, 1]}}),
+        lambda: collection.count_documents({"$where": "this.n > 0"}),
+        lambda: collection.update_one({"n": 1}, {"$push": {"tags": "x"}}),
+    ):
+        with pytest.raises(OperationFailure) as error:
+            await call()
+        assert error.value.code == 2
+
+async def test_find_one_and_update_is_atomic_swap(memory_db):
+    """findAndModify с условием срабатывает один раз: повторный обмен не находит документ."""
+    collection = memory_db["tokens"]
+    await collection.insert_one({"token": "t", "is_revoked": False})
+
+    update = {"$set": {"is_revoked": True}, "$inc": {"uses": 1}}
+    before = await collection.find_one_and_update({"token": "t", "is_revoked": False}, update, projection={"_id": 0})
+    assert before == {"token": "t", "is_revoked": False}
+    assert await collection.find_one_and_update({"token": "t", "is_revoked": False}, update) is None
+
+    after = await collection.find_one_and_update(
+        {"token": "t"}, {"$inc": {"uses": 1}}, projection={"_id": 0, "uses": 1}, return_document=ReturnDocument.AFTER
+    )
+    assert after == {"uses": 2}
+
+async def test_index_reconciliation_and_unsupported_features(memory_db):
+    """Индексы согласуются как на сервере; change streams недоступны, как без replica set."""
+    await memory_db[USERS_COLLECTION].create_index("email")  # Не уникальный - будет пересоздан
+    await reconcile_indexes(memory_db)
+    indexes = await memory_db[USERS_COLLECTION].index_information()
+    assert indexes["email_1"]["unique"] is True
+    assert all(plan.in_sync for plan in await reconcile_indexes(memory_db, dry_run=True))
+    assert {spec.document["name"] for spec in INDEX_SPECS[USERS_COLLECTION]} <= set(indexes)
+
+    with pytest.raises(OperationFailure) as error:
+        memory_db[USERS_COLLECTION].watch([])
+    assert error.value.code == 40573
+
+class RecordingListener(monitoring.CommandListener):
+    def __init__(self):
+        self.events = []
+
+    def started(self, event):
+        self.events.append(("started", event.command_name, event.command.get(event.command_name)))
+
+    def succeeded(self, event):
+        self.events.append(("succeeded", event.command_name, event.reply.get("writeErrors", [{}])[0].get("code")))
+
+    def failed(self, event):
+        self.events.append(("failed", event.command_name, event.failure.get("code")))
+
+async def test_operations_publish_command_events():
+    """Операции публикуются как команды драйвера; дубликат при вставке - writeErrors в успешном ответе."""
+    listener = RecordingListener()
+    db = MemoryClient(event_listeners=[listener])["memory_test"]
+    users = db[USERS_COLLECTION]
+    await users.create_index("email", unique=True)
+    await users.insert_one({"email": "a@example.com"})
+    with pytest.raises(DuplicateKeyError):
+        await users.insert_one({"email": "a@example.com"})
+    assert [document async for document in users.find({})]
+    await users.find_one_and_update({"email": "a@example.com"}, {"$set": {"n": 1}})
+    with pytest.raises(OperationFailure):
+        await users.drop_index("missing_1")
+
+    assert listener.events == [
+        ("started", "createIndexes", USERS_COLLECTION), ("succeeded", "createIndexes", None),
+        ("started", "insert", USERS_COLLECTION), ("succeeded", "insert", None),
+        ("started", "insert", USERS_COLLECTION), ("succeeded", "insert", 11000),
+        ("started", "find", USERS_COLLECTION), ("succeeded", "find", None),
+        ("started", "findAndModify", USERS_COLLECTION), ("succeeded", "findAndModify", None),
+        ("started", "dropIndexes", USERS_COLLECTION), ("failed", "dropIndexes", 27),
+    ]
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from app.core.metrics import Counter, Histogram, MetricsRegistry
+
+def test_histogram_buckets_are_cumulative():
+    """Бакеты гистограммы накопительные, граница le включается в бакет."""
+    histogram = Histogram("latency_seconds", "Задержка", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, ("/a",))
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/a"} 4' in lines
+    assert 'latency_seconds_sum{route="/a"} 2.65' in lines
+
+def test_counter_merges_thread_shards():
+    """Значения, накопленные в разных потоках, суммируются при выгрузке."""
+    counter = Counter("events_total", "События", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.inc(("x",))
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc(("y",), 2)
+
+    assert counter.values() == {("x",): 4000, ("y",): 2}
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Запросы", ("path",)).inc(('/q"uote',))
+    registry.callback("queue_size", "Размер очереди", lambda: [((), 3)])
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{path="/q\\"uote"} 1' in text
+    assert "# TYPE queue_size gauge\nqueue_size 3" in text
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_route_templates(app_client, test_user, auth_headers):
+    """/metrics содержит запросы по шаблонам маршрутов, а не по сырым путям."""
+    response = await app_client.get(f"/api/v1/users/{test_user['id']}", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = await app_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/users/{user_id}"}' in text
+    assert test_user["id"] not in text
+    assert "principal_cache_hits_total" in text
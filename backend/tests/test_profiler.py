@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+
+from app.core.profiler import ProfilerBusy, SamplingProfiler
+
+def _busy_wait(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_profiler_samples_target_thread():
+    """Профиль содержит функции, выполнявшиеся в целевом потоке."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_wait, args=(stop,))
+    worker.start()
+    try:
+        profile = SamplingProfiler().profile(worker.ident, duration=0.2, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profile.samples > 5
+    assert "_busy_wait" in profile.to_collapsed()
+
+    speedscope = profile.to_speedscope()
+    frames = speedscope["shared"]["frames"]
+    assert any(frame["name"] == "_busy_wait" for frame in frames)
+    assert len(speedscope["profiles"][0]["samples"]) == len(speedscope["profiles"][0]["weights"])
+
+def test_profiler_runs_one_session_at_a_time():
+    profiler = SamplingProfiler()
+    started = threading.Event()
+    session = threading.Thread(target=lambda: (started.set(), profiler.profile(threading.main_thread().ident, 0.3, 0.01)))
+    session.start()
+    started.wait()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(ProfilerBusy):
+            profiler.profile(threading.main_thread().ident, 0.01, 0.01)
+    finally:
+        session.join()
+    assert not profiler.busy
+
+@pytest.mark.asyncio
+async def test_profile_endpoint(app_client, auth_headers, admin_auth_headers):
+    """Профилирование доступно только администраторам и возвращает профиль speedscope."""
+    response = await app_client.post("/api/v1/internal/profile?seconds=0.2", headers=auth_headers)
+    assert response.status_code == 403
+
+    response = await app_client.post("/api/v1/internal/profile?seconds=0.2&interval_ms=5", headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    assert response.json()["profiles"][0]["type"] == "sampled"
+
+    response = await app_client.post(
+        "/api/v1/internal/profile?seconds=0.1&format=collapsed", headers=admin_auth_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
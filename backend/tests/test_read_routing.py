@@ -0,0 +1,101 @@
+import uuid
+
+import pytest
+from pydantic import ValidationError
+from pymongo import MongoClient, ReadPreference, monitoring
+
+from app.core.config import Settings, settings
+from app.crud.token import CRUDRefreshToken, CRUDTokenBlacklist
+from app.crud.user import CRUDUser
+from app.db.session import public_read_preference, register_event_listener
+
+class FindAddressRecorder(monitoring.CommandListener):
+    """Запоминает, на какой сервер ушла каждая команда find."""
+
+    def __init__(self):
+        self.finds = []
+
+    def started(self, event):
+        if event.command_name == "find":
+            host, port = event.connection_id
+            self.finds.append((event.command.get("filter"), f"{host}:{port}"))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+find_addresses = FindAddressRecorder()
+# Регистрируется при импорте модуля, до подключения приложения в фикстурах
+register_event_listener(find_addresses)
+
+@pytest.fixture
+def unconnected_db():
+    # Клиент без подключения: read preference коллекций проверяется без сервера
+    client = MongoClient("mongodb://localhost:27017/?readPreference=secondary", connect=False)
+    yield client["routing"]
+    client.close()
+
+def test_public_read_preference_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS", 120)
+    assert public_read_preference().document == {"mode": "secondaryPreferred", "maxStalenessSeconds": 120}
+
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS", None)
+    assert public_read_preference().document == {"mode": "secondaryPreferred"}
+
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_PREFERENCE", "primary")
+    assert public_read_preference() == ReadPreference.PRIMARY
+
+def test_max_staleness_below_driver_minimum_is_rejected():
+    """maxStalenessSeconds меньше 90 отклоняется при загрузке настроек, а не на первом чтении."""
+    with pytest.raises(ValidationError):
+        Settings(MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS=30)
+    assert Settings(MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS=None).MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS is None
+
+def test_auth_reads_use_primary_and_public_reads_are_routed(unconnected_db, monkeypatch):
+    """Аутентификация читает с primary даже при readPreference в URI; публичные чтения - по настройкам."""
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_MAX_STALENESS_SECONDS", 90)
+
+    user_crud = CRUDUser(unconnected_db)
+    assert user_crud.collection.read_preference == ReadPreference.PRIMARY
+    assert user_crud.public_collection.read_preference.document == {
+        "mode": "secondaryPreferred", "maxStalenessSeconds": 90,
+    }
+    assert CRUDRefreshToken(unconnected_db).collection.read_preference == ReadPreference.PRIMARY
+    assert CRUDTokenBlacklist(unconnected_db).collection.read_preference == ReadPreference.PRIMARY
+
+@pytest.mark.asyncio
+async def test_public_reads_go_to_secondary_on_replica_set(db, monkeypatch):
+    """
+    На replica set с secondary публичные чтения уходят на реплику, вход - на primary.
+
+    Требует MongoDB в режиме replica set хотя бы из двух членов (TEST_STORAGE_BACKEND=mongo), например:
+    docker run -d --name rs0 -p 27017:27017 mongo --replSet rs0
+    docker run -d --name rs1 -p 27018:27018 mongo --replSet rs0 --port 27018
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}]})'
+    """
+    if db is None or settings.STORAGE_BACKEND != "mongo":
+        pytest.skip("MongoDB недоступна для тестирования")
+    try:
+        hello = await db.client.admin.command("hello")
+    except Exception:
+        pytest.skip("Не удалось определить топологию MongoDB")
+    if "setName" not in hello or not hello.get("primary") or len(hello.get("hosts", [])) < 2:
+        pytest.skip("Маршрутизация чтений требует replica set с secondary")
+
+    monkeypatch.setattr(settings, "MONGO_PUBLIC_READ_PREFERENCE", "secondaryPreferred")
+    user_crud = CRUDUser(db)
+    email = f"routing_{uuid.uuid4()}@example.com"
+    user_id = uuid.uuid4()
+    await db["users"].insert_one({"id": user_id, "email": email, "username": email})
+
+    find_addresses.finds.clear()
+    await user_crud.get_by_id(user_id, validate=False, public=True)
+    await user_crud.get_by_email(email)
+
+    addresses = {str(query): address for query, address in find_addresses.finds}
+    assert addresses[str({"id": user_id})] != hello["primary"]
+    assert addresses[str({"email": email})] == hello["primary"]
@@ -0,0 +1,117 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+from app.core.config import settings
+from app.db.session import REFRESH_TOKENS_COLLECTION
+
+pytestmark = pytest.mark.asyncio
+
+async def _refresh(app_client, refresh_token: str):
+    return await app_client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+
+async def _login(app_client, user: dict) -> dict:
+    response = await app_client.post(
+        "/api/v1/auth/login",
+        json={"email": user["email"], "password": user["password"]}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_token(app_client, test_user):
+    """Обновление выдает новый refresh токен, старый больше не принимается."""
+    response = await _refresh(app_client, test_user["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()["refresh_token"]
+    assert rotated and rotated != test_user["refresh_token"]
+
+    # Новый токен работает
+    response = await _refresh(app_client, rotated)
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_refresh_reuse_revokes_family(app_client, test_user):
+    """Повторное предъявление использованного токена отзывает всю сессию."""
+    response = await _refresh(app_client, test_user["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()["refresh_token"]
+
+    # Старый токен предъявлен повторно - похоже на утечку
+    response = await _refresh(app_client, test_user["refresh_token"])
+    assert response.status_code == 401
+
+    # Выданный по нему токен тоже отозван
+    response = await _refresh(app_client, rotated)
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_refresh_unknown_token(app_client):
+    """Неизвестный refresh токен отклоняется."""
+    response = await _refresh(app_client, str(uuid4()))
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_session_limit_evicts_oldest(app_client, test_user, db, monkeypatch):
+    """Сверх REFRESH_TOKEN_MAX_SESSIONS удаляются самые старые сессии."""
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_MAX_SESSIONS", 2)
+    second = await _login(app_client, test_user)
+    third = await _login(app_client, test_user)
+
+    # Сессия из фикстуры test_user - самая старая, она вытеснена
+    response = await _refresh(app_client, test_user["refresh_token"])
+    assert response.status_code == 401
+    assert await db[REFRESH_TOKENS_COLLECTION].count_documents({"refresh_token": test_user["refresh_token"]}) == 0
+
+    for tokens in (second, third):
+        response = await _refresh(app_client, tokens["refresh_token"])
+        assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_refresh_tokens_expire_by_ttl(db):
+    """По expires_at построен TTL-индекс: истекшие токены удаляет сама MongoDB."""
+    indexes = await db[REFRESH_TOKENS_COLLECTION].index_information()
+    assert indexes["expires_at_1"].get("expireAfterSeconds") == 0
+
+async def _insert_legacy_token(db, user_id, created_at=None) -> str:
+    """Токен в формате до появления семейств: без family_id."""
+    now = datetime.now(timezone.utc)
+    refresh_token = str(uuid4())
+    await db[REFRESH_TOKENS_COLLECTION].insert_one({
+        "id": uuid4(),
+        "user_id": user_id,
+        "refresh_token": refresh_token,
+        "expires_at": now + timedelta(days=1),
+        "is_revoked": False,
+        "created_at": created_at or now,
+        "updated_at": created_at or now,
+    })
+    return refresh_token
+
+@pytest.mark.asyncio
+async def test_legacy_token_without_family(app_client, test_user, db, monkeypatch):
+    """Токены без family_id обмениваются на новое семейство, вытесняются и отзываются выходом."""
+    user_id = UUID(test_user["id"])
+    legacy = await _insert_legacy_token(db, user_id)
+    response = await _refresh(app_client, legacy)
+    assert response.status_code == 200
+    rotated = await db[REFRESH_TOKENS_COLLECTION].find_one({"refresh_token": response.json()["refresh_token"]})
+    assert rotated["family_id"] is not None
+
+    # Старые legacy-сессии вытесняются при входе, а не роняют его
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_MAX_SESSIONS", 2)
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    stale = [await _insert_legacy_token(db, user_id, created_at=old) for _ in range(3)]
+    await _login(app_client, test_user)
+    assert await db[REFRESH_TOKENS_COLLECTION].count_documents({"refresh_token": {"$in": stale}}) == 0
+
+    # Выход с legacy-токеном отзывает его
+    legacy = await _insert_legacy_token(db, user_id)
+    tokens = await _login(app_client, test_user)
+    response = await app_client.post(
+        "/api/v1/auth/logout",
+        json={"refresh_token": legacy},
+        headers={"Authorization": f"Bearer {tokens['access_token']}"},
+    )
+    assert response.status_code == 204
+    assert (await _refresh(app_client, legacy)).status_code == 401
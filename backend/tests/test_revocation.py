@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from app.core.bloom import BloomFilter
+from app.crud.revocation import TokenRevocationList
+from app.crud.token import CRUDTokenBlacklist
+
+def test_bloom_filter_has_no_false_negatives():
+    """Все добавленные ключи находятся, доля ложных срабатываний в пределах расчетной."""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [uuid4().hex for _ in range(1000)]
+    for key in added:
+        bloom.add(key)
+
+    assert all(key in bloom for key in added)
+    false_positives = sum(uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
+    assert not bloom.saturated
+
+@pytest.mark.asyncio
+async def test_logout_revokes_access_token(app_client, test_user, auth_headers):
+    """После выхода access токен больше не принимается, даже если пользователь в кеше."""
+    response = await app_client.get("/api/v1/users/me", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = await app_client.post("/api/v1/auth/logout", headers=auth_headers)
+    assert response.status_code == 204
+
+    response = await app_client.get("/api/v1/users/me", headers=auth_headers)
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_logout_revokes_refresh_session(app_client, test_user, auth_headers):
+    """Выход с refresh токеном завершает и сессию обновления."""
+    response = await app_client.post(
+        "/api/v1/auth/logout",
+        json={"refresh_token": test_user["refresh_token"]},
+        headers=auth_headers
+    )
+    assert response.status_code == 204
+
+    response = await app_client.post("/api/v1/auth/refresh", json={"refresh_token": test_user["refresh_token"]})
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_logout_ignores_other_users_refresh_token(app_client, test_user, admin_user):
+    """Refresh токен чужой сессии при выходе не отзывается."""
+    response = await app_client.post(
+        "/api/v1/auth/logout",
+        json={"refresh_token": test_user["refresh_token"]},
+        headers={"Authorization": f"Bearer {admin_user['access_token']}"}
+    )
+    assert response.status_code == 204
+
+    response = await app_client.post("/api/v1/auth/refresh", json={"refresh_token": test_user["refresh_token"]})
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_revocation_list_skips_db_on_filter_miss(db):
+    """Неотозванный токен проверяется по фильтру без запроса к черному списку."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    revocations = TokenRevocationList(capacity=1000, error_rate=0.001, refresh_interval=3600, rebuild_interval=3600)
+    await revocations.sync(db)
+    assert revocations.ready
+
+    assert not await revocations.is_revoked(uuid4().hex, db)
+    assert revocations.filter_hits == 0
+
+@pytest.mark.asyncio
+async def test_revocation_list_picks_up_other_workers(db):
+    """Отзыв, сделанный другим воркером, попадает в фильтр при инкрементальном обновлении."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    revocations = TokenRevocationList(capacity=1000, error_rate=0.001, refresh_interval=3600, rebuild_interval=3600)
+    await revocations.sync(db)
+
+    jti = uuid4().hex
+    await CRUDTokenBlacklist(db).revoke(jti, datetime.now(timezone.utc) + timedelta(minutes=5))
+    await revocations.sync(db, force=True)
+
+    assert revocations.refreshes == 1
+    assert await revocations.is_revoked(jti, db)
+    assert revocations.confirmed == 1
+
+@pytest.mark.asyncio
+async def test_revocation_check_does_not_refresh_filter(db):
+    """Проверка токена не обновляет фильтр сама, даже если срок обновления прошел."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    revocations = TokenRevocationList(capacity=1000, error_rate=0.001, refresh_interval=0, rebuild_interval=0)
+    await revocations.sync(db)
+
+    await revocations.is_revoked(uuid4().hex, db)
+    assert (revocations.rebuilds, revocations.refreshes) == (1, 0)
+
+@pytest.mark.asyncio
+async def test_revocation_list_background_sync(db):
+    """Фоновая задача строит фильтр и дочитывает отзывы других воркеров."""
+    if db is None:
+        pytest.skip("MongoDB недоступна для тестирования")
+    revocations = TokenRevocationList(capacity=1000, error_rate=0.001, refresh_interval=0.01, rebuild_interval=3600)
+    revocations.start(db)
+    try:
+        jti = uuid4().hex
+        await CRUDTokenBlacklist(db).revoke(jti, datetime.now(timezone.utc) + timedelta(minutes=5))
+        for _ in range(200):
+            if revocations.ready and jti in revocations._filter:
+                break
+            await asyncio.sleep(0.01)
+        assert revocations.ready and jti in revocations._filter
+    finally:
+        await revocations.stop()
+    assert revocations._task is None
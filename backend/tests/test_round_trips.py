@@ -0,0 +1,58 @@
+import pytest
+from uuid import uuid4
+
+pytestmark = pytest.mark.asyncio
+
+# Число команд к БД на эндпоинт; рост этих чисел - регрессия
+
+@pytest.mark.asyncio
+async def test_register_is_single_insert(app_client, db_commands):
+    """Регистрация: одна вставка, уникальность проверяет индекс."""
+    response = await app_client.post("/api/v1/auth/register", json={
+        "email": f"rt_{uuid4()}@example.com",
+        "username": f"rt_{uuid4()}",
+        "password": "RoundTrip123!"
+    })
+    assert response.status_code == 201
+    assert db_commands.names == ["insert"]
+
+@pytest.mark.asyncio
+async def test_duplicate_register_is_single_insert(app_client, test_user, db_commands):
+    """Повторная регистрация: та же одна вставка, отклоненная уникальным индексом."""
+    response = await app_client.post("/api/v1/auth/register", json={
+        "email": test_user["email"],
+        "username": f"rt_{uuid4()}",
+        "password": "RoundTrip123!"
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Пользователь с таким email уже существует."
+    assert db_commands.names == ["insert"]
+
+@pytest.mark.asyncio
+async def test_update_is_single_find_and_modify(app_client, test_user, auth_headers, db_commands):
+    """PUT: проверка прав по актуальным данным (find) и одна команда findAndModify."""
+    response = await app_client.put(
+        f"/api/v1/users/{test_user['id']}",
+        json={"full_name": "Round Trip"},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["full_name"] == "Round Trip"
+    assert db_commands.names == ["find", "findAndModify"]
+
+@pytest.mark.asyncio
+async def test_delete_is_single_delete(app_client, test_user, auth_headers, db_commands):
+    """DELETE: проверка прав (find) и одна команда delete."""
+    response = await app_client.delete(f"/api/v1/users/{test_user['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    assert db_commands.names == ["find", "delete"]
+
+@pytest.mark.asyncio
+async def test_cached_me_costs_no_commands(app_client, auth_headers, db_commands):
+    """Повторный /users/me обслуживается из кеша без обращения к БД."""
+    await app_client.get("/api/v1/users/me", headers=auth_headers)
+    db_commands.reset()
+
+    response = await app_client.get("/api/v1/users/me", headers=auth_headers)
+    assert response.status_code == 200
+    assert db_commands.names == []
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+
+from app.crud.singleflight import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Одновременные вызовы с одним ключом выполняют fn один раз."""
+    flight = SingleFlight()
+    executions = 0
+
+    async def fetch():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return {"value": 42}
+
+    results = await asyncio.gather(*(flight.do("user", fetch) for _ in range(5)))
+
+    assert executions == 1
+    assert all(result == {"value": 42} for result in results)
+    assert flight.stats() == {"calls": 5, "collapsed": 4, "in_flight": 0}
+
+    # После завершения ключ освобождается: следующий вызов снова идет в источник
+    await flight.do("user", fetch)
+    assert executions == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    """Отмена первого вызывающего не ломает результат для остальных."""
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    leader = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ok"
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    """Ошибка доставляется всем ожидающим и не запоминается."""
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def working():
+        return "ok"
+
+    assert await flight.do("k", working) == "ok"
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.slow_queries import SlowQueryLog, query_shape, redact, summarize_plan
+
+def test_query_shape_redacts_values():
+    """Форма запроса сохраняет поля и операторы, но не значения."""
+    command = {
+        "find": "users",
+        "filter": {"email": "secret@example.com", "created_at": {"$gt": 1}, "id": {"$in": [1, 2, 3]}},
+        "sort": {"created_at": 1},
+    }
+    assert query_shape("find", command) == {
+        "filter": {"email": "?", "created_at": {"$gt": "?"}, "id": {"$in": ["?"]}},
+        "sort": {"created_at": 1},
+    }
+    assert redact([{"a": 1}, {"a": 2}, {"b": 3}]) == [{"a": "?"}, {"b": "?"}]
+
+def test_summarize_plan_detects_collscan():
+    explain = {"queryPlanner": {
+        "namespace": "db.users",
+        "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "email_1"}},
+    }}
+    assert summarize_plan(explain) == {
+        "stages": "FETCH <- IXSCAN", "indexes": ["email_1"], "collscan": False, "namespace": "db.users",
+    }
+    sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "COLLSCAN"}}}}
+    assert summarize_plan(sbe)["collscan"] is True
+
+class _FakeDatabase:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def command(self, command):
+        self.calls.append(command)
+        return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+
+def _run_command(log: SlowQueryLog, request_id: int, duration_ms: float, email: str):
+    command = {"find": "users", "filter": {"email": email}, "lsid": {"id": 1}, "$db": "app"}
+    log.started(SimpleNamespace(
+        command_name="find", command=command, database_name="app", connection_id=("h", 1), request_id=request_id,
+    ))
+    log.succeeded(SimpleNamespace(
+        command_name="find", connection_id=("h", 1), request_id=request_id, duration_micros=int(duration_ms * 1000),
+    ))
+
+@pytest.mark.asyncio
+async def test_slow_query_log_explains_each_shape_once():
+    """Медленные команды попадают в журнал, explain выполняется один раз на форму."""
+    calls = []
+    log = SlowQueryLog(threshold_ms=50, max_entries=2)
+    log.bind({"app": _FakeDatabase(calls)}, asyncio.get_running_loop())
+
+    _run_command(log, 1, 10, "fast@example.com")
+    _run_command(log, 2, 120, "a@example.com")
+    _run_command(log, 3, 130, "b@example.com")
+    _run_command(log, 4, 140, "c@example.com")
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+    snapshot = log.snapshot(10)
+    assert [entry["duration_ms"] for entry in snapshot["entries"]] == [140, 130]  # Кольцевой буфер на 2 записи
+    assert "a@example.com" not in str(snapshot)
+
+    assert len(calls) == 1
+    assert calls[0]["explain"] == {"find": "users", "filter": {"email": "a@example.com"}}
+    shape_id = snapshot["entries"][0]["shape_id"]
+    assert snapshot["plans"][shape_id]["collscan"] is True
+
+@pytest.mark.asyncio
+async def test_slow_queries_endpoint_is_admin_only(app_client, auth_headers, admin_auth_headers):
+    response = await app_client.get("/api/v1/internal/slow-queries", headers=auth_headers)
+    assert response.status_code == 403
+
+    response = await app_client.get("/api/v1/internal/slow-queries", headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert "entries" in response.json()
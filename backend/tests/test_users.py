@@ -189,4 +189,212 @@ async def test_delete_user_api(app_client, admin_user, admin_auth_headers, db):
     assert user_in_db is None
 
 # TODO: Добавить тесты для обновления пароля, ролей, и других полей, если применимо.
-# TODO: Рассмотреть возможность создания отдельной фикстуры для аутентифицированного клиента. 
\ No newline at end of file
+# TODO: Рассмотреть возможность создания отдельной фикстуры для аутентифицированного клиента. 
+@pytest.mark.asyncio
+async def test_get_users_keyset_pagination(app_client, auth_headers):
+    """Проход по всем страницам через X-Next-Cursor возвращает каждого пользователя ровно один раз."""
+    for i in range(4):
+        response = await app_client.post("/api/v1/users/", json={
+            "email": f"page_{i}_{uuid4()}@example.com",
+            "password": "PagePassword123!",
+            "username": f"page_user_{i}_{uuid4()}",
+            "full_name": "Page User"
+        })
+        assert response.status_code == 201
+
+    all_users = (await app_client.get("/api/v1/users/", params={"skip": 0, "limit": 1000}, headers=auth_headers)).json()
+
+    seen_ids = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await app_client.get("/api/v1/users/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        seen_ids.extend(user["id"] for user in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert set(seen_ids) == {user["id"] for user in all_users}
+
+@pytest.mark.asyncio
+async def test_get_users_invalid_cursor(app_client, auth_headers):
+    """Поврежденный курсор дает 400, а не 500."""
+    response = await app_client.get("/api/v1/users/", params={"cursor": "not-a-cursor"}, headers=auth_headers)
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_crud_read_projection(db, test_user):
+    """Чтение в UserPublic не запрашивает hashed_password из БД."""
+    from app.crud.user import projection_for
+
+    assert "hashed_password" not in projection_for(UserPublic)
+
+    user = await CRUDUser(db).get_by_id(uuid.UUID(test_user["id"]), model=UserPublic)
+    assert isinstance(user, UserPublic)
+    assert user.email == test_user["email"]
+    assert isinstance(user.created_at, str)
+
+@pytest.mark.asyncio
+async def test_user_document_serialization_matches_model():
+    """Документ из БД сериализуется в тот же JSON, что и UserPublic."""
+    from datetime import datetime
+    from app.api.v1.responses import dump_user
+
+    doc = {
+        "id": uuid4(),
+        "email": "doc@example.com",
+        "username": "doc_user",
+        "full_name": "Док Юзер",
+        "roles": ["user"],
+        "status": "active",
+        "is_active": True,
+        "created_at": datetime(2026, 1, 2, 3, 4, 5, 678000),
+    }
+    assert dump_user(doc) == dump_user(UserPublic.model_validate(doc))
+
+@pytest.mark.asyncio
+async def test_sparse_user_document_serialization_matches_model():
+    """Документ без необязательных полей и с другим порядком ключей дает байт в байт JSON модели."""
+    from datetime import datetime
+    from app.api.v1.responses import dump_user, dump_users
+
+    doc = {
+        "created_at": datetime(2026, 1, 2, 3, 4, 5, 678000),
+        "is_active": True,
+        "status": "active",
+        "email": "sparse@example.com",
+        "id": uuid4(),
+    }
+    expected = UserPublic.model_validate(doc).model_dump_json().encode()
+    assert dump_user(doc) == expected
+    assert dump_users([doc]) == b"[" + expected + b"]"
+
+@pytest.mark.asyncio
+async def test_export_users_ndjson(app_client, db, admin_user, admin_auth_headers, auth_headers):
+    """Администратор выгружает пользователей в NDJSON и может продолжить выгрузку после строки."""
+    import json
+
+    response = await app_client.get("/api/v1/users/export", headers=admin_auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) >= 2
+    assert all("hashed_password" not in row for row in rows)
+
+    resumed = await app_client.get(
+        "/api/v1/users/export",
+        params={"after_id": rows[0]["id"]},
+        headers=admin_auth_headers
+    )
+    assert [json.loads(line)["id"] for line in resumed.text.splitlines()] == [row["id"] for row in rows[1:]]
+
+    forbidden = await app_client.get("/api/v1/users/export", headers=auth_headers)
+    assert forbidden.status_code == 403
+
+    # Продолжение по cursor работает, даже если последний полученный пользователь уже удален
+    last = next(i for i, row in enumerate(rows) if row["id"] != admin_user["id"])
+    assert await CRUDUser(db).delete(uuid.UUID(rows[last]["id"]))
+    resumed = await app_client.get(
+        "/api/v1/users/export",
+        params={"cursor": rows[last]["cursor"]},
+        headers=admin_auth_headers
+    )
+    assert resumed.status_code == 200
+    assert [json.loads(line)["id"] for line in resumed.text.splitlines()] == [row["id"] for row in rows[last + 1:]]
+
+    bad_cursor = await app_client.get("/api/v1/users/export", params={"cursor": "!"}, headers=admin_auth_headers)
+    assert bad_cursor.status_code == 400
+
+@pytest.mark.asyncio
+async def test_import_users_ndjson(app_client, admin_auth_headers, test_user):
+    """Импорт создает корректные строки и построчно сообщает об ошибках."""
+    import json
+
+    new_email = f"import_{uuid4()}@example.com"
+    body = "\n".join([
+        json.dumps({"email": new_email, "username": f"import_{uuid4()}", "password": "ImportPass123!"}),
+        json.dumps({"email": test_user["email"], "username": f"import_{uuid4()}", "password": "ImportPass123!"}),
+        json.dumps({"email": f"short_{uuid4()}@example.com", "password": "short"}),
+        "{not json",
+        "",
+    ])
+    response = await app_client.post(
+        "/api/v1/users/import",
+        content=body.encode(),
+        headers={**admin_auth_headers, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["created"] == 1
+    assert [error["line"] for error in result["errors"]] == [2, 3, 4]
+    assert result["errors"][0]["field"] == "email"
+
+class FailingInsertCollection:
+    """Коллекция, в которой неупорядоченная вставка отклоняет строку failed_index не из-за дубликата."""
+
+    def __init__(self, collection, failed_index: int):
+        self.collection = collection
+        self.failed_index = failed_index
+
+    async def insert_many(self, documents, ordered=True):
+        from pymongo.errors import BulkWriteError
+
+        documents = list(documents)
+        await self.collection.insert_many([doc for i, doc in enumerate(documents) if i != self.failed_index])
+        raise BulkWriteError({
+            "writeErrors": [{"index": self.failed_index, "code": 121, "errmsg": "Document failed validation"}],
+            "writeConcernErrors": [], "nInserted": len(documents) - 1, "nUpserted": 0,
+            "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+        })
+
+async def test_create_many_reports_non_duplicate_write_errors(db):
+    """Любая ошибка записи строки попадает в failed: остальные строки уже вставлены."""
+    from app.api.v1.deps import user_write_error
+
+    user_crud = CRUDUser(db)
+    user_crud.collection = FailingInsertCollection(user_crud.collection, failed_index=1)
+    users_in = [
+        UserCreate(email=f"bulk_{uuid4()}@example.com", username=f"bulk_{uuid4()}", password="BulkPass123!")
+        for _ in range(3)
+    ]
+    created, failed = await user_crud.create_many(users_in)
+
+    assert [user.email for user in created] == [users_in[0].email, users_in[2].email]
+    assert list(failed) == [1]
+    field, message = user_write_error(failed[1])
+    assert field is None and "121" in message
+    assert await CRUDUser(db).get_by_email(users_in[2].email) is not None
+
+async def test_import_users_rejects_oversized_line(app_client, admin_auth_headers, db, monkeypatch):
+    """
+    Строка без перевода строки длиннее USERS_IMPORT_MAX_LINE_BYTES не копится в памяти: 413.
+
+    Строки до нее сохраняются, и ответ говорит, откуда продолжить.
+    """
+    import json
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "USERS_IMPORT_MAX_LINE_BYTES", 256)
+    email = f"before_{uuid4()}@example.com"
+    valid = json.dumps({"email": email, "username": f"before_{uuid4()}", "password": "ImportPass123!"}).encode()
+
+    async def body():
+        yield valid + b"\n{not json\n"
+        yield b'{"email": "' + b"a" * 200
+        yield b"a" * 200
+
+    response = await app_client.post(
+        "/api/v1/users/import",
+        content=body(),
+        headers={**admin_auth_headers, "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 413
+    detail = response.json()["detail"]
+    assert "Строка 3" in detail["message"]
+    assert (detail["line"], detail["last_line"], detail["created"]) == (3, 2, 1)
+    assert [error["line"] for error in detail["errors"]] == [2]
+    assert await CRUDUser(db).get_by_email(email) is not None